@@ -0,0 +1,79 @@
+"""
+compare storing blocks as json against the compact binary encoding:
+encode/decode throughput and redis memory for 10k blocks
+
+APP_ENV=testing python -m benchmarks.bench_block_encoding
+"""
+import time
+import random
+
+from hubgrep_indexer import state_manager
+from hubgrep_indexer.lib.block import Block
+from benchmarks.helpers import benchmark_app
+
+BLOCK_COUNT = 10000
+BENCHMARK_KEY = "benchmark_blocks"
+
+
+def _get_blocks(with_ids: bool):
+    run_created_ts = time.time()
+    blocks = []
+    for i in range(BLOCK_COUNT):
+        from_id = i * state_manager.batch_size + 1
+        to_id = from_id + state_manager.batch_size - 1
+        ids = None
+        if with_ids:
+            # cached id lists are sparse and ascending
+            ids = sorted(random.sample(range(from_id, to_id * 10), state_manager.batch_size))
+        block = Block.new(from_id=from_id, to_id=to_id, run_created_ts=run_created_ts, ids=ids)
+        block.attempts_at.append(block.attempts_at[-1] + 60)
+        blocks.append(block)
+    return blocks
+
+
+def _measure(blocks, encode, decode) -> dict:
+    started = time.time()
+    encoded_blocks = [encode(block) for block in blocks]
+    encode_duration = time.time() - started
+
+    started = time.time()
+    for encoded_block in encoded_blocks:
+        decode(encoded_block)
+    decode_duration = time.time() - started
+
+    redis = state_manager.redis
+    redis.delete(BENCHMARK_KEY)
+    pipeline = redis.pipeline(transaction=False)
+    for block, encoded_block in zip(blocks, encoded_blocks):
+        pipeline.hset(BENCHMARK_KEY, block.uid, encoded_block)
+    pipeline.execute()
+    memory = redis.memory_usage(BENCHMARK_KEY, samples=0)
+    redis.delete(BENCHMARK_KEY)
+
+    return dict(
+        encode_per_s=len(blocks) / encode_duration,
+        decode_per_s=len(blocks) / decode_duration,
+        memory_mb=memory / 1024 / 1024,
+    )
+
+
+def main():
+    with benchmark_app():
+        for with_ids in [False, True]:
+            blocks = _get_blocks(with_ids=with_ids)
+            results = {
+                "json": _measure(blocks, Block.to_json, Block.from_json),
+                "binary": _measure(blocks, Block.to_bytes, Block.from_bytes),
+            }
+            print(f"{BLOCK_COUNT} blocks {'with' if with_ids else 'without'} id lists:")
+            for name, result in results.items():
+                print(
+                    f"  {name:>6} - "
+                    f"encode: {result['encode_per_s']:>8.0f} blocks/s - "
+                    f"decode: {result['decode_per_s']:>8.0f} blocks/s - "
+                    f"redis memory: {result['memory_mb']:>7.2f}MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+export a synthetic finished table of 1M github repos (raw export) with each codec:
+export time, file size and the time to read the file back (like hubgrep_search importing it)
+
+APP_ENV=testing python -m benchmarks.bench_codecs
+"""
+import gzip
+import time
+from pathlib import Path
+
+import zstandard
+from flask import current_app
+
+from hubgrep_indexer import db
+from hubgrep_indexer.constants import HOST_TYPE_GITHUB, EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_CODEC_NONE
+from hubgrep_indexer.lib.table_helper import TableHelper
+from hubgrep_indexer.models.export_meta import ExportMeta
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from benchmarks.bench_export import _create_synthetic_finished_table, _clear_exports
+from benchmarks.helpers import benchmark_app, get_benchmark_hosting_service
+
+ROW_COUNT = 1000000
+
+# (codec, level, zstd threads)
+CODECS = [
+    (EXPORT_CODEC_GZIP, 9, 0),
+    (EXPORT_CODEC_GZIP, 1, 0),
+    (EXPORT_CODEC_ZSTD, 3, 0),
+    (EXPORT_CODEC_ZSTD, 3, -1),
+    (EXPORT_CODEC_NONE, None, 0),
+]
+
+
+def _read_export(path: Path, codec: str) -> int:
+    """ read (and decompress) an export, returns the csv size """
+    with open(path, "rb") as f:
+        if codec == EXPORT_CODEC_GZIP:
+            f = gzip.GzipFile(fileobj=f)
+        elif codec == EXPORT_CODEC_ZSTD:
+            f = zstandard.ZstdDecompressor().stream_reader(f)
+        size = 0
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                return size
+            size += len(chunk)
+
+
+def main():
+    with benchmark_app():
+        hosting_service = get_benchmark_hosting_service(HOST_TYPE_GITHUB)
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        _create_synthetic_finished_table(hosting_service, row_count=ROW_COUNT)
+        try:
+            print(f"{'codec':<8} {'level':>5} {'threads':>7} {'export':>8} {'size':>8} {'read':>7}")
+            for codec, level, threads in CODECS:
+                current_app.config["EXPORT_COMPRESSION_LEVEL"] = level
+                current_app.config["EXPORT_COMPRESSION_THREADS"] = threads
+                started = time.time()
+                export = ExportMeta.create_export(hosting_service, unified=False, codec=codec)
+                export_seconds = time.time() - started
+                db.session.add(export)
+                db.session.commit()
+
+                path = Path(current_app.config["RESULTS_PATH"]).joinpath(export.file_path)
+                file_mb = path.stat().st_size / 1024 / 1024
+                started = time.time()
+                _read_export(path, codec)
+                read_seconds = time.time() - started
+                print(
+                    f"{codec:<8} {str(level):>5} {threads:>7} {export_seconds:>7.1f}s"
+                    f" {file_mb:>6.0f}MB {read_seconds:>6.1f}s"
+                )
+                _clear_exports(hosting_service)
+        finally:
+            _clear_exports(hosting_service)
+            with TableHelper._cursor() as cur:
+                TableHelper.drop_table(cur, repo_class.get_finished_table_name(hosting_service))
+
+
+if __name__ == "__main__":
+    main()
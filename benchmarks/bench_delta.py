@@ -0,0 +1,90 @@
+"""
+full against delta export (unified) of a synthetic finished table of 1M github repos,
+after a run which changed 1% of the repos, removed 0.5% and added 0.5%
+
+APP_ENV=testing python -m benchmarks.bench_delta
+"""
+import time
+from pathlib import Path
+
+from flask import current_app
+
+from hubgrep_indexer import db
+from hubgrep_indexer.constants import HOST_TYPE_GITHUB
+from hubgrep_indexer.lib.table_helper import TableHelper
+from hubgrep_indexer.models.export_meta import ExportMeta
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from benchmarks.bench_export import _create_synthetic_finished_table, _clear_exports
+from benchmarks.helpers import benchmark_app, get_benchmark_hosting_service
+
+ROW_COUNT = 1000000
+
+
+def _create_synthetic_run(hosting_service):
+    """
+    make the synthetic finished table the previous one, and a finished table with the changes of a run
+    """
+    repo_class = Repository.repo_class_for_type(hosting_service.type)
+    finished_table = repo_class.get_finished_table_name(hosting_service)
+    previous_table = repo_class.get_previous_finished_table_name(hosting_service)
+    with TableHelper._cursor() as cur:
+        TableHelper.drop_table(cur, previous_table)
+        cur.execute(f"alter table {finished_table} rename to {previous_table}")
+        cur.execute(f"create table {finished_table} (like {previous_table} including defaults)")
+        # every 200th repo removed, every 100th changed
+        cur.execute(
+            f"""
+            insert into {finished_table}
+            select * from {previous_table} where mod(id, 200) != 0
+            """
+        )
+        cur.execute(
+            f"""
+            update {finished_table}
+            set updated_at = updated_at + interval '1 day', pushed_at = pushed_at + interval '1 day'
+            where mod(id, 100) = 1
+            """
+        )
+        # as many repos added as removed - copies of the removed ones, with other ids
+        foreign_id = repo_class.get_foreign_id_column()
+        columns = [column.name for column in repo_class.__table__.columns]
+        added_values = [
+            f"{column} + %(row_count)s" if column in ("id", foreign_id) else column for column in columns
+        ]
+        cur.execute(
+            f"""
+            insert into {finished_table} ({", ".join(columns)})
+            select {", ".join(added_values)}
+            from {previous_table} where mod(id, 200) = 0
+            """,
+            dict(row_count=ROW_COUNT),
+        )
+        cur.execute(f"analyze {finished_table}")
+
+
+def main():
+    with benchmark_app():
+        hosting_service = get_benchmark_hosting_service(HOST_TYPE_GITHUB)
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        _create_synthetic_finished_table(hosting_service, row_count=ROW_COUNT)
+        _create_synthetic_run(hosting_service)
+        try:
+            print(f"{'export':<6} {'time':>7} {'repos':>8} {'size':>7}")
+            for delta in [False, True]:
+                started = time.time()
+                export = ExportMeta.create_export(hosting_service, unified=True, delta=delta)
+                export_seconds = time.time() - started
+                db.session.add(export)
+                db.session.commit()
+                path = Path(current_app.config["RESULTS_PATH"]).joinpath(export.file_path)
+                file_mb = path.stat().st_size / 1024 / 1024
+                print(f"{'delta' if delta else 'full':<6} {export_seconds:>6.1f}s {export.repo_count:>8} {file_mb:>5.1f}MB")
+        finally:
+            _clear_exports(hosting_service)
+            with TableHelper._cursor() as cur:
+                TableHelper.drop_table(cur, repo_class.get_finished_table_name(hosting_service))
+                TableHelper.drop_table(cur, repo_class.get_previous_finished_table_name(hosting_service))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+export a synthetic finished table of 5M github repos, in MB/s of (uncompressed) csv:
+one export after the other, compressing on the COPY thread (as before)
+against the raw and unified export at once, compressing on separate threads (HostingService.export_repos)
+and against both from a single read of the table (EXPORT_SINGLE_PASS)
+
+APP_ENV=testing python -m benchmarks.bench_export
+"""
+import os
+import gzip
+import time
+from pathlib import Path
+
+from flask import current_app
+
+from hubgrep_indexer import db
+from hubgrep_indexer.constants import HOST_TYPE_GITHUB
+from hubgrep_indexer.lib.table_helper import TableHelper
+from hubgrep_indexer.models.export_meta import ExportMeta
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from benchmarks.helpers import benchmark_app, get_benchmark_hosting_service
+
+ROW_COUNT = 5000000
+
+
+def _get_synthetic_value_sql(column) -> str:
+    """ sql for a value of a column in row "i" of generate_series """
+    python_type = column.type.python_type
+    if column.name == "hosting_service_id":
+        return "%(hosting_service_id)s"
+    if python_type is bool:
+        return "mod(i, 2) = 0"
+    if python_type is int:
+        return "i"
+    if python_type.__name__ == "datetime":
+        return "timestamp '2021-01-01' + i * interval '1 minute'"
+    return f"'{column.name} of synthetic repo number ' || i"
+
+
+def _create_synthetic_finished_table(hosting_service, row_count: int = ROW_COUNT):
+    repo_class = Repository.repo_class_for_type(hosting_service.type)
+    finished_table = repo_class.get_finished_table_name(hosting_service)
+    columns = repo_class.__table__.columns
+    with TableHelper._cursor() as cur:
+        TableHelper.drop_table(cur, finished_table)
+        cur.execute(f"create table {finished_table} (like {repo_class.__tablename__} including defaults)")
+        cur.execute(
+            f"""
+            insert into {finished_table} ({", ".join(column.name for column in columns)})
+            select {", ".join(_get_synthetic_value_sql(column) for column in columns)}
+            from generate_series(1, %(row_count)s) as i
+            """,
+            dict(hosting_service_id=hosting_service.id, row_count=row_count),
+        )
+        cur.execute(f"analyze {finished_table}")
+
+
+class _CountingFile:
+    def __init__(self, file):
+        self.file = file
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return self.file.write(data)
+
+
+def _sequential_export(hosting_service) -> int:
+    """ what HostingService.export_repos did before, returns the csv size """
+    repo_class = Repository.repo_class_for_type(hosting_service.type)
+    finished_table = repo_class.get_finished_table_name(hosting_service)
+    columns = ", ".join(column.name for column in repo_class.__table__.columns)
+    csv_size = 0
+    for select_statement in [
+        f"select {columns} from {finished_table}",
+        repo_class.get_unified_select_sql(hosting_service),
+    ]:
+        con = db.engine.raw_connection()
+        try:
+            result_path = Path(current_app.config["RESULTS_PATH"]).joinpath("bench_export_sequential.csv.gz")
+            with gzip.open(result_path, "w") as gzfile:
+                counting_file = _CountingFile(gzfile)
+                con.cursor().copy_expert(f"COPY ({select_statement}) TO STDOUT delimiter ';' csv header", counting_file)
+            csv_size += counting_file.bytes_written
+            os.remove(result_path)
+        finally:
+            con.close()
+    return csv_size
+
+
+def _clear_exports(hosting_service):
+    for export in ExportMeta.query.filter_by(hosting_service_id=hosting_service.id):
+        export.delete_file()
+        db.session.delete(export)
+    db.session.commit()
+
+
+def main():
+    with benchmark_app():
+        hosting_service = get_benchmark_hosting_service(HOST_TYPE_GITHUB)
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        started = time.time()
+        _create_synthetic_finished_table(hosting_service)
+        print(f"created {ROW_COUNT} synthetic repos in {time.time() - started:.1f}s")
+        try:
+            started = time.time()
+            csv_size = _sequential_export(hosting_service)
+            sequential_seconds = time.time() - started
+            csv_mb = csv_size / 1024 / 1024
+
+            started = time.time()
+            hosting_service.export_repos()
+            pipeline_seconds = time.time() - started
+            _clear_exports(hosting_service)
+
+            current_app.config["EXPORT_SINGLE_PASS"] = True
+            started = time.time()
+            hosting_service.export_repos()
+            single_pass_seconds = time.time() - started
+            current_app.config["EXPORT_SINGLE_PASS"] = False
+
+            print(f"raw + unified csv: {csv_mb:.0f}MB")
+            print(f"  sequential: {sequential_seconds:>6.1f}s - {csv_mb / sequential_seconds:>6.1f}MB/s")
+            print(f"    pipeline: {pipeline_seconds:>6.1f}s - {csv_mb / pipeline_seconds:>6.1f}MB/s")
+            print(f" single pass: {single_pass_seconds:>6.1f}s - {csv_mb / single_pass_seconds:>6.1f}MB/s")
+        finally:
+            _clear_exports(hosting_service)
+            with TableHelper._cursor() as cur:
+                TableHelper.drop_table(cur, repo_class.get_finished_table_name(hosting_service))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+request latency of the get_block endpoint, with hosting services served from the
+in-process registry, and with them queried from postgres on every request -
+and the time per block when fetching them in batches from the blocks endpoint
+
+APP_ENV=testing python -m benchmarks.bench_get_block
+"""
+import time
+
+from sqlalchemy import event
+
+from hubgrep_indexer import db, state_manager
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
+from benchmarks.helpers import benchmark_app, get_benchmark_hosting_service, HOSTER_TYPES
+
+REQUEST_COUNT = 2000
+BATCH_SIZES = [10, 100]
+
+
+def _run_batches(client, hosting_service, batch_size: int) -> float:
+    state_manager.reset(hosting_service.id)
+    started = time.time()
+    for _ in range(REQUEST_COUNT // batch_size):
+        response = client.get(f"/api/v1/hosters/{hosting_service.id}/blocks?count={batch_size}")
+        assert len(response.json) == batch_size
+    duration = time.time() - started
+    state_manager.reset(hosting_service.id)
+    return duration / REQUEST_COUNT * 1000
+
+
+def _run(client, hosting_service, before_request) -> dict:
+    statements = []
+
+    def _count_statement(*args, **kwargs):
+        statements.append(1)
+
+    state_manager.reset(hosting_service.id)
+    event.listen(db.engine, "before_cursor_execute", _count_statement)
+    latencies = []
+    for _ in range(REQUEST_COUNT):
+        before_request()
+        started = time.time()
+        response = client.get(f"/api/v1/hosters/{hosting_service.id}/block")
+        latencies.append(time.time() - started)
+        assert response.status_code == 200
+    event.remove(db.engine, "before_cursor_execute", _count_statement)
+    state_manager.reset(hosting_service.id)
+
+    latencies.sort()
+    return dict(
+        mean_ms=sum(latencies) / len(latencies) * 1000,
+        p99_ms=latencies[int(len(latencies) * 0.99)] * 1000,
+        statements_per_request=len(statements) / REQUEST_COUNT,
+    )
+
+
+def main():
+    with benchmark_app() as app:
+        hosting_services = [get_benchmark_hosting_service(hoster_type) for hoster_type in HOSTER_TYPES]
+        client = app.test_client()
+        results = {
+            "queried": _run(client, hosting_services[0], before_request=hoster_registry.clear),
+            "registry": _run(client, hosting_services[0], before_request=lambda: None),
+        }
+        print(f"{REQUEST_COUNT} get_block requests ({len(hosting_services)} hosters):")
+        for name, result in results.items():
+            print(
+                f"  {name:>8} - "
+                f"mean: {result['mean_ms']:>6.2f}ms - "
+                f"p99: {result['p99_ms']:>6.2f}ms - "
+                f"sql statements/request: {result['statements_per_request']:.1f}"
+            )
+        for batch_size in BATCH_SIZES:
+            ms_per_block = _run_batches(client, hosting_services[0], batch_size)
+            print(f"  batches of {batch_size:>3} - {ms_per_block:>6.3f}ms/block")
+
+
+if __name__ == "__main__":
+    main()
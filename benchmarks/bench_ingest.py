@@ -0,0 +1,41 @@
+"""
+compare rows/sec when adding repos via COPY and via the plain insert fallback
+
+APP_ENV=testing python -m benchmarks.bench_ingest
+"""
+from hubgrep_indexer.api_blueprint.add_repos import _append_repos
+from benchmarks.helpers import (
+    HOSTER_TYPES,
+    benchmark_app,
+    clear_benchmark_repos,
+    get_benchmark_hosting_service,
+    get_synthetic_repos,
+    timed,
+)
+
+PAYLOAD_SIZES = [1000, 10000, 100000]
+
+
+def main():
+    with benchmark_app() as app:
+        for hosting_service_type in HOSTER_TYPES:
+            hosting_service = get_benchmark_hosting_service(hosting_service_type)
+            for payload_size in PAYLOAD_SIZES:
+                repo_dicts = get_synthetic_repos(hosting_service_type, payload_size)
+                timings = {}
+                for use_copy in (False, True):
+                    app.config["INGEST_USE_COPY"] = use_copy
+                    clear_benchmark_repos(hosting_service)
+                    with timed(timings, use_copy):
+                        _append_repos(hosting_service=hosting_service, repo_dicts=repo_dicts)
+                clear_benchmark_repos(hosting_service)
+
+                print(
+                    f"{hosting_service_type:>7} {payload_size:>7} rows - "
+                    f"insert: {payload_size / timings[False]:>9.0f} rows/s - "
+                    f"copy: {payload_size / timings[True]:>9.0f} rows/s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+hand out blocks from many threads at once (like many gunicorn workers polling for blocks)
+and compare the lua script against reading and writing the cursor with separate commands
+
+APP_ENV=testing python -m benchmarks.bench_next_block
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hubgrep_indexer import state_manager
+from hubgrep_indexer.lib.state_manager.abstract_state_manager import AbstractStateManager
+from benchmarks.helpers import benchmark_app
+
+HOSTER_PREFIX = "benchmark_hoster"
+WORKER_COUNTS = [1, 8, 32]
+BLOCKS_PER_WORKER = 200
+
+
+def _run(app, worker_count: int, get_next_block) -> dict:
+    state_manager.reset(HOSTER_PREFIX)
+
+    def _get_blocks(_):
+        with app.app_context():
+            return [get_next_block(HOSTER_PREFIX).from_id for _ in range(BLOCKS_PER_WORKER)]
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=worker_count) as pool:
+        from_ids = [from_id for from_ids in pool.map(_get_blocks, range(worker_count)) for from_id in from_ids]
+    duration = time.time() - started
+    return dict(
+        blocks_per_s=len(from_ids) / duration,
+        duplicates=len(from_ids) - len(set(from_ids)),
+    )
+
+
+def main():
+    with benchmark_app() as app:
+        def separate_commands(hoster_prefix):
+            return AbstractStateManager.get_next_block(state_manager, hoster_prefix)
+
+        for worker_count in WORKER_COUNTS:
+            separate = _run(app, worker_count, separate_commands)
+            script = _run(app, worker_count, state_manager.get_next_block)
+            print(
+                f"{worker_count:>3} workers - "
+                f"separate commands: {separate['blocks_per_s']:>8.0f} blocks/s "
+                f"({separate['duplicates']} duplicate ranges) - "
+                f"lua script: {script['blocks_per_s']:>8.0f} blocks/s "
+                f"({script['duplicates']} duplicate ranges)"
+            )
+        state_manager.reset(HOSTER_PREFIX)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+unified exports of a synthetic finished table of 1M github repos, csv against parquet:
+export time, file size and the time to read all rows back
+(csv with the csv module, as strings - parquet with pyarrow, typed)
+
+APP_ENV=testing python -m benchmarks.bench_parquet
+"""
+import csv
+import gzip
+import io
+import time
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import zstandard
+from flask import current_app
+
+from hubgrep_indexer import db
+from hubgrep_indexer.constants import (
+    HOST_TYPE_GITHUB,
+    EXPORT_CODEC_GZIP,
+    EXPORT_CODEC_ZSTD,
+    EXPORT_FORMAT_CSV,
+    EXPORT_FORMAT_PARQUET,
+)
+from hubgrep_indexer.lib.table_helper import TableHelper
+from hubgrep_indexer.models.export_meta import ExportMeta
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from benchmarks.bench_export import _create_synthetic_finished_table, _clear_exports
+from benchmarks.helpers import benchmark_app, get_benchmark_hosting_service
+
+ROW_COUNT = 1000000
+
+# (export format, codec)
+EXPORTS = [
+    (EXPORT_FORMAT_CSV, EXPORT_CODEC_GZIP),
+    (EXPORT_FORMAT_CSV, EXPORT_CODEC_ZSTD),
+    (EXPORT_FORMAT_PARQUET, EXPORT_CODEC_GZIP),
+    (EXPORT_FORMAT_PARQUET, EXPORT_CODEC_ZSTD),
+]
+
+
+def _read_export(path: Path, export_format: str, codec: str) -> int:
+    """ read all rows of an export, returns the row count """
+    if export_format == EXPORT_FORMAT_PARQUET:
+        return pq.read_table(path).num_rows
+    with open(path, "rb") as f:
+        if codec == EXPORT_CODEC_GZIP:
+            f = gzip.GzipFile(fileobj=f)
+        else:
+            f = zstandard.ZstdDecompressor().stream_reader(f)
+        reader = csv.reader(io.TextIOWrapper(f, encoding="utf-8"), delimiter=";")
+        next(reader)
+        return sum(1 for _ in reader)
+
+
+def main():
+    with benchmark_app():
+        hosting_service = get_benchmark_hosting_service(HOST_TYPE_GITHUB)
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        _create_synthetic_finished_table(hosting_service, row_count=ROW_COUNT)
+        current_app.config["EXPORT_COMPRESSION_LEVEL"] = None
+        current_app.config["EXPORT_PARQUET_ROW_GROUP_SIZE"] = 100000
+        try:
+            print(f"{'format':<8} {'codec':<5} {'export':>8} {'size':>6} {'read':>7}")
+            for export_format, codec in EXPORTS:
+                started = time.time()
+                export = ExportMeta.create_export(hosting_service, unified=True, codec=codec, export_format=export_format)
+                export_seconds = time.time() - started
+                db.session.add(export)
+                db.session.commit()
+
+                path = Path(current_app.config["RESULTS_PATH"]).joinpath(export.file_path)
+                file_mb = path.stat().st_size / 1024 / 1024
+                started = time.time()
+                assert _read_export(path, export_format, codec) == ROW_COUNT
+                read_seconds = time.time() - started
+                print(f"{export_format:<8} {codec:<5} {export_seconds:>7.1f}s {file_mb:>4.0f}MB {read_seconds:>6.1f}s")
+                _clear_exports(hosting_service)
+        finally:
+            _clear_exports(hosting_service)
+            with TableHelper._cursor() as cur:
+                TableHelper.drop_table(cur, repo_class.get_finished_table_name(hosting_service))
+
+
+if __name__ == "__main__":
+    main()
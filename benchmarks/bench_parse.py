@@ -0,0 +1,37 @@
+"""
+compare the per-repo parse cost of building orm models (`from_dict`)
+against building plain insert rows (`row_from_dict`)
+
+APP_ENV=testing python -m benchmarks.bench_parse
+"""
+import timeit
+
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from benchmarks.helpers import HOSTER_TYPES, benchmark_app, get_synthetic_repos
+
+REPO_COUNT = 10000
+
+
+def main():
+    with benchmark_app():
+        for hosting_service_type in HOSTER_TYPES:
+            repo_class = Repository.repo_class_for_type(hosting_service_type)
+            repo_dicts = get_synthetic_repos(hosting_service_type, REPO_COUNT)
+
+            def parse_models():
+                return [repo_class.from_dict(1, d) for d in repo_dicts]
+
+            def parse_rows():
+                return [repo_class.row_from_dict(1, d) for d in repo_dicts]
+
+            model_time = min(timeit.repeat(parse_models, number=1, repeat=3))
+            row_time = min(timeit.repeat(parse_rows, number=1, repeat=3))
+            print(
+                f"{hosting_service_type:>7} - "
+                f"from_dict: {model_time / REPO_COUNT * 1e6:>6.1f}us/repo - "
+                f"row_from_dict: {row_time / REPO_COUNT * 1e6:>6.1f}us/repo"
+            )
+
+
+if __name__ == "__main__":
+    main()
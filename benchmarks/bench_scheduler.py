@@ -0,0 +1,123 @@
+"""
+pick hosters for load balanced crawlers from thousands of synthetic hosters:
+the scheduler (sorted set) against scanning the state of every hoster of the type on every poll,
+and how evenly blocks are spread when crawlers poll a fresh state
+
+APP_ENV=testing python -m benchmarks.bench_scheduler
+"""
+import time
+import random
+from collections import Counter
+
+from flask import current_app
+
+from hubgrep_indexer import db, state_manager
+from hubgrep_indexer.constants import HOST_TYPE_GITEA
+from hubgrep_indexer.lib.block_helpers import _state_is_too_old
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
+from hubgrep_indexer.lib.hoster_scheduler import hoster_scheduler
+from hubgrep_indexer.models.hosting_service import HostingService
+from benchmarks.helpers import benchmark_app
+
+HOSTER_COUNTS = [1000, 5000]
+POLL_COUNT = 200
+SIMULATION_HOSTER_COUNT = 1000
+SIMULATION_POLL_COUNT = 5000
+# share of hosters which finished their run recently
+FINISHED_SHARE = 0.3
+API_URL_PREFIX = "https://benchmark_scheduler_"
+
+
+def _add_synthetic_hosters(count: int):
+    db.session.execute(HostingService.__table__.insert(), [
+        dict(type=HOST_TYPE_GITEA, api_url=f"{API_URL_PREFIX}{i}.invalid/",
+             landingpage_url=f"{API_URL_PREFIX}{i}.invalid/", api_keys=["benchmark"])
+        for i in range(count)
+    ])
+    db.session.commit()
+    # (core inserts dont go through the session events)
+    state_manager.bump_hosters_version()
+    return [hosting_service.id for hosting_service in hoster_registry.filter_by_type(HOST_TYPE_GITEA)
+            if hosting_service.api_url.startswith(API_URL_PREFIX)]
+
+
+def _clear_synthetic_hosters():
+    db.session.execute(HostingService.__table__.delete().where(HostingService.api_url.startswith(API_URL_PREFIX)))
+    db.session.commit()
+    state_manager.bump_hosters_version()
+
+
+def _set_random_states(hoster_ids):
+    now = time.time()
+    old_run_age = current_app.config["OLD_RUN_AGE"]
+    for hoster_id in hoster_ids:
+        state_manager.reset(hoster_id)
+        state_manager.set_run_created_ts(hoster_id, now - random.random() * old_run_age * 2)
+        if random.random() < FINISHED_SHARE:
+            state_manager.set_run_created_ts(hoster_id, now - random.random() * old_run_age)
+            state_manager.set_has_run_hit_end(hoster_id, True)
+
+
+def _scan_pick(hosting_service_type: str):
+    """ what the load balancer did before the scheduler """
+    hoster_ids = [hosting_service.id for hosting_service in hoster_registry.filter_by_type(hosting_service_type)]
+    states = state_manager.get_state_dicts(hoster_prefixes=hoster_ids)
+    crawlable = {hoster_id: state for hoster_id, state in states.items() if _state_is_too_old(state)}
+    return sorted(crawlable.keys(), key=lambda hoster_id: crawlable[hoster_id]["run_created_ts"])[:1]
+
+
+def _measure_latency(pick) -> float:
+    started = time.time()
+    for _ in range(POLL_COUNT):
+        assert pick(HOST_TYPE_GITEA)
+    return (time.time() - started) / POLL_COUNT * 1000
+
+
+def _simulate(hoster_ids, pick) -> Counter:
+    """ crawlers polling a fresh state, every poll gets a new block from the picked hoster """
+    for hoster_id in hoster_ids:
+        state_manager.reset(hoster_id)
+        state_manager.set_run_created_ts(hoster_id, 0)
+    hoster_scheduler.rebuild(HOST_TYPE_GITEA)
+    picked = Counter()
+    for _ in range(SIMULATION_POLL_COUNT):
+        hoster_id = pick(HOST_TYPE_GITEA)[0]
+        state_manager.get_next_block(hoster_prefix=hoster_id)
+        picked[hoster_id] += 1
+    return picked
+
+
+def main():
+    with benchmark_app():
+        _clear_synthetic_hosters()
+        try:
+            for hoster_count in HOSTER_COUNTS:
+                hoster_ids = _add_synthetic_hosters(hoster_count)
+                _set_random_states(hoster_ids)
+                hoster_scheduler.rebuild(HOST_TYPE_GITEA)
+                scan_ms = _measure_latency(_scan_pick)
+                scheduler_ms = _measure_latency(hoster_scheduler.pick)
+                print(
+                    f"{len(hoster_ids):>5} hosters - "
+                    f"scan: {scan_ms:>8.2f}ms/poll - "
+                    f"scheduler: {scheduler_ms:>6.3f}ms/poll"
+                )
+                _clear_synthetic_hosters()
+
+            hoster_ids = _add_synthetic_hosters(SIMULATION_HOSTER_COUNT)
+            print(f"{SIMULATION_POLL_COUNT} polls on a fresh state of {len(hoster_ids)} hosters:")
+            for name, pick in [("scan", _scan_pick), ("scheduler", hoster_scheduler.pick)]:
+                picked = _simulate(hoster_ids, pick)
+                # (other hosters of the type, with older runs, are picked as well)
+                block_counts = [picked[hoster_id] for hoster_id in set(hoster_ids) | set(picked.keys())]
+                print(
+                    f"  {name:>9} - "
+                    f"hosters with blocks: {len(picked):>5} - "
+                    f"blocks per hoster: min {min(block_counts)}, max {max(block_counts)}"
+                )
+        finally:
+            _clear_synthetic_hosters()
+
+
+if __name__ == "__main__":
+    main()
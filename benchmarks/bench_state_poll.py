@@ -0,0 +1,45 @@
+"""
+compare reading the state of all hosters (as done on every load balanced crawler poll)
+with one request per value against one pipelined HGETALL per hoster
+
+python -m benchmarks.bench_state_poll
+"""
+import timeit
+
+import redislite
+
+from hubgrep_indexer.lib.state_manager.abstract_state_manager import AbstractStateManager
+from hubgrep_indexer.lib.state_manager.redis_state_manager import RedisStateManager
+
+HOSTER_COUNTS = [10, 100, 1000]
+
+
+def main():
+    state_manager = RedisStateManager()
+    state_manager.redis = redislite.Redis()
+
+    for hoster_count in HOSTER_COUNTS:
+        state_manager.redis.flushdb()
+        hoster_prefixes = list(range(hoster_count))
+        for hoster_prefix in hoster_prefixes:
+            state_manager.set_run_created_ts(hoster_prefix)
+            state_manager.set_highest_block_repo_id(hoster_prefix, 1000)
+
+        def poll_per_value():
+            for hoster_prefix in hoster_prefixes:
+                AbstractStateManager.get_state_dict(state_manager, hoster_prefix)
+
+        def poll_pipelined():
+            state_manager.get_state_dicts(hoster_prefixes)
+
+        per_value = min(timeit.repeat(poll_per_value, number=5, repeat=3)) / 5
+        pipelined = min(timeit.repeat(poll_pipelined, number=5, repeat=3)) / 5
+        print(
+            f"{hoster_count:>5} hosters - "
+            f"one request per value: {per_value * 1000:>8.2f}ms/poll - "
+            f"pipelined: {pipelined * 1000:>8.2f}ms/poll"
+        )
+
+
+if __name__ == "__main__":
+    main()
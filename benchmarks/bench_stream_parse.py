@@ -0,0 +1,62 @@
+"""
+compare peak memory of adding a large repo payload
+loaded at once (`json.load`) and streamed (`iter_json_array`)
+
+APP_ENV=testing python -m benchmarks.bench_stream_parse
+"""
+import io
+import json
+import tracemalloc
+
+from hubgrep_indexer.api_blueprint.add_repos import _append_repos
+from hubgrep_indexer.lib.json_stream import iter_json_array
+from benchmarks.helpers import (
+    HOSTER_TYPES,
+    benchmark_app,
+    clear_benchmark_repos,
+    get_benchmark_hosting_service,
+    get_synthetic_repos,
+)
+
+PAYLOAD_SIZES = [10000, 50000]
+
+
+def _peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    with benchmark_app():
+        for hosting_service_type in HOSTER_TYPES:
+            hosting_service = get_benchmark_hosting_service(hosting_service_type)
+            for payload_size in PAYLOAD_SIZES:
+                payload = json.dumps(get_synthetic_repos(hosting_service_type, payload_size)).encode()
+
+                def load_at_once():
+                    repo_dicts = json.load(io.BytesIO(payload))
+                    _append_repos(hosting_service=hosting_service, repo_dicts=repo_dicts)
+
+                def stream():
+                    repo_dicts = iter_json_array(io.BytesIO(payload))
+                    _append_repos(hosting_service=hosting_service, repo_dicts=repo_dicts)
+
+                clear_benchmark_repos(hosting_service)
+                peak_at_once = _peak_memory(load_at_once)
+                clear_benchmark_repos(hosting_service)
+                peak_stream = _peak_memory(stream)
+                clear_benchmark_repos(hosting_service)
+
+                print(
+                    f"{hosting_service_type:>7} {payload_size:>6} repos ({len(payload) / 2**20:.1f}MiB) - "
+                    f"peak at once: {peak_at_once / 2**20:>7.1f}MiB - "
+                    f"peak streamed: {peak_stream / 2**20:>7.1f}MiB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+compare adding repos to the (logged, indexed) partitions and to unlogged run tables without indexes
+(REPOS_UNLOGGED_RUNS) - rows/sec and WAL written, while adding repos and when rotating at the end of the run
+
+(the repo tables get the repo_ident_index_* of the migrations for this, as in production)
+
+APP_ENV=testing python -m benchmarks.bench_unlogged
+"""
+import time
+
+from hubgrep_indexer import db
+from hubgrep_indexer.api_blueprint.add_repos import _append_repos
+from hubgrep_indexer.lib.table_helper import TableHelper
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from benchmarks.helpers import (
+    HOSTER_TYPES,
+    benchmark_app,
+    clear_benchmark_repos,
+    get_benchmark_hosting_service,
+    get_synthetic_repos,
+)
+
+REPO_COUNT = 200000
+CHUNK_COUNT = 20
+
+
+def _get_wal_lsn() -> str:
+    with TableHelper._cursor() as cur:
+        cur.execute("select pg_current_wal_lsn()")
+        return cur.fetchone()[0]
+
+
+def _get_wal_mb(since_lsn: str) -> float:
+    with TableHelper._cursor() as cur:
+        cur.execute("select pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", (since_lsn,))
+        return float(cur.fetchone()[0]) / 1024 / 1024
+
+
+def _measure(hosting_service, repo_dicts) -> dict:
+    repo_class = Repository.repo_class_for_type(hosting_service.type)
+    chunk_size = len(repo_dicts) // CHUNK_COUNT
+
+    wal_lsn = _get_wal_lsn()
+    started = time.time()
+    # like crawlers, in several requests
+    for i in range(CHUNK_COUNT):
+        _append_repos(hosting_service=hosting_service, repo_dicts=repo_dicts[i * chunk_size:(i + 1) * chunk_size])
+    results = dict(add_seconds=time.time() - started, add_wal_mb=_get_wal_mb(wal_lsn))
+
+    wal_lsn = _get_wal_lsn()
+    started = time.time()
+    repo_class.rotate(hosting_service)
+    results.update(rotate_seconds=time.time() - started, rotate_wal_mb=_get_wal_mb(wal_lsn))
+    return results
+
+
+def main():
+    with benchmark_app() as app:
+        for hosting_service_type in HOSTER_TYPES:
+            hosting_service = get_benchmark_hosting_service(hosting_service_type)
+            repo_class = Repository.repo_class_for_type(hosting_service_type)
+            index_name = f"repo_ident_index_{hosting_service_type}"
+            foreign_id = repo_class.get_foreign_id_column()
+            repo_dicts = get_synthetic_repos(hosting_service_type, REPO_COUNT)
+            clear_benchmark_repos(hosting_service)
+            with TableHelper._cursor() as cur:
+                cur.execute(
+                    f"create index if not exists {index_name} "
+                    f"on {repo_class.__tablename__} (hosting_service_id, {foreign_id})"
+                )
+            try:
+                for is_unlogged in (False, True):
+                    app.config["REPOS_UNLOGGED_RUNS"] = is_unlogged
+                    results = _measure(hosting_service, repo_dicts)
+                    print(
+                        f"{hosting_service_type:>7} {'unlogged' if is_unlogged else 'logged':>8} - "
+                        f"add: {REPO_COUNT / results['add_seconds']:>7.0f} rows/s, {results['add_wal_mb']:>6.1f}MB WAL - "
+                        f"rotate: {results['rotate_seconds']:>5.2f}s, {results['rotate_wal_mb']:>6.1f}MB WAL - "
+                        f"total: {results['add_seconds'] + results['rotate_seconds']:>5.2f}s, "
+                        f"{results['add_wal_mb'] + results['rotate_wal_mb']:>6.1f}MB WAL"
+                    )
+            finally:
+                app.config["REPOS_UNLOGGED_RUNS"] = False
+                db.session.commit()
+                with TableHelper._cursor() as cur:
+                    TableHelper.drop_table(cur, repo_class.get_run_table_name(hosting_service))
+                    TableHelper.drop_table(cur, repo_class.get_finished_table_name(hosting_service))
+                    cur.execute(f"drop index if exists {index_name}")
+
+
+if __name__ == "__main__":
+    main()
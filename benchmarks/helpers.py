@@ -0,0 +1,83 @@
+"""
+shared helpers for the benchmark scripts
+
+the benchmarks run against the database and redis configured for the app,
+so run them like
+```
+APP_ENV=testing python -m benchmarks.bench_ingest
+```
+"""
+import copy
+import time
+import base64
+from contextlib import contextmanager
+from typing import List
+
+from hubgrep_indexer import create_app, db
+from hubgrep_indexer.constants import HOST_TYPE_GITHUB, HOST_TYPE_GITEA, HOST_TYPE_GITLAB
+from hubgrep_indexer.models.hosting_service import HostingService
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from tests.mock_repos import mock_github_repos, mock_gitea_repos, mock_gitlab_repos
+
+HOSTER_TYPES = [HOST_TYPE_GITHUB, HOST_TYPE_GITEA, HOST_TYPE_GITLAB]
+
+
+def get_synthetic_repos(hosting_service_type: str, count: int) -> List[dict]:
+    """
+    scale up our mock repos to <count> repos with unique ids
+    """
+    mock_repos = {
+        HOST_TYPE_GITHUB: mock_github_repos,
+        HOST_TYPE_GITEA: mock_gitea_repos,
+        HOST_TYPE_GITLAB: mock_gitlab_repos,
+    }[hosting_service_type]
+    repos = []
+    for i in range(count):
+        repo = copy.deepcopy(mock_repos[i % len(mock_repos)])
+        if hosting_service_type == HOST_TYPE_GITHUB:
+            repo["id"] = base64.b64encode(f"010:Repository{i + 1}".encode()).decode()
+        else:
+            repo["id"] = i + 1
+        repo["name"] = f"{repo['name']}_{i}"
+        repo["description"] = f"synthetic repo number {i} " * 8
+        repos.append(repo)
+    return repos
+
+
+def get_benchmark_hosting_service(hosting_service_type: str) -> HostingService:
+    """
+    get (or add) a hosting service used only for benchmarks
+    """
+    api_url = f"https://benchmark_{hosting_service_type}.invalid/"
+    hosting_service = HostingService.query.filter_by(api_url=api_url).first()
+    if not hosting_service:
+        hosting_service = HostingService()
+        hosting_service.type = hosting_service_type
+        hosting_service.api_url = api_url
+        hosting_service.landingpage_url = api_url
+        hosting_service.api_keys = ["benchmark"]
+        db.session.add(hosting_service)
+        db.session.commit()
+    return hosting_service
+
+
+def clear_benchmark_repos(hosting_service: HostingService):
+    repo_class = Repository.repo_class_for_type(hosting_service.type)
+    repo_class.query.filter_by(hosting_service_id=hosting_service.id).delete()
+    db.session.commit()
+
+
+@contextmanager
+def benchmark_app():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with app.test_request_context():
+            yield app
+
+
+@contextmanager
+def timed(results: dict, key):
+    before = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - before
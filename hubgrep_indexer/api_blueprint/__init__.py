@@ -3,8 +3,8 @@ from flask import Blueprint
 api = Blueprint("api", __name__, url_prefix="/api/v1")
 
 from hubgrep_indexer.api_blueprint.hosters import hosters
-from hubgrep_indexer.api_blueprint.add_repos import add_repos
-from hubgrep_indexer.api_blueprint.get_block import get_block, get_loadbalanced_block
+from hubgrep_indexer.api_blueprint.add_repos import add_repos, add_block_results
+from hubgrep_indexer.api_blueprint.get_block import get_block, get_loadbalanced_block, get_blocks, get_loadbalanced_blocks
 
 """
 # memleak tooling
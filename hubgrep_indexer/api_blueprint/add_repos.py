@@ -1,14 +1,21 @@
 import time
-from typing import List
+from typing import List, Iterable, Union, Tuple, Iterator
 import logging
 
 from flask import request
 from flask import jsonify
+from flask import current_app
 from flask_login import login_required
+from sqlalchemy import table, column
 
 from hubgrep_indexer.models.hosting_service import HostingService
 from hubgrep_indexer.models.repositories.abstract_repository import Repository
 from hubgrep_indexer.lib.state_manager.host_state_helpers import get_state_helper
+from hubgrep_indexer.lib.json_stream import iter_json_array
+from hubgrep_indexer.lib.ingest_spool import IngestSpool
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
+from hubgrep_indexer.lib.table_helper import TableHelper
+from hubgrep_indexer.lib.utils import chunked
 from hubgrep_indexer import db, state_manager, executor
 
 from hubgrep_indexer.api_blueprint import api
@@ -16,23 +23,230 @@ from hubgrep_indexer.api_blueprint import api
 logger = logging.getLogger(__name__)
 
 
-def _append_repos(hosting_service: HostingService, repo_dicts: List[dict]):
-    # add repos to the db :)
-    logger.debug(f"adding repos to {hosting_service}")
-    repo_class = Repository.repo_class_for_type(hosting_service.type)
-    parsed_repos = []
-    for repo_dict in repo_dicts:
+def _insert_repos(repo_class: Repository, rows: List[tuple], table_name: str = None):
+    """
+    insert parsed repo rows (into table_name, or the repo table), using COPY if possible
+    and falling back to plain inserts
+
+    (does not commit)
+    """
+    table_name = table_name or repo_class.__tablename__
+    if current_app.config["INGEST_USE_COPY"] and db.engine.dialect.name == "postgresql":
+        savepoint = db.session.begin_nested()
         try:
-            r = repo_class.from_dict(hosting_service.id, repo_dict)
-            parsed_repos.append(r)
+            # use the sessions connection, so the COPY is part of our session transaction
+            cur = db.session.connection().connection.cursor()
+            repo_class.copy_from_rows(cur, rows, table_name=table_name)
+            savepoint.commit()
+            return
         except Exception:
-            logger.exception(f"could not parse repo dict for {hosting_service}")
-            logger.warning(f"(skipping) repo dict: {repo_dict}")
+            logger.exception(f"(falling back to inserts) could not COPY repos into {table_name}")
+            savepoint.rollback()
+
+    if rows:
+        db.session.execute(
+            table(table_name, *[column(column_name) for column_name in repo_class.row_columns]).insert(),
+            [dict(zip(repo_class.row_columns, row)) for row in rows],
+        )
+
+
+def _upsert_repos(hosting_service: HostingService, repo_class: Repository, rows: List[tuple], run_created_ts: float):
+    """
+    upsert parsed repo rows into the finished table, for incremental runs (see REPOS_INCREMENTAL)
+
+    (does not commit)
+    """
+    # use the sessions connection, so the upsert is part of our session transaction
+    cur = db.session.connection().connection.cursor()
+    repo_class.upsert_rows(cur, hosting_service, rows, run_created_ts=run_created_ts)
+
+
+def _insert_repo_dicts(hosting_service: HostingService, repo_dicts: Iterable[dict]) -> int:
+    """
+    parse and insert repos (without committing)
+
+    repo_dicts can be any iterable (eg. a stream), we parse and insert
+    in chunks of INGEST_CHUNK_SIZE.
+
+    returns the number of inserted repos
+    """
+    repo_class = Repository.repo_class_for_type(hosting_service.type)
+    is_incremental = current_app.config["REPOS_INCREMENTAL"]
+    if is_incremental:
+        run_created_ts = state_manager.get_run_created_ts(hoster_prefix=hosting_service.id)
+    table_name = None
+    if current_app.config["REPOS_UNLOGGED_RUNS"] and not is_incremental:
+        table_name = TableHelper.ensure_hoster_repo_run_table(
+            db.session.connection().connection.cursor(), hosting_service
+        )
+    repo_count = 0
+    for repo_dicts_chunk in chunked(repo_dicts, current_app.config["INGEST_CHUNK_SIZE"]):
+        rows = []
+        for repo_dict in repo_dicts_chunk:
+            try:
+                rows.append(repo_class.row_from_dict(hosting_service.id, repo_dict))
+            except Exception:
+                logger.exception(f"could not parse repo dict for {hosting_service}")
+                logger.warning(f"(skipping) repo dict: {repo_dict}")
+
+        if is_incremental:
+            _upsert_repos(hosting_service=hosting_service, repo_class=repo_class, rows=rows,
+                          run_created_ts=run_created_ts)
+        else:
+            _insert_repos(repo_class=repo_class, rows=rows, table_name=table_name)
+        repo_count += len(rows)
+    return repo_count
+
 
-    db.session.bulk_save_objects(parsed_repos)
+def _append_repos(hosting_service: HostingService, repo_dicts: Iterable[dict]) -> int:
+    """
+    add repos to the db :)
+
+    returns the number of added repos
+    """
+    logger.debug(f"adding repos to {hosting_service}")
+    repo_count = _insert_repo_dicts(hosting_service=hosting_service, repo_dicts=repo_dicts)
     db.session.commit()
+    return repo_count
+
 
-    return parsed_repos
+def _resolve_block_states(
+        hosting_service: HostingService, block_repo_counts: List[Tuple[Union[str, None], int, float]]
+) -> Union[float, None]:
+    """
+    update the run state with the results for several blocks, as (block_uid, repo_count, received_ts) tuples,
+    under a single lock acquisition
+
+    received_ts is when the results were received - it ends the crawl time of the block
+    (waiting for the lock, or in the spool, is not part of it)
+
+    returns the run_created_ts of the run, if it has been finished by this (None otherwise)
+    """
+    state_helper = get_state_helper(hosting_service=hosting_service)
+
+    finished_run_created_ts = None
+    # will block, if the lock is already aquired, and go on after release
+    with state_manager.get_lock(hosting_service.id):
+        for block_uid, repo_count, received_ts in block_repo_counts:
+            # (a new run can only start once this one is finished, so this is the run we might finish)
+            run_created_ts = state_manager.get_run_created_ts(hoster_prefix=hosting_service.id)
+            is_run_finished = state_helper.resolve_state(
+                hosting_service=hosting_service,
+                block_uid=block_uid,
+                repo_count=repo_count,
+                received_ts=received_ts,
+            )
+            if is_run_finished:
+                finished_run_created_ts = run_created_ts
+    return finished_run_created_ts
+
+
+def _resolve_block_state(
+        hosting_service: HostingService, block_uid: Union[str, None], repo_count: int, received_ts: float
+) -> Union[float, None]:
+    """
+    update the run state with the results for a block, received at received_ts
+
+    returns the run_created_ts of the run, if it has been finished by this (None otherwise)
+    """
+    return _resolve_block_states(
+        hosting_service=hosting_service, block_repo_counts=[(block_uid, repo_count, received_ts)]
+    )
+
+
+def _get_request_repo_dicts() -> Iterable[dict]:
+    """
+    the repo dicts of the current request - streamed from the request body, if enabled
+    """
+    if current_app.config["INGEST_STREAM_JSON"]:
+        return iter_json_array(request.stream)
+    return request.json
+
+
+def _get_request_block_results() -> Iterator[Tuple[Union[str, None], List[dict]]]:
+    """
+    the (block_uid, repo_dicts) results of the current request - streamed from the request body, if enabled
+
+    raises ValueError on invalid results
+    """
+    if current_app.config["INGEST_STREAM_JSON"]:
+        block_results = iter_json_array(request.stream)
+    else:
+        block_results = request.json
+    if not isinstance(block_results, Iterable):
+        raise ValueError("expected a list of block results")
+
+    for block_result in block_results:
+        if not isinstance(block_result, dict) or not isinstance(block_result.get("repos", None), list):
+            raise ValueError(f"invalid block result: {block_result}")
+        yield block_result.get("block_uid", None), block_result["repos"]
+
+
+@api.route("/hosters/<hosting_service_id>/blocks", methods=["PUT"])
+@login_required
+def add_block_results(hosting_service_id: int):
+    """
+    Add repository data for several blocks at once.
+
+    The body is a list of block results:
+    [{"block_uid": "<uid>", "repos": [...]}, ...]
+
+    All repos are added in one transaction, and the states of all blocks are resolved
+    under one lock. If INGEST_SPOOL_PATH is set, each block is queued on its own (202).
+    """
+    # the crawler is done with the blocks now
+    received_ts = time.time()
+    hosting_service: HostingService = hoster_registry.get(hosting_service_id)
+    if not hosting_service:
+        return jsonify(status="error", msg="unknown hosting service"), 404
+
+    repo_class = Repository.repo_class_for_type(hosting_service.type)
+    if not repo_class:
+        return jsonify(status="error", msg="unknown repo type"), 403
+
+    if current_app.config["INGEST_SPOOL_PATH"]:
+        spool = IngestSpool(current_app.config["INGEST_SPOOL_PATH"])
+        try:
+            entries = spool.enqueue_block_results(
+                hosting_service_id=hosting_service.id,
+                block_results=_get_request_block_results(),
+                received_ts=received_ts,
+            )
+        except ValueError:
+            logger.exception(f"could not read block results for {hosting_service}")
+            return jsonify(status="error", msg="invalid json"), 400
+        logger.debug(f"queued {len(entries)} block results for {hosting_service}")
+        return jsonify(dict(status="queued")), 202
+
+    logger.debug(f"adding block results to {hosting_service}")
+    ts_db_start = time.time()
+    block_repo_counts = []
+    try:
+        for block_uid, repo_dicts in _get_request_block_results():
+            repo_count = _insert_repo_dicts(hosting_service=hosting_service, repo_dicts=repo_dicts)
+            block_repo_counts.append((block_uid, repo_count, received_ts))
+        db.session.commit()
+    except ValueError:
+        logger.exception(f"could not read block results for {hosting_service}")
+        db.session.rollback()
+        return jsonify(status="error", msg="invalid json"), 400
+
+    ts_db_end = time.time()
+    logger.debug(
+        f"added {sum(count for _, count, _ in block_repo_counts)} repos of {len(block_repo_counts)} blocks "
+        f"for {hosting_service} - took {ts_db_end - ts_db_start}s"
+    )
+    finished_run_created_ts = _resolve_block_states(
+        hosting_service=hosting_service, block_repo_counts=block_repo_counts
+    )
+    logger.debug(
+        f"updated state for {hosting_service} and {len(block_repo_counts)} blocks - took {time.time() - ts_db_end}s"
+    )
+
+    if finished_run_created_ts is not None:
+        executor.submit(hosting_service.handle_finished_run, finished_run_created_ts)
+
+    return jsonify(dict(status="ok")), 200
 
 
 @api.route("/hosters/<hosting_service_id>/", methods=["PUT"])
@@ -44,39 +258,60 @@ def add_repos(hosting_service_id: int, block_uid: int = None):
 
     :param hosting_service_id: int - the registered hosting_service these repos belong to.
     :param block_uid: (optional) int - if this arg is missing the repos will be added without affecting internal state.
+
+    If INGEST_SPOOL_PATH is set, the payload is only validated and queued (202),
+    and added by the ingestion workers (`flask cli ingest-worker`) later on.
     """
-    hosting_service: HostingService = HostingService.query.get(hosting_service_id)
-    repo_dicts = request.json
+    # the crawler is done with the block now
+    received_ts = time.time()
+    hosting_service: HostingService = hoster_registry.get(hosting_service_id)
+    if not hosting_service:
+        return jsonify(status="error", msg="unknown hosting service"), 404
 
     repo_class = Repository.repo_class_for_type(hosting_service.type)
     if not repo_class:
         return jsonify(status="error", msg="unknown repo type"), 403
 
+    if current_app.config["INGEST_SPOOL_PATH"]:
+        # leave adding the repos to the ingestion workers
+        spool = IngestSpool(current_app.config["INGEST_SPOOL_PATH"])
+        try:
+            entry = spool.enqueue(
+                hosting_service_id=hosting_service.id,
+                block_uid=block_uid,
+                stream=request.stream,
+                received_ts=received_ts,
+            )
+        except ValueError:
+            logger.exception(f"could not read repos for {hosting_service}")
+            return jsonify(status="error", msg="invalid json"), 400
+        logger.debug(f"queued repos for {hosting_service} - {entry}")
+        return jsonify(dict(status="queued")), 202
+
     logger.debug(f"adding repos to {hosting_service}")
     ts_db_start = time.time()
-    parsed_repos = _append_repos(
-        hosting_service=hosting_service, repo_dicts=repo_dicts
-    )
+    try:
+        repo_count = _append_repos(
+            hosting_service=hosting_service, repo_dicts=_get_request_repo_dicts()
+        )
+    except ValueError:
+        logger.exception(f"could not read repos for {hosting_service}")
+        db.session.rollback()
+        return jsonify(status="error", msg="invalid json"), 400
 
     ts_db_end = time.time()
     logger.debug(
-        f"added {len(parsed_repos)} repos for {hosting_service} - took {ts_db_end - ts_db_start}s"
+        f"added {repo_count} repos for {hosting_service} - took {ts_db_end - ts_db_start}s"
+    )
+    finished_run_created_ts = _resolve_block_state(
+        hosting_service=hosting_service, block_uid=block_uid, repo_count=repo_count, received_ts=received_ts
     )
-    state_helper = get_state_helper(hosting_service=hosting_service)
-
-    # will block, if the lock is already aquired, and go on after release
-    with state_manager.get_lock(hosting_service_id):
-        is_run_finished = state_helper.resolve_state(
-            hosting_service=hosting_service,
-            block_uid=block_uid,
-            parsed_repos=parsed_repos,
-        )
     ts_state_end = time.time()
     logger.debug(
         f"updated state for {hosting_service} and block uid: {block_uid} - took {ts_state_end - ts_db_end}s"
     )
 
-    if is_run_finished:
-        executor.submit(hosting_service.handle_finished_run)
+    if finished_run_created_ts is not None:
+        executor.submit(hosting_service.handle_finished_run, finished_run_created_ts)
 
     return jsonify(dict(status="ok")), 200
@@ -1,6 +1,8 @@
 import time
 import logging
 from flask import jsonify
+from flask import request
+from flask import current_app
 from flask_login import login_required
 
 from hubgrep_indexer.lib.state_manager.abstract_state_manager import Block
@@ -8,8 +10,10 @@ from hubgrep_indexer.api_blueprint import api
 from hubgrep_indexer.lib.block_helpers import (
     get_block_for_crawler,
     get_loadbalanced_block_for_crawler,
+    get_blocks_for_crawler,
+    get_loadbalanced_blocks_for_crawler,
 )
-from hubgrep_indexer.models.hosting_service import HostingService
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +31,60 @@ def get_loadbalanced_block(hosting_service_type: str):
         return jsonify(block_dict)
 
 
+def _get_request_block_count() -> int:
+    """ how many blocks were asked for - at least 1, at most BLOCK_BATCH_MAX_COUNT """
+    count = request.args.get("count", 1, type=int)
+    return max(1, min(count, current_app.config["BLOCK_BATCH_MAX_COUNT"]))
+
+
+@api.route("/hosters/<hosting_service_type>/loadbalanced_blocks")
+@login_required
+def get_loadbalanced_blocks(hosting_service_type: str):
+    """
+    Get up to ?count=<n> blocks from hosters of this type,
+    spread over the ?hosters=<n> hosters with the oldest runs (default 1).
+    """
+    ts_before = time.time()
+    block_dicts = get_loadbalanced_blocks_for_crawler(
+        hosting_service_type=hosting_service_type,
+        count=_get_request_block_count(),
+        hoster_count=max(1, request.args.get("hosters", 1, type=int)),
+    )
+    logger.debug(f"got {len(block_dicts)} load-balanced blocks - took {time.time() - ts_before}s")
+
+    if not block_dicts:
+        return jsonify(Block.get_sleep_dict())
+    else:
+        return jsonify(block_dicts)
+
+
+@api.route("/hosters/<hosting_service_id>/blocks")
+@login_required
+def get_blocks(hosting_service_id: int):
+    """
+    Get up to ?count=<n> blocks for one hoster.
+    """
+    ts_before = time.time()
+    hosting_service = hoster_registry.get(hosting_service_id)
+    if not hosting_service:
+        return jsonify(status="error", msg="unknown hosting service"), 404
+    block_dicts = get_blocks_for_crawler(hosting_service_id=hosting_service.id, count=_get_request_block_count())
+    logger.debug(f"got {len(block_dicts)} blocks for {hosting_service} - took {time.time() - ts_before}s")
+
+    if not block_dicts:
+        return jsonify(Block.get_sleep_dict())
+    else:
+        return jsonify(block_dicts)
+
+
 @api.route("/hosters/<hosting_service_id>/block")
 @api.route("/hosters/<hosting_service_id>/block", methods=['GET'])
 @login_required
 def get_block(hosting_service_id: int):
     ts_before = time.time()
-    hosting_service = HostingService.query.get(hosting_service_id)
+    hosting_service = hoster_registry.get(hosting_service_id)
+    if not hosting_service:
+        return jsonify(status="error", msg="unknown hosting service"), 404
     block_dict = get_block_for_crawler(hosting_service_id=hosting_service.id)
     logger.debug(f"got a block for {hosting_service} - took {time.time() - ts_before}s")
 
@@ -6,6 +6,7 @@ import logging
 
 from hubgrep_indexer.models.hosting_service import HostingService
 from hubgrep_indexer.lib.hosting_service_validator import HostingServiceValidator
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
 from hubgrep_indexer import db
 
 from hubgrep_indexer.api_blueprint import api
@@ -25,7 +26,7 @@ def hosters():
     """
     if request.method == "GET":
         hosting_services = []
-        for hosting_service in HostingService.query.all():
+        for hosting_service in hoster_registry.all():
             hosting_services.append(
                 hosting_service.to_dict(include_secrets=current_user.is_authenticated, include_exports=True)
             )
@@ -3,5 +3,5 @@ from flask import Blueprint
 cli_bp = Blueprint("cli", __name__)
 
 from hubgrep_indexer.cli_blueprint.hosters import export_hosters, import_hosters
-from hubgrep_indexer.cli_blueprint.repos import export_repos, prune_exports
-
+from hubgrep_indexer.cli_blueprint.repos import export_repos, export_all, prune_exports
+from hubgrep_indexer.cli_blueprint.ingest import ingest_worker
@@ -153,3 +153,12 @@ def delete_api_key(api_url, api_key):
     db.session.add(hosting_service)
     db.session.commit()
     print("deleted api key")
+
+
+@cli_bp.cli.command(help="migrate hoster state in redis to the current layout")
+def migrate_state():
+    for hosting_service in HostingService.query.all():
+        if state_manager.migrate_legacy_state(hoster_prefix=hosting_service.id):
+            print(f"- migrated state for {hosting_service}")
+        else:
+            print(f"- nothing to migrate for {hosting_service}")
@@ -0,0 +1,136 @@
+import time
+import click
+import logging
+from multiprocessing import Process
+from collections import defaultdict
+from typing import List
+
+from flask import current_app
+
+from hubgrep_indexer.api_blueprint.add_repos import _insert_repo_dicts, _resolve_block_states
+from hubgrep_indexer.lib.ingest_spool import IngestSpool, SpoolEntry
+from hubgrep_indexer.lib.json_stream import iter_json_array
+from hubgrep_indexer.models.hosting_service import HostingService
+from hubgrep_indexer.cli_blueprint import cli_bp
+from hubgrep_indexer import db
+
+logger = logging.getLogger(__name__)
+
+
+def _insert_spool_entries(spool: IngestSpool, entries: List[SpoolEntry]) -> dict:
+    """
+    insert the repos of spooled payloads in one transaction
+
+    returns the repo count for each entry
+    """
+    repo_counts = {}
+    for entry in entries:
+        hosting_service = HostingService.query.get(entry.hosting_service_id)
+        with entry.open() as f:
+            repo_counts[entry] = _insert_repo_dicts(
+                hosting_service=hosting_service,
+                repo_dicts=iter_json_array(f, read_size=spool.read_size),
+            )
+    db.session.commit()
+    return repo_counts
+
+
+def _drain_spool(spool: IngestSpool, max_entries: int) -> int:
+    """
+    add a batch of spooled payloads to the db, and resolve their blocks afterwards
+
+    returns the number of consumed payloads
+    """
+    entries = spool.claim(max_entries)
+    if not entries:
+        return 0
+
+    try:
+        repo_counts = _insert_spool_entries(spool, entries)
+    except Exception:
+        logger.exception(f"could not add batch of {len(entries)} payloads, retrying them one by one")
+        db.session.rollback()
+        repo_counts = {}
+        for entry in entries:
+            try:
+                repo_counts.update(_insert_spool_entries(spool, [entry]))
+            except Exception:
+                logger.exception(f"could not add {entry}")
+                db.session.rollback()
+                spool.fail(entry)
+
+    entries_by_hoster = defaultdict(list)
+    for entry in repo_counts.keys():
+        entries_by_hoster[entry.hosting_service_id].append(entry)
+
+    for hosting_service_id, hoster_entries in entries_by_hoster.items():
+        hosting_service = HostingService.query.get(hosting_service_id)
+        try:
+            # resolve all blocks of this hoster under one lock
+            finished_run_created_ts = _resolve_block_states(
+                hosting_service=hosting_service,
+                block_repo_counts=[
+                    (entry.block_uid, repo_counts[entry], entry.received_ts)
+                    for entry in hoster_entries if entry.block_uid
+                ],
+            )
+        except Exception:
+            # their repos are committed already, so a retry adds them again (until rotation removes
+            # the duplicates) - only retry a few times, so the run table doesnt keep on growing
+            logger.exception(f"could not resolve blocks of {len(hoster_entries)} payloads, retrying them")
+            for entry in hoster_entries:
+                spool.retry(entry)
+            continue
+        for entry in hoster_entries:
+            spool.finish(entry)
+        if finished_run_created_ts is not None:
+            # we are a worker already, no need to hand this off
+            hosting_service.handle_finished_run(finished_run_created_ts)
+
+    logger.info(f"added {sum(repo_counts.values())} repos from {len(repo_counts)} payloads")
+    return len(entries)
+
+
+def _run_worker(spool_path: str, batch_size: int, poll_interval: float, once: bool, stale_after: float,
+                max_attempts: int):
+    spool = IngestSpool(spool_path, max_attempts=max_attempts)
+    while True:
+        spool.release_stale(max_age=stale_after)
+        consumed = _drain_spool(spool, max_entries=batch_size)
+        if not consumed:
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+def _run_worker_process(app, *args):
+    # dont share db connections with the parent process
+    with app.app_context():
+        db.engine.dispose()
+        _run_worker(*args)
+
+
+@cli_bp.cli.command(help="add spooled crawler results to the db (see HUBGREP_INGEST_SPOOL_PATH)")
+@click.option("--workers", type=int, default=1, help="number of worker processes")
+@click.option("--batch-size", type=int, default=50, help="payloads added per transaction")
+@click.option("--poll-interval", type=float, default=1.0, help="seconds to wait on an empty spool")
+@click.option("--once", is_flag=True, help="exit once the spool is empty")
+@click.option("--stale-after", type=float, default=3600, help="seconds after which claimed payloads are re-queued")
+@click.option("--max-attempts", type=int, default=3, help="tries to resolve the blocks of a payload, before it fails")
+def ingest_worker(workers, batch_size, poll_interval, once, stale_after, max_attempts):
+    spool_path = current_app.config["INGEST_SPOOL_PATH"]
+    if not spool_path:
+        print("HUBGREP_INGEST_SPOOL_PATH is not set!")
+        exit(1)
+
+    args = (spool_path, batch_size, poll_interval, once, stale_after, max_attempts)
+    if workers == 1:
+        _run_worker(*args)
+        return
+
+    app = current_app._get_current_object()
+    processes = [Process(target=_run_worker_process, args=(app, *args)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
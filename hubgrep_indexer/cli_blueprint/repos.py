@@ -1,7 +1,14 @@
 import click
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
+from flask import current_app
+
+from hubgrep_indexer.constants import EXPORT_FORMAT_CSV, EXPORT_FORMAT_PARQUET
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
+from hubgrep_indexer.lib.table_helper import TableHelper
 from hubgrep_indexer.models.hosting_service import HostingService, ExportMeta
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
 from hubgrep_indexer.cli_blueprint import cli_bp
 
 logger = logging.getLogger(__name__)
@@ -17,6 +24,48 @@ def export_repos(hosting_service):
     hosting_service.export_repos()
 
 
+def _export_hosting_service(app, hosting_service: HostingService) -> bool:
+    """ export a hosting service (on an export-all worker thread) """
+    with app.app_context():
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        with TableHelper._cursor() as cur:
+            has_finished_table = TableHelper.table_exists(cur, repo_class.get_finished_table_name(hosting_service))
+        if not has_finished_table:
+            logger.info(f"(skipping) {hosting_service} has no finished run to export")
+            return False
+        try:
+            hosting_service.export_repos()
+        except Exception:
+            logger.exception(f"(skipping) could not export {hosting_service}")
+            return False
+        return True
+
+
+@cli_bp.cli.command(help="export the repos of all hosting services, several at once")
+@click.option("--workers", type=int, default=None, help="hosting services exported at once (HUBGREP_EXPORT_WORKERS)")
+@click.option("--type", "hosting_service_type", type=str, default=None, help="only export hosters of this type")
+def export_all(workers=None, hosting_service_type=None):
+    """
+    Export all hosting services with a finished run, <workers> at a time.
+
+    Each export runs its raw and unified export at once, so it uses 2 db connections (1 with EXPORT_SINGLE_PASS),
+    and another one with EXPORT_PARQUET - 2 more with EXPORT_DELTAS.
+    """
+    workers = workers or current_app.config["EXPORT_WORKERS"]
+    # (detached from our session, so the workers can use them)
+    if hosting_service_type:
+        hosting_services = hoster_registry.filter_by_type(hosting_service_type)
+    else:
+        hosting_services = hoster_registry.all()
+
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=workers) as export_executor:
+        results = list(export_executor.map(
+            lambda hosting_service: _export_hosting_service(app, hosting_service), hosting_services
+        ))
+    print(f"exported {sum(results)} of {len(hosting_services)} hosting services")
+
+
 @cli_bp.cli.command(help="remove old exports, keep the newest ones")
 @click.option("--keep", type=int, default=3)
 @click.option(
@@ -34,26 +83,15 @@ def prune_exports(keep, hosting_service=None):
     else:
         q = HostingService.query
     for hosting_service in q.all():
-        old_exports_raw = (
-            ExportMeta.query.filter_by(
-                hosting_service_id=hosting_service.id, is_raw=True
-            )
-            .filter(ExportMeta.file_path != None)
-            .order_by(ExportMeta.created_at.desc())
-            .offset(keep)
-        )
-        old_exports_unified = (
-            ExportMeta.query.filter_by(
-                hosting_service_id=hosting_service.id, is_raw=False
-            )
-            .filter(ExportMeta.file_path != None)
-            .order_by(ExportMeta.created_at.desc())
-            .offset(keep)
-        )
-
-        for export in old_exports_raw:
-            print(f"deleting export {export}")
-            export.delete_file()
-        for export in old_exports_unified:
-            print(f"deleting export {export}")
-            export.delete_file()
+        # (unified, export_format, delta) - the newest exports of each kind are kept
+        for unified, export_format, delta in [
+            (False, EXPORT_FORMAT_CSV, False),
+            (True, EXPORT_FORMAT_CSV, False),
+            (True, EXPORT_FORMAT_PARQUET, False),
+            (False, EXPORT_FORMAT_CSV, True),
+            (True, EXPORT_FORMAT_CSV, True),
+        ]:
+            old_exports = ExportMeta.query_exports(hosting_service.id, unified, export_format, delta).offset(keep)
+            for export in old_exports:
+                print(f"deleting export {export}")
+                export.delete_file()
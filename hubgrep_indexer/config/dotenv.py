@@ -1,5 +1,6 @@
 import os
 from hubgrep_indexer.config import Config
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP
 
 
 class DotEnvConfig(Config):
@@ -19,3 +20,55 @@ class DotEnvConfig(Config):
     LOGLEVEL = os.environ.get("HUBGREP_INDEXER_LOGLEVEL", "debug")
 
     BLOCK_MAX_RETRIES = int(os.environ.get("HUBGREP_BLOCK_MAX_RETRIES", 3))
+    # how many blocks a crawler can get in one request
+    BLOCK_BATCH_MAX_COUNT = int(os.environ.get("HUBGREP_BLOCK_BATCH_MAX_COUNT", 100))
+
+    # adapt the block size of each hoster, so that crawling a block takes about BLOCK_TARGET_DURATION seconds
+    BLOCK_SIZE_ADAPTIVE = bool(int(os.environ.get("HUBGREP_BLOCK_SIZE_ADAPTIVE", 1)))
+    BLOCK_TARGET_DURATION = float(os.environ.get("HUBGREP_BLOCK_TARGET_DURATION", 20))
+    # ... and returns about BLOCK_TARGET_REPOS repos at most
+    BLOCK_TARGET_REPOS = int(os.environ.get("HUBGREP_BLOCK_TARGET_REPOS", 1000))
+    BLOCK_SIZE_MIN = int(os.environ.get("HUBGREP_BLOCK_SIZE_MIN", 100))
+    BLOCK_SIZE_MAX = int(os.environ.get("HUBGREP_BLOCK_SIZE_MAX", 100000))
+    # how much the block size can grow (or shrink) after a single block
+    BLOCK_SIZE_MAX_STEP = float(os.environ.get("HUBGREP_BLOCK_SIZE_MAX_STEP", 2))
+
+    # load balancing - how many seconds of run age a handed out block, and an empty block on top of that, cost
+    SCHEDULER_BLOCK_COST = float(os.environ.get("HUBGREP_SCHEDULER_BLOCK_COST", 1))
+    SCHEDULER_EMPTY_BLOCK_COST = float(os.environ.get("HUBGREP_SCHEDULER_EMPTY_BLOCK_COST", 1))
+
+    # insert crawled repos via postgres COPY instead of plain inserts
+    INGEST_USE_COPY = bool(int(os.environ.get("HUBGREP_INGEST_USE_COPY", 1)))
+
+    # parse the repo payload of crawler requests incrementally, instead of loading it at once
+    INGEST_STREAM_JSON = bool(int(os.environ.get("HUBGREP_INGEST_STREAM_JSON", 1)))
+    # how many repos we parse and insert at once
+    INGEST_CHUNK_SIZE = int(os.environ.get("HUBGREP_INGEST_CHUNK_SIZE", 1000))
+
+    # if set, crawler results are queued in this directory and added by `flask cli ingest-worker`
+    INGEST_SPOOL_PATH = os.environ.get("HUBGREP_INGEST_SPOOL_PATH", None)
+
+    # upsert crawled repos into the finished tables during runs, and only mark the missing ones
+    # as removed at the end - instead of rewriting the finished tables on every run
+    REPOS_INCREMENTAL = bool(int(os.environ.get("HUBGREP_REPOS_INCREMENTAL", 0)))
+    # collect the repos of a run in an UNLOGGED table without indexes, which are built when the run is finished
+    # (less WAL and faster inserts - but a postgres crash empties the tables of all running runs)
+    REPOS_UNLOGGED_RUNS = bool(int(os.environ.get("HUBGREP_REPOS_UNLOGGED_RUNS", 0)))
+
+    # hosting services exported at once by `flask cli export-all`
+    EXPORT_WORKERS = int(os.environ.get("HUBGREP_EXPORT_WORKERS", 4))
+    # write the raw and unified export from one read of the repos (1 db connection per export)
+    EXPORT_SINGLE_PASS = bool(int(os.environ.get("HUBGREP_EXPORT_SINGLE_PASS", 0)))
+    # compression of export files - gzip, zstd or none
+    EXPORT_CODEC = os.environ.get("HUBGREP_EXPORT_CODEC", EXPORT_CODEC_GZIP)
+    # compression level, empty (or 0) for the default of the codec (gzip: 9, zstd: 3)
+    EXPORT_COMPRESSION_LEVEL = int(os.environ.get("HUBGREP_EXPORT_COMPRESSION_LEVEL") or 0) or None
+    # zstd compression threads per export file (0: none, -1: one per cpu)
+    EXPORT_COMPRESSION_THREADS = int(os.environ.get("HUBGREP_EXPORT_COMPRESSION_THREADS", -1))
+    # make a (typed) unified parquet export as well, compressed internally with EXPORT_CODEC
+    EXPORT_PARQUET = bool(int(os.environ.get("HUBGREP_EXPORT_PARQUET", 0)))
+    # (about) repos per parquet row group
+    EXPORT_PARQUET_ROW_GROUP_SIZE = int(os.environ.get("HUBGREP_EXPORT_PARQUET_ROW_GROUP_SIZE", 100000))
+    # make delta exports (added, changed and removed repos) against the previous run as well,
+    # keeps the previous finished table until the next rotation (not with REPOS_INCREMENTAL)
+    EXPORT_DELTAS = bool(int(os.environ.get("HUBGREP_EXPORT_DELTAS", 0)))
@@ -1,5 +1,6 @@
 import os
 from hubgrep_indexer.config import Config
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP
 
 
 class TestingConfig(Config):
@@ -19,3 +20,31 @@ class TestingConfig(Config):
     LOGIN_DISABLED = True
 
     BLOCK_MAX_RETRIES = 3
+    BLOCK_BATCH_MAX_COUNT = 100
+
+    BLOCK_SIZE_ADAPTIVE = False
+    BLOCK_TARGET_DURATION = 20
+    BLOCK_TARGET_REPOS = 1000
+    BLOCK_SIZE_MIN = 100
+    BLOCK_SIZE_MAX = 100000
+    BLOCK_SIZE_MAX_STEP = 2
+
+    SCHEDULER_BLOCK_COST = 1
+    SCHEDULER_EMPTY_BLOCK_COST = 1
+
+    INGEST_USE_COPY = True
+    INGEST_STREAM_JSON = True
+    INGEST_CHUNK_SIZE = 1000
+    INGEST_SPOOL_PATH = None
+
+    REPOS_INCREMENTAL = False
+    REPOS_UNLOGGED_RUNS = False
+
+    EXPORT_WORKERS = 2
+    EXPORT_SINGLE_PASS = False
+    EXPORT_CODEC = EXPORT_CODEC_GZIP
+    EXPORT_COMPRESSION_LEVEL = None
+    EXPORT_COMPRESSION_THREADS = 0
+    EXPORT_PARQUET = False
+    EXPORT_PARQUET_ROW_GROUP_SIZE = 2
+    EXPORT_DELTAS = False
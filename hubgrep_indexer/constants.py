@@ -3,6 +3,13 @@ HOST_TYPE_GITHUB = "github"
 HOST_TYPE_GITEA = "gitea"
 HOST_TYPE_GITLAB = "gitlab"
 
+# export
+EXPORT_CODEC_GZIP = "gzip"
+EXPORT_CODEC_ZSTD = "zstd"
+EXPORT_CODEC_NONE = "none"
+EXPORT_FORMAT_CSV = "csv"
+EXPORT_FORMAT_PARQUET = "parquet"
+
 # block
 BLOCK_STATUS_CREATED = "created"
 BLOCK_STATUS_READY = "ready"
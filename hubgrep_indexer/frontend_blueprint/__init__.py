@@ -1,7 +1,7 @@
 from flask import Blueprint
 from flask import jsonify
 
-from hubgrep_indexer.models.hosting_service import HostingService
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
 from hubgrep_indexer import state_manager
 
 frontend = Blueprint("frontend", __name__)
@@ -10,7 +10,7 @@ frontend = Blueprint("frontend", __name__)
 @frontend.route("/")
 def index():
     services_highest_ids = []
-    for hosting_service in HostingService.query.all():
+    for hosting_service in hoster_registry.all():
         services_highest_ids.append(hosting_service.to_dict(include_exports=True))
 
     return jsonify(sorted(services_highest_ids, key=lambda d: d["id"], reverse=True))
@@ -18,10 +18,12 @@ def index():
 
 @frontend.route("/state")
 def state():
+    hosting_services = hoster_registry.all()
+    state_dicts = state_manager.get_state_dicts([hosting_service.id for hosting_service in hosting_services])
     states = {}
-    for hosting_service in HostingService.query.all():
+    for hosting_service in hosting_services:
         states[hosting_service.hoster_name] = dict(
-            state=state_manager.get_state_dict(hosting_service.id),
+            state=state_dicts[hosting_service.id],
             id=hosting_service.id,
         )
     return jsonify(states)
@@ -1,14 +1,83 @@
 import logging
 import time
 import json
+import math
+import re
+import struct
 import uuid
-from typing import List
+from itertools import accumulate, chain
+from typing import List, Union
 from flask import url_for, current_app
 
 from hubgrep_indexer.constants import BLOCK_STATUS_CREATED, BLOCK_STATUS_READY, BLOCK_STATUS_SLEEP
 
 logger = logging.getLogger(__name__)
 
+# compact block encoding, as stored in the state manager:
+#   header: version, uid (16 bytes), run_created_ts (NaN for None), from_id, to_id, number of attempts
+#   attempts_at, as doubles
+#   status, length prefixed
+#   number of ids (-1 for None), followed by the first id and the deltas between ids,
+#   packed with the narrowest struct format that fits all of them
+BLOCK_ENCODING_VERSION = 1
+_BLOCK_HEADER = struct.Struct("<B16sdqqH")
+_BLOCK_ATTEMPT_CODE = "d"
+_BLOCK_ATTEMPT = struct.Struct(f"<{_BLOCK_ATTEMPT_CODE}")
+_BLOCK_STATUS_LENGTH = struct.Struct("<B")
+_BLOCK_IDS_HEADER = struct.Struct("<icq")
+_BLOCK_IDS_DELTA_FORMATS = [(b"h", 2 ** 15), (b"i", 2 ** 31), (b"q", 2 ** 63)]
+
+# lua scripts write blocks in redis as well (see redis_state_manager), with the struct library of redis.
+# it uses other codes for some formats, so they get the formats translated from the ones above.
+_LUA_STRUCT_CODES = {
+    "c": "c1", "b": "b", "B": "B", "h": "h", "H": "H", "i": "i4", "I": "I4", "q": "i8", "Q": "I8", "d": "d",
+}
+
+
+def _get_lua_struct_format(python_struct: struct.Struct) -> str:
+    byte_order, codes = python_struct.format[0], python_struct.format[1:]
+    lua_codes = []
+    for count, code in re.findall(r"(\d*)(\w)", codes):
+        if code == "s":
+            lua_codes.append(f"c{count or 1}")
+        else:
+            lua_codes.append(_LUA_STRUCT_CODES[code] * int(count or 1))
+    return byte_order + "".join(lua_codes)
+
+
+BLOCK_HEADER_LUA_FORMAT = _get_lua_struct_format(_BLOCK_HEADER)
+BLOCK_ATTEMPT_LUA_FORMAT = _get_lua_struct_format(_BLOCK_ATTEMPT)
+
+
+def _encode_ids(ids: Union[List[int], None]) -> bytes:
+    if ids is None:
+        return _BLOCK_IDS_HEADER.pack(-1, b"h", 0)
+    if not ids:
+        return _BLOCK_IDS_HEADER.pack(0, b"h", 0)
+
+    deltas = [repo_id - previous_id for previous_id, repo_id in zip(ids, ids[1:])]
+    max_delta = max((abs(delta) for delta in deltas), default=0)
+    delta_format = next(f for f, limit in _BLOCK_IDS_DELTA_FORMATS if max_delta < limit)
+    return _BLOCK_IDS_HEADER.pack(len(ids), delta_format, ids[0]) + struct.pack(
+        f"<{len(deltas)}{delta_format.decode()}", *deltas
+    )
+
+
+def encode_block_tail(status: str, ids: Union[List[int], None]) -> bytes:
+    """ The encoding of a block after its attempts - its status and ids. """
+    status = status.encode("utf-8")
+    return _BLOCK_STATUS_LENGTH.pack(len(status)) + status + _encode_ids(ids)
+
+
+def _decode_ids(data: bytes, offset: int) -> Union[List[int], None]:
+    count, delta_format, first_id = _BLOCK_IDS_HEADER.unpack_from(data, offset)
+    if count < 0:
+        return None
+    if count == 0:
+        return []
+    deltas = struct.unpack_from(f"<{count - 1}{delta_format.decode()}", data, offset + _BLOCK_IDS_HEADER.size)
+    return list(accumulate(chain((first_id,), deltas)))
+
 
 class Block:
     """
@@ -100,6 +169,52 @@ class Block:
         d = self.to_dict()
         return json.dumps(d)
 
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Block":
+        """
+        Decode a block stored by "to_bytes".
+
+        Hoster data is not part of the encoding, it is attached when the block is handed to a crawler.
+        Blocks stored as json (before the compact encoding) are still understood.
+        """
+        if data[:1] == b"{":
+            return cls.from_json(data)
+
+        version, uid, run_created_ts, from_id, to_id, attempt_count = _BLOCK_HEADER.unpack_from(data)
+        if version != BLOCK_ENCODING_VERSION:
+            raise ValueError(f"unknown block encoding version: {version}")
+        offset = _BLOCK_HEADER.size
+        attempts_at = list(struct.unpack_from(f"<{attempt_count}{_BLOCK_ATTEMPT_CODE}", data, offset))
+        offset += attempt_count * _BLOCK_ATTEMPT.size
+        (status_length,) = _BLOCK_STATUS_LENGTH.unpack_from(data, offset)
+        offset += _BLOCK_STATUS_LENGTH.size
+        status = data[offset:offset + status_length].decode("utf-8")
+        offset += status_length
+
+        block = Block()
+        block.uid = uuid.UUID(bytes=uid).hex
+        block.run_created_ts = None if math.isnan(run_created_ts) else run_created_ts
+        block.from_id = from_id
+        block.to_id = to_id
+        block.attempts_at = attempts_at
+        block.status = status
+        block.ids = _decode_ids(data, offset)
+        return block
+
+    def to_bytes(self) -> bytes:
+        return b"".join([
+            _BLOCK_HEADER.pack(
+                BLOCK_ENCODING_VERSION,
+                uuid.UUID(hex=self.uid).bytes,
+                self.run_created_ts if self.run_created_ts is not None else math.nan,
+                self.from_id,
+                self.to_id,
+                len(self.attempts_at),
+            ),
+            struct.pack(f"<{len(self.attempts_at)}{_BLOCK_ATTEMPT_CODE}", *self.attempts_at),
+            encode_block_tail(self.status, self.ids),
+        ])
+
     @classmethod
     def get_sleep_dict(cls) -> dict:
         return {
@@ -4,7 +4,7 @@ helpers to generate block dicts for the crawlers
 
 import logging
 import time
-from typing import Dict, Union
+from typing import Dict, Union, List
 from flask import request
 from flask import current_app
 
@@ -13,6 +13,8 @@ from hubgrep_indexer.constants import BLOCK_STATUS_READY, CRAWLER_HEADER_MACHINE
     CRAWLER_MACHINE_ID_DEFAULT, CRAWLER_CORRELATION_ID_DEFAULT
 from hubgrep_indexer.lib.utils import obscurify_secret
 from hubgrep_indexer.models.hosting_service import HostingService
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
+from hubgrep_indexer.lib.hoster_scheduler import hoster_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -25,30 +27,50 @@ def _state_is_too_old(state):
     return False
 
 
-def _get_block_dict(hosting_service_id) -> Dict:
-    timed_out_block = state_manager.get_timed_out_block(hosting_service_id)
-    if timed_out_block:
-        logger.info(f"re-attempting timed out block, uid: {timed_out_block.uid}")
-        block = timed_out_block
-    else:
+def _get_block_dicts(hoster_block_counts: Dict[int, int]) -> List[Dict]:
+    """
+    Get up to <count> blocks per hoster, timed out blocks first, new blocks are allocated in one go.
+    """
+    hoster_blocks = {hosting_service_id: [] for hosting_service_id in hoster_block_counts.keys()}
+    new_block_counts = {}
+    for hosting_service_id, block_count in hoster_block_counts.items():
+        blocks = hoster_blocks[hosting_service_id]
+        blocks.extend(state_manager.get_timed_out_blocks(hosting_service_id, count=block_count))
+        for block in blocks:
+            logger.info(f"re-attempting timed out block, uid: {block.uid}")
+        if len(blocks) == block_count:
+            continue
+
         has_run_hit_end = state_manager.get_has_run_hit_end(hoster_prefix=hosting_service_id)
-        blocks_list = state_manager.get_blocks_list(hoster_prefix=hosting_service_id)
-        if has_run_hit_end and blocks_list:
+        if has_run_hit_end and state_manager.count_blocks(hoster_prefix=hosting_service_id):
             # we hit the end, but blocks are still open - dont start the next run yet
             logger.debug("we have been asked for a block, but we hit the end and are still waiting for blocks")
-            return None
-        block = state_manager.get_next_block(hosting_service_id)
+            continue
+        new_block_counts[hosting_service_id] = block_count - len(blocks)
 
-    hosting_service = HostingService.query.get(hosting_service_id)
-    logger.info(f"getting block for {hosting_service}")
+    for hosting_service_id, new_blocks in state_manager.get_next_blocks(new_block_counts).items():
+        hoster_blocks[hosting_service_id].extend(new_blocks)
 
-    api_key = resolve_api_key(hosting_service=hosting_service)
-    block.hosting_service = hosting_service.to_dict(include_secrets=True, api_key=api_key)
+    block_dicts = []
+    for hosting_service_id, blocks in hoster_blocks.items():
+        if not blocks:
+            continue
+        hosting_service = hoster_registry.get(hosting_service_id)
+        logger.info(f"getting {len(blocks)} block(s) for {hosting_service}")
 
-    if block.status != BLOCK_STATUS_READY:
-        logger.warning(f'expected block status "{BLOCK_STATUS_READY}" - block "{block}"')
+        api_key = resolve_api_key(hosting_service=hosting_service)
+        hosting_service_dict = hosting_service.to_dict(include_secrets=True, api_key=api_key)
+        for block in blocks:
+            block.hosting_service = hosting_service_dict
+            if block.status != BLOCK_STATUS_READY:
+                logger.warning(f'expected block status "{BLOCK_STATUS_READY}" - block "{block}"')
+            block_dicts.append(block.to_dict())
+    return block_dicts
 
-    return block.to_dict()
+
+def _get_block_dict(hosting_service_id) -> Union[Dict, None]:
+    block_dicts = _get_block_dicts({hosting_service_id: 1})
+    return block_dicts[0] if block_dicts else None
 
 
 def get_block_for_crawler(hosting_service_id) -> Union[Dict, None]:
@@ -60,49 +82,43 @@ def get_block_for_crawler(hosting_service_id) -> Union[Dict, None]:
 
 def get_loadbalanced_block_for_crawler(hosting_service_type: str) -> Union[Dict, None]:
     """
-    get a block from a hoster of type <type>.
+    get a block from the most urgent crawlable hoster of type <type> (see hoster_scheduler).
+    """
+    hoster_ids = hoster_scheduler.pick(hosting_service_type)
+    if not hoster_ids:
+        # everything up to date, nothing to do
+        logger.warning("no crawlable hosters!")
+        return None
 
-    behaviour is still a bit wonky.
+    logger.debug(f"creating block for hoster {hoster_ids[0]}:")
+    return _get_block_dict(hoster_ids[0])
 
-    In the first round, running from an empty state_manager,
-    this will hand out the first block of each hoster in order they come from
-    the db, because the "run_created_ts" is initially `0`, and is then updated
-    to `time.time()` on the first created block.
 
-    That means that everything with created_ts==0 will be run for the first block,
-    and then it will complete a whole hoster, then the next one...
+def get_blocks_for_crawler(hosting_service_id, count: int) -> List[Dict]:
     """
-    # get all states
-    hoster_id_state = {}
-    for hosting_service in HostingService.query.filter_by(type=hosting_service_type).all():
-        hoster_id_state[hosting_service.id] = state_manager.get_state_dict(
-            hoster_prefix=hosting_service.id
-        )
-
-    # remove everything finished recently
-    crawlable_hosters = {}
-    for hoster_id, state in hoster_id_state.items():
-        # logger.debug(f"checking hoster {hoster_id}")
-        if _state_is_too_old(state):
-            # logger.debug(f"hoster {hoster_id} would be crawlable...")
-            crawlable_hosters[hoster_id] = state
-
-    if not crawlable_hosters:
-        # everything up to date, nothing to do
+    get up to <count> blocks of one hoster (if its due for crawling).
+    """
+    state = state_manager.get_state_dict(hoster_prefix=hosting_service_id)
+    if _state_is_too_old(state):
+        return _get_block_dicts({hosting_service_id: count})
+    return []
+
+
+def get_loadbalanced_blocks_for_crawler(hosting_service_type: str, count: int, hoster_count: int = 1) -> List[Dict]:
+    """
+    get up to <count> blocks from hosters of type <type>.
+
+    blocks are spread round-robin over the <hoster_count> most urgent crawlable hosters.
+    """
+    crawlable_hoster_ids = hoster_scheduler.pick(hosting_service_type, hoster_count=hoster_count, block_count=count)
+    if not crawlable_hoster_ids:
         logger.warning("no crawlable hosters!")
-        return None
+        return []
 
-    logger.debug(f"crawlable hosters: {crawlable_hosters.keys()}")
-    # get the oldest one in crawlable_hosters
-    oldest_hoster_id, oldest_hoster_state = min(
-        crawlable_hosters.items(),
-        key=lambda d: d[1].get(
-            "run_created_ts",
-        ),
-    )
-    logger.debug(f"creating block for hoster {oldest_hoster_id}:")
-    logger.debug(f"state {oldest_hoster_state}:")
-    return _get_block_dict(oldest_hoster_id)
+    hoster_block_counts = {hoster_id: 0 for hoster_id in crawlable_hoster_ids}
+    for i in range(count):
+        hoster_block_counts[crawlable_hoster_ids[i % len(crawlable_hoster_ids)]] += 1
+    return _get_block_dicts(hoster_block_counts)
 
 
 def resolve_api_key(hosting_service: HostingService) -> Union[str, None]:
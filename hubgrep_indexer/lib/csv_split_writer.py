@@ -0,0 +1,55 @@
+"""
+a file-like object for the csv output of a postgres COPY, writing some of the fields of every record
+into one file, and some into another - so several exports can be made from one COPY
+"""
+import re
+from typing import BinaryIO, List, Union
+
+# a field and the delimiter or line end after it, quoted fields may contain both
+_FIELD_PATTERN = re.compile(rb'("(?:[^"]|"")*"|[^;"]*)(;|\n)')
+
+
+def split_csv_record(record: bytes) -> List[bytes]:
+    """
+    Split a ";" delimited, "\\n" terminated csv record (as written by COPY) into its fields.
+
+    The fields are kept as they are (i.e. still quoted), so they can be joined again as they were.
+    """
+    if b'"' not in record:
+        return record[:-1].split(b";")
+    return [match.group(1) for match in _FIELD_PATTERN.finditer(record)]
+
+
+class CsvSplitOutput:
+    def __init__(self, file: BinaryIO, field_indexes: List[int], header: Union[List[str], None] = None):
+        """
+        write the fields at <field_indexes> of each record to <file>
+
+        the header of the COPY is used, unless another <header> is given
+        """
+        self.file = file
+        self.field_indexes = field_indexes
+        self.header = header
+
+
+class CsvSplitWriter:
+    """
+    Write fields of the records of a COPY ... TO STDOUT (delimiter ';' csv header) into several outputs.
+
+    Relies on the COPY handing over one record per write, as libpq returns COPY data row by row.
+    """
+
+    def __init__(self, outputs: List[CsvSplitOutput]):
+        self.outputs = outputs
+        self._is_header = True
+
+    def write(self, record: bytes) -> int:
+        fields = split_csv_record(record)
+        for output in self.outputs:
+            if self._is_header and output.header:
+                line = ";".join(output.header).encode()
+            else:
+                line = b";".join([fields[i] for i in output.field_indexes])
+            output.file.write(line + b"\n")
+        self._is_header = False
+        return len(record)
@@ -0,0 +1,54 @@
+"""
+compression codecs for export files
+
+- gzip: the default, readable everywhere (level 1-9, 9 is slow on big exports)
+- zstd: much faster to write and read at a similar ratio, compresses on several threads
+- none: plain csv
+"""
+import gzip
+from typing import BinaryIO, Union
+
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_CODEC_NONE
+
+_FILE_EXTENSIONS = {
+    EXPORT_CODEC_GZIP: ".gz",
+    EXPORT_CODEC_ZSTD: ".zst",
+    EXPORT_CODEC_NONE: "",
+}
+
+# used when no level is configured
+_DEFAULT_LEVELS = {
+    EXPORT_CODEC_GZIP: 9,
+    EXPORT_CODEC_ZSTD: 3,
+}
+
+
+def _check_codec(codec: str):
+    if codec not in _FILE_EXTENSIONS:
+        raise ValueError(f"unknown export codec '{codec}' (expected one of {', '.join(_FILE_EXTENSIONS)})")
+
+
+def get_file_extension(codec: str) -> str:
+    """ the extension of files compressed with <codec>, e.g. ".gz" (appended to ".csv") """
+    _check_codec(codec)
+    return _FILE_EXTENSIONS[codec]
+
+
+def open_export_file(path: str, codec: str, level: Union[int, None] = None, threads: int = 0) -> BinaryIO:
+    """
+    open <path> for writing, compressing with <codec>
+
+    <level> falls back to the default of the codec, <threads> only applies to zstd
+    (0: compress on the calling thread, -1: one thread per cpu)
+    """
+    _check_codec(codec)
+    if level is None:
+        level = _DEFAULT_LEVELS.get(codec)
+    if codec == EXPORT_CODEC_GZIP:
+        return gzip.open(path, "wb", compresslevel=level)
+    if codec == EXPORT_CODEC_ZSTD:
+        # only needed with zstd exports
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+        return compressor.stream_writer(open(path, "wb"), closefd=True)
+    return open(path, "wb")
@@ -0,0 +1,82 @@
+"""
+in-process cache of the hosting services, so request handling doesnt query them on every request
+
+every process (i.e. gunicorn worker) keeps its own copy, and reloads it when the
+hosters version in the state manager changes. the version is bumped whenever changes
+to hosting services are committed (see hubgrep_indexer.models.hosting_service).
+"""
+import time
+import logging
+import threading
+from typing import Dict, List, Union
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from hubgrep_indexer import db, state_manager
+from hubgrep_indexer.models.hosting_service import HostingService
+
+logger = logging.getLogger(__name__)
+
+
+class HosterRegistry:
+    """
+    Cached hosting services, accessed by id.
+
+    The cached instances are detached from any db session - treat them as read-only.
+    """
+    # unknown ids reload the hosters at most this often (seconds)
+    miss_reload_interval = 10
+
+    def __init__(self):
+        self._hosters: Dict[int, HostingService] = {}
+        self._version = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._hosters = {}
+            self._version = None
+            self._loaded_at = 0
+
+    def _load(self, version: int):
+        columns = HostingService.__table__.columns
+        hosters = {}
+        # query plain rows, so we dont touch instances of the current session
+        for row in db.session.query(*columns):
+            hosting_service = HostingService(**{column.key: row[i] for i, column in enumerate(columns)})
+            make_transient_to_detached(hosting_service)
+            hosters[hosting_service.id] = hosting_service
+        with self._lock:
+            self._hosters = hosters
+            self._version = version
+            self._loaded_at = time.time()
+        logger.debug(f"loaded {len(hosters)} hosting services (version {version})")
+
+    def _get_hosters(self) -> Dict[int, HostingService]:
+        version = state_manager.get_hosters_version()
+        if version != self._version:
+            self._load(version)
+        return self._hosters
+
+    def get(self, hosting_service_id) -> Union[HostingService, None]:
+        """ The hosting service, or None for unknown (or invalid) ids. """
+        try:
+            hosting_service_id = int(hosting_service_id)
+        except (TypeError, ValueError):
+            return None
+        hosting_service = self._get_hosters().get(hosting_service_id)
+        if hosting_service is None and time.time() - self._loaded_at >= self.miss_reload_interval:
+            # might have been added without the version getting bumped (yet) - have another look
+            self._load(self._version)
+            hosting_service = self._hosters.get(hosting_service_id)
+        return hosting_service
+
+    def all(self) -> List[HostingService]:
+        return sorted(self._get_hosters().values(), key=lambda hosting_service: hosting_service.id)
+
+    def filter_by_type(self, hosting_service_type: str) -> List[HostingService]:
+        return [hosting_service for hosting_service in self.all() if hosting_service.type == hosting_service_type]
+
+
+hoster_registry = HosterRegistry()
@@ -0,0 +1,74 @@
+"""
+picks the hosters the load balanced crawlers get their blocks from
+
+the hosters of each type are kept in a sorted set in the state manager, scored by priority,
+so picking the next hoster is a single O(log n) lookup instead of checking the state of every hoster.
+
+the score of a hoster starts at its run_created_ts (oldest run first). every block handed out
+adds SCHEDULER_BLOCK_COST to it, and every empty block SCHEDULER_EMPTY_BLOCK_COST on top,
+so hosters with the same run age take turns, and hosters yielding nothing fall behind.
+hosters which finished their run wait in a separate set, until their run is OLD_RUN_AGE old.
+
+the schedule is rebuilt from the hoster states whenever the hosting services change.
+"""
+import logging
+import time
+from typing import List
+
+from flask import current_app
+
+from hubgrep_indexer import state_manager
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
+from hubgrep_indexer.models.hosting_service import HostingService
+
+logger = logging.getLogger(__name__)
+
+
+class HosterScheduler:
+    def rebuild(self, hosting_service_type: str):
+        """ Build the schedule of a hoster type from the current hoster states. """
+        version = state_manager.get_hosters_version()
+        hoster_ids = [hosting_service.id for hosting_service in hoster_registry.filter_by_type(hosting_service_type)]
+        crawlable = {}
+        finished = {}
+        for hoster_id, state in state_manager.get_state_dicts(hoster_prefixes=hoster_ids).items():
+            if state["run_is_finished"]:
+                finished[hoster_id] = state["run_created_ts"]
+            else:
+                crawlable[hoster_id] = state["run_created_ts"]
+        state_manager.set_schedule(hosting_service_type, crawlable=crawlable, finished=finished, version=version)
+        logger.debug(f"rebuilt {hosting_service_type} schedule (version {version}) - "
+                     f"{len(crawlable)} crawlable, {len(finished)} finished hosters")
+
+    def pick(self, hosting_service_type: str, hoster_count: int = 1, block_count: int = 1) -> List[int]:
+        """
+        Ids of up to <hoster_count> crawlable hosters of a type, most urgent first.
+
+        They are charged for <block_count> blocks, spread round-robin over them.
+        """
+        finished_before_ts = time.time() - current_app.config["OLD_RUN_AGE"]
+        block_cost = current_app.config["SCHEDULER_BLOCK_COST"]
+        hoster_ids = state_manager.pick_scheduled_hosters(
+            hosting_service_type, finished_before_ts, hoster_count, block_count, block_cost
+        )
+        if hoster_ids is None:
+            # hosting services changed since the schedule was built
+            self.rebuild(hosting_service_type)
+            hoster_ids = state_manager.pick_scheduled_hosters(
+                hosting_service_type, finished_before_ts, hoster_count, block_count, block_cost
+            ) or []
+        return hoster_ids
+
+    def finish_run(self, hosting_service: HostingService, run_created_ts: float):
+        """ The run of a hoster hit its end - dont pick it until the run is old enough. """
+        state_manager.finish_scheduled_hoster(hosting_service.type, hosting_service.id, run_created_ts)
+
+    def resolve_block(self, hosting_service: HostingService, repo_count: int):
+        """ A block came back from a crawler. """
+        if repo_count == 0:
+            state_manager.delay_scheduled_hoster(
+                hosting_service.type, hosting_service.id, current_app.config["SCHEDULER_EMPTY_BLOCK_COST"]
+            )
+
+
+hoster_scheduler = HosterScheduler()
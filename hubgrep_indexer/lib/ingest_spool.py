@@ -0,0 +1,219 @@
+"""
+a spool directory for crawler results, which are added to the db later by ingestion workers
+(see `flask cli ingest-worker`)
+"""
+import os
+import json
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import List, Union, Iterable, Tuple
+
+from hubgrep_indexer.lib.json_stream import iter_json_array
+
+logger = logging.getLogger(__name__)
+
+
+class _TeeStream:
+    """
+    a readable stream, which writes everything read from it into a file as well
+    """
+
+    def __init__(self, stream, file):
+        self.stream = stream
+        self.file = file
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.file.write(data)
+        return data
+
+
+class SpoolEntry:
+    """
+    a spooled payload of repos for a hosting service (and optionally a block)
+    """
+    hosting_service_id: int
+    block_uid: Union[str, None]
+    # when the payload was received (which is when its block was crawled)
+    received_ts: float
+    attempts: int
+    uid: str
+    path: Path
+
+    def __init__(self, path: Path):
+        self.path = path
+        # block uids may contain "_" - the other parts never do
+        hosting_service_id, name = path.stem.split("_", 1)
+        block_uid, received_ms, attempts, self.uid = name.rsplit("_", 3)
+        self.hosting_service_id = int(hosting_service_id)
+        self.block_uid = None if block_uid == IngestSpool.no_block_uid else block_uid
+        self.received_ts = int(received_ms) / 1000
+        self.attempts = int(attempts)
+
+    def open(self):
+        return open(self.path, "rb")
+
+    def __repr__(self) -> str:
+        return f"<SpoolEntry {self.path.name}>"
+
+
+class IngestSpool:
+    """
+    crawler payloads waiting to be added to the db, stored as files in a directory.
+
+    payloads are written under a temporary name, and renamed once they are complete.
+    workers claim a payload by renaming it, so each is only consumed by one worker.
+    ```
+    <path>/<hosting_service_id>_<block_uid>_<received_ms>_<attempts>_<uuid>.json      - queued
+    <path>/<hosting_service_id>_<block_uid>_<received_ms>_<attempts>_<uuid>.claimed   - a worker is adding it
+    <path>/failed/...                                                                 - could not be added
+    ```
+    received_ms is when the payload was received (in ms), attempts counts how often it was retried (see `retry`).
+    """
+    no_block_uid = "none"
+    queued_suffix = ".json"
+    claimed_suffix = ".claimed"
+    tmp_suffix = ".tmp"
+
+    def __init__(self, path: str, read_size: int = 64 * 1024, max_attempts: int = 3):
+        self.path = Path(path)
+        self.failed_path = self.path.joinpath("failed")
+        self.read_size = read_size
+        self.max_attempts = max_attempts
+        self.failed_path.mkdir(parents=True, exist_ok=True)
+
+    def enqueue(
+            self, hosting_service_id: int, block_uid: Union[str, None], stream, received_ts: float = None
+    ) -> SpoolEntry:
+        """
+        spool a json array of repos, read from a (request) stream and received at received_ts (default: now).
+
+        the payload is validated while writing it,
+        raises ValueError on invalid json (and spools nothing)
+        """
+        name = self._get_entry_name(hosting_service_id, block_uid, received_ts=received_ts)
+        tmp_path = self.path.joinpath(name + self.tmp_suffix)
+        try:
+            with open(tmp_path, "wb") as f:
+                for _ in iter_json_array(_TeeStream(stream, f), read_size=self.read_size):
+                    pass
+            queued_path = self.path.joinpath(name + self.queued_suffix)
+            os.rename(tmp_path, queued_path)
+        except Exception:
+            tmp_path.unlink()
+            raise
+        return SpoolEntry(queued_path)
+
+    def enqueue_block_results(
+            self, hosting_service_id: int, block_results: Iterable[Tuple[Union[str, None], List[dict]]],
+            received_ts: float = None
+    ) -> List[SpoolEntry]:
+        """
+        spool the repos of several blocks, as (block_uid, repo_dicts) tuples - one entry per block,
+        received at received_ts (default: now).
+
+        entries are only queued once all of them are written, so if
+        reading block_results raises, nothing is spooled.
+        """
+        names = []
+        try:
+            for block_uid, repo_dicts in block_results:
+                name = self._get_entry_name(hosting_service_id, block_uid, received_ts=received_ts)
+                names.append(name)
+                with open(self.path.joinpath(name + self.tmp_suffix), "w") as f:
+                    json.dump(repo_dicts, f)
+        except Exception:
+            for name in names:
+                self.path.joinpath(name + self.tmp_suffix).unlink()
+            raise
+
+        entries = []
+        for name in names:
+            queued_path = self.path.joinpath(name + self.queued_suffix)
+            os.rename(self.path.joinpath(name + self.tmp_suffix), queued_path)
+            entries.append(SpoolEntry(queued_path))
+        return entries
+
+    def _get_entry_name(
+            self, hosting_service_id: int, block_uid: Union[str, None], received_ts: float = None,
+            attempts: int = 0, uid: str = None
+    ) -> str:
+        block_uid = block_uid or self.no_block_uid
+        received_ms = round((received_ts or time.time()) * 1000)
+        uid = uid or uuid.uuid4().hex
+        return f"{hosting_service_id}_{block_uid}_{received_ms}_{attempts}_{uid}"
+
+    def queued_count(self) -> int:
+        return len(list(self.path.glob("*" + self.queued_suffix)))
+
+    def claim(self, max_entries: int) -> List[SpoolEntry]:
+        """
+        claim (at most) max_entries queued payloads, oldest first
+        """
+        queued_paths = sorted(self.path.glob("*" + self.queued_suffix), key=lambda p: p.stat().st_mtime)
+        entries = []
+        for queued_path in queued_paths:
+            if len(entries) >= max_entries:
+                break
+            claimed_path = queued_path.with_suffix(self.claimed_suffix)
+            try:
+                os.rename(queued_path, claimed_path)
+            except FileNotFoundError:
+                # another worker was faster
+                continue
+            # mark when we claimed it
+            os.utime(claimed_path)
+            entries.append(SpoolEntry(claimed_path))
+        return entries
+
+    def release_stale(self, max_age: float) -> List[SpoolEntry]:
+        """
+        Put payloads back into the queue, which have been claimed longer than max_age seconds ago
+        (likely by a worker which died on the way).
+        """
+        released = []
+        claimed_before = time.time() - max_age
+        for claimed_path in self.path.glob("*" + self.claimed_suffix):
+            entry = SpoolEntry(claimed_path)
+            try:
+                if claimed_path.stat().st_mtime < claimed_before:
+                    self.release(entry)
+                    released.append(entry)
+            except FileNotFoundError:
+                # finished in the meantime
+                continue
+        if released:
+            logger.warning(f"released stale payloads: {released}")
+        return released
+
+    def finish(self, entry: SpoolEntry):
+        """ Remove a payload after it has been added. """
+        entry.path.unlink()
+
+    def release(self, entry: SpoolEntry):
+        """ Put a claimed payload back into the queue. """
+        os.rename(entry.path, entry.path.with_suffix(self.queued_suffix))
+
+    def retry(self, entry: SpoolEntry) -> bool:
+        """
+        Put a claimed payload back into the queue for another attempt,
+        or move it to the failed ones once it had max_attempts.
+
+        Returns False, if it failed.
+        """
+        attempts = entry.attempts + 1
+        if attempts >= self.max_attempts:
+            self.fail(entry)
+            return False
+        name = self._get_entry_name(
+            entry.hosting_service_id, entry.block_uid, received_ts=entry.received_ts, attempts=attempts, uid=entry.uid
+        )
+        os.rename(entry.path, self.path.joinpath(name + self.queued_suffix))
+        return True
+
+    def fail(self, entry: SpoolEntry):
+        """ Move a payload which could not be added out of the queue, keeping it for inspection. """
+        logger.warning(f"moving failed payload to {self.failed_path}: {entry}")
+        os.rename(entry.path, self.failed_path.joinpath(entry.path.name))
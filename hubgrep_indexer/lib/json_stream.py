@@ -0,0 +1,98 @@
+"""
+incremental json parsing, for request bodies we dont want to hold in memory at once
+"""
+import json
+import codecs
+from typing import Iterator, Any
+
+WHITESPACE = " \t\n\r"
+
+
+class _StreamBuffer:
+    """
+    decoded text read from a binary stream, refilled on demand
+    """
+
+    def __init__(self, stream, read_size: int):
+        self.stream = stream
+        self.read_size = read_size
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read_more(self) -> bool:
+        """
+        append the next chunk of the stream, dropping what we already consumed
+
+        returns False if there is nothing left to read
+        """
+        if self.eof:
+            return False
+        data = self.stream.read(self.read_size)
+        if not data:
+            self.eof = True
+            self.text = self.text[self.pos:] + self._decoder.decode(b"", final=True)
+        else:
+            self.text = self.text[self.pos:] + self._decoder.decode(data)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        skip whitespace and return the next char (or "" at the end of the stream)
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f'expected "{char}" in json stream, found "{found}"')
+        self.pos += 1
+
+
+def iter_json_array(stream, read_size: int = 64 * 1024) -> Iterator[Any]:
+    """
+    iterate over the items of a top-level json array, read from a binary stream
+
+    only the item currently being decoded (plus one read) is held in memory,
+    so the size of the whole document does not matter.
+
+    raises ValueError on invalid json
+    """
+    buffer = _StreamBuffer(stream, read_size)
+    decoder = json.JSONDecoder()
+
+    buffer.expect("[")
+    if buffer.peek() == "]":
+        buffer.pos += 1
+    else:
+        while True:
+            buffer.peek()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer.text, buffer.pos)
+                    # a value not followed by a delimiter might continue in the next read (eg. numbers)
+                    if buffer.eof or (end < len(buffer.text) and buffer.text[end] in WHITESPACE + ",]"):
+                        break
+                except json.JSONDecodeError:
+                    if buffer.eof:
+                        raise
+                buffer.read_more()
+            buffer.pos = end
+            yield item
+
+            if buffer.peek() == ",":
+                buffer.pos += 1
+                continue
+            buffer.expect("]")
+            break
+
+    if buffer.peek() != "":
+        raise ValueError("unexpected data after json array")
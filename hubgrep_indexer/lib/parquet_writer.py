@@ -0,0 +1,119 @@
+"""
+convert the csv output of a postgres COPY into a parquet file, while its being written
+
+the csv goes through a pipe and is parsed by arrow (typed, with a given schema) - collected into
+row groups, so exports never hold all repos in memory.
+"""
+import os
+import threading
+from typing import BinaryIO, Callable, List, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_CODEC_NONE
+
+# arrow types of the postgres types used for typed exports
+_ARROW_TYPES = {
+    "text": pa.string(),
+    "bigint": pa.int64(),
+    "boolean": pa.bool_(),
+    "timestamp": pa.timestamp("us"),
+}
+
+# parquet compression of the export codecs (compressing each column chunk)
+_PARQUET_COMPRESSIONS = {
+    EXPORT_CODEC_GZIP: "gzip",
+    EXPORT_CODEC_ZSTD: "zstd",
+    EXPORT_CODEC_NONE: "none",
+}
+
+
+def get_arrow_schema(column_types: List[Tuple[str, str]]) -> pa.Schema:
+    """
+    the schema for (column name, postgres type) pairs, all columns are nullable
+    """
+    return pa.schema([(name, _ARROW_TYPES[pg_type]) for name, pg_type in column_types])
+
+
+def _open_copy_csv(csv_file: BinaryIO, schema: pa.Schema) -> pa_csv.CSVStreamingReader:
+    """
+    read a csv as written by "COPY ... TO STDOUT csv header" - unquoted empty fields are null, booleans are t/f
+    """
+    return pa_csv.open_csv(
+        csv_file,
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=schema,
+            true_values=["t"],
+            false_values=["f"],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+
+def _write_row_groups(reader: pa_csv.CSVStreamingReader, writer: pq.ParquetWriter, row_group_size: int) -> int:
+    row_count = 0
+    batches = []
+    batch_row_count = 0
+    for batch in reader:
+        batches.append(batch)
+        batch_row_count += batch.num_rows
+        if batch_row_count >= row_group_size:
+            writer.write_table(pa.Table.from_batches(batches), row_group_size=batch_row_count)
+            row_count += batch_row_count
+            batches = []
+            batch_row_count = 0
+    if batches:
+        writer.write_table(pa.Table.from_batches(batches), row_group_size=batch_row_count)
+        row_count += batch_row_count
+    return row_count
+
+
+def write_parquet(
+    copy_csv: Callable[[BinaryIO], None],
+    path: str,
+    schema: pa.Schema,
+    codec: str,
+    compression_level: Union[int, None] = None,
+    row_group_size: int = 100000,
+) -> int:
+    """
+    write the csv which <copy_csv> writes into the file it gets (on a separate thread) to a parquet file at <path>
+
+    <copy_csv> should run a "COPY ... TO STDOUT csv header" with the columns of the <schema>, in order.
+    row groups have about <row_group_size> rows.
+
+    returns the number of rows written
+    """
+    if codec not in _PARQUET_COMPRESSIONS:
+        raise ValueError(f"unknown export codec '{codec}' (expected one of {', '.join(_PARQUET_COMPRESSIONS)})")
+
+    read_fd, write_fd = os.pipe()
+    csv_in, csv_out = os.fdopen(read_fd, "rb"), os.fdopen(write_fd, "wb")
+    copy_errors = []
+
+    def run_copy():
+        try:
+            copy_csv(csv_out)
+        except BaseException as e:
+            copy_errors.append(e)
+        finally:
+            csv_out.close()
+
+    copy_thread = threading.Thread(target=run_copy, daemon=True)
+    copy_thread.start()
+    try:
+        with pq.ParquetWriter(
+            path, schema, compression=_PARQUET_COMPRESSIONS[codec], compression_level=compression_level
+        ) as writer:
+            return _write_row_groups(_open_copy_csv(csv_in, schema), writer, row_group_size)
+    finally:
+        # (unblocks the copy, if reading stopped early)
+        csv_in.close()
+        copy_thread.join()
+        # a copy failing because reading stopped early isnt the cause
+        if copy_errors and not isinstance(copy_errors[0], BrokenPipeError):
+            raise IOError(f"writing the csv for {path} failed") from copy_errors[0]
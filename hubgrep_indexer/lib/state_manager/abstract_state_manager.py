@@ -1,6 +1,6 @@
 import time
 import logging
-from typing import Dict, Union, List
+from typing import Dict, Union, List, Iterator
 
 from hubgrep_indexer.lib.block import Block
 
@@ -13,7 +13,7 @@ class AbstractStateManager:
     """
 
     def __init__(self, batch_size=1000, block_timeout=60):
-        self.batch_size = batch_size  # block size for a crawler
+        self.batch_size = batch_size  # default block size for a crawler, hosters can adapt their own
         self.block_timeout = block_timeout  # seconds
 
     def init_app(self, *args, **kwargs):
@@ -26,8 +26,13 @@ class AbstractStateManager:
             empty_results_count=self.get_empty_results_counter(hoster_prefix),
             run_created_ts=self.get_run_created_ts(hoster_prefix),
             run_is_finished=self.get_has_run_hit_end(hoster_prefix),
+            batch_size=self.get_batch_size(hoster_prefix),
         )
 
+    def get_state_dicts(self, hoster_prefixes: List[str]) -> Dict[str, Dict]:
+        """Get the state dicts of many hosters at once, accessed by their prefix."""
+        return {hoster_prefix: self.get_state_dict(hoster_prefix) for hoster_prefix in hoster_prefixes}
+
     def get_highest_block_repo_id(self, hoster_prefix: str) -> int:
         """
         The highest (last) repo_id we have tried asking for,
@@ -66,6 +71,20 @@ class AbstractStateManager:
         prev = self.get_empty_results_counter(hoster_prefix=hoster_prefix)
         self.set_empty_results_counter(hoster_prefix=hoster_prefix, count=prev + amount)
 
+    def get_batch_size(self, hoster_prefix: str) -> int:
+        """
+        Block size (number of ids) for new blocks of a hoster.
+        Defaults to batch_size, until it was adapted for the hoster.
+        """
+        raise NotImplementedError
+
+    def set_batch_size(self, hoster_prefix: str, batch_size: int):
+        """
+        Block size (number of ids) for new blocks of a hoster.
+        Kept across runs, as it depends on the hoster rather than the run.
+        """
+        raise NotImplementedError
+
     def push_new_block(self, hoster_prefix: str, block: Block) -> None:
         raise NotImplementedError
 
@@ -81,11 +100,21 @@ class AbstractStateManager:
         """Get all blocks in a list."""
         raise NotImplementedError
 
+    def iter_blocks(self, hoster_prefix: str) -> Iterator[Block]:
+        """Iterate over all blocks, for callers which dont need them all at once."""
+        return iter(self.get_blocks_list(hoster_prefix=hoster_prefix))
+
     def get_block(self, hoster_prefix: str, block_uid: str) -> Block:
         """Return an existing Block or None"""
         blocks = self.get_blocks_dict(hoster_prefix=hoster_prefix)
         return blocks.get(block_uid, None)
 
+    def has_block(self, hoster_prefix: str, block_uid: str) -> bool:
+        return self.get_block(hoster_prefix=hoster_prefix, block_uid=block_uid) is not None
+
+    def count_blocks(self, hoster_prefix: str) -> int:
+        return len(self.get_blocks_list(hoster_prefix=hoster_prefix))
+
     def update_block(self, hoster_prefix: str, block: Block):
         """Store changes applied to a block."""
         raise NotImplementedError
@@ -142,7 +171,7 @@ class AbstractStateManager:
             self.finish_run(hoster_prefix)
         highest_block_repo_id = self.get_highest_block_repo_id(hoster_prefix)
         from_id = highest_block_repo_id + 1
-        to_id = highest_block_repo_id + self.batch_size
+        to_id = highest_block_repo_id + self.get_batch_size(hoster_prefix)
 
         run_created_ts = self.get_run_created_ts(hoster_prefix)
         if not run_created_ts:
@@ -154,6 +183,15 @@ class AbstractStateManager:
         self.set_highest_block_repo_id(hoster_prefix, block.to_id)
         return block
 
+    def get_next_blocks(self, hoster_block_counts: Dict[str, int]) -> Dict[str, List[Block]]:
+        """
+        Return new blocks for several hosters at once, accessed by their prefix.
+        """
+        return {
+            hoster_prefix: [self.get_next_block(hoster_prefix) for _ in range(block_count)]
+            for hoster_prefix, block_count in hoster_block_counts.items()
+        }
+
     def get_timed_out_block(self, hoster_prefix: str, timestamp_now=None) -> Union[Block, None]:
         """
         Try to get a block we didnt receive an answer for.
@@ -172,15 +210,68 @@ class AbstractStateManager:
                 return block
         return None
 
+    def get_timed_out_blocks(self, hoster_prefix: str, count: int, timestamp_now=None) -> List[Block]:
+        """
+        Get up to <count> blocks we didnt receive an answer for.
+        """
+        blocks = []
+        while len(blocks) < count:
+            block = self.get_timed_out_block(hoster_prefix, timestamp_now=timestamp_now)
+            if not block or block.uid in {b.uid for b in blocks}:
+                # (with a very short timeout, we might see a block we just re-attempted again)
+                break
+            blocks.append(block)
+        return blocks
+
     def delete_dead_blocks(self, hoster_prefix) -> List[Block]:
         """ Delete "dead" blocks from state. Return deleted blocks. """
         dead_blocks = []
-        for block in self.get_blocks_list(hoster_prefix):
+        for block in self.iter_blocks(hoster_prefix):
             if block.is_dead():
                 dead_blocks.append(block)
                 self._delete_block(hoster_prefix, block.uid)
         return dead_blocks
 
+    def get_hosters_version(self) -> int:
+        """ Version of the registered hosting services, changes whenever they do. """
+        raise NotImplementedError
+
+    def bump_hosters_version(self):
+        raise NotImplementedError
+
+    def get_schedule_version(self, hosting_service_type: str) -> Union[int, None]:
+        """ Hosters version the schedule of a hoster type was built for, None if it was never built. """
+        raise NotImplementedError
+
+    def set_schedule(self, hosting_service_type: str, crawlable: Dict[int, float], finished: Dict[int, float],
+                     version: int):
+        """
+        Replace the schedule of a hoster type.
+
+        crawlable: priority score by hoster id, lowest is picked first
+        finished: run_created_ts by hoster id, for hosters which finished their run
+        """
+        raise NotImplementedError
+
+    def pick_scheduled_hosters(self, hosting_service_type: str, finished_before_ts: float, hoster_count: int,
+                               block_count: int, block_cost: float) -> Union[List[int], None]:
+        """
+        Pick the <hoster_count> crawlable hosters with the lowest scores, after making hosters
+        whose run was created before <finished_before_ts> crawlable again.
+
+        Picked hosters pay <block_cost> per block, with <block_count> blocks spread round-robin over them.
+        Returns None if the schedule was built for another hosters version.
+        """
+        raise NotImplementedError
+
+    def finish_scheduled_hoster(self, hosting_service_type: str, hosting_service_id: int, run_created_ts: float):
+        """ Take a hoster out of the crawlable hosters, until its run is old enough. """
+        raise NotImplementedError
+
+    def delay_scheduled_hoster(self, hosting_service_type: str, hosting_service_id: int, amount: float):
+        """ Add <amount> to the score of a crawlable hoster. """
+        raise NotImplementedError
+
     def set_machine_api_key(self, hosting_service_id: str, machine_id: str, api_key: str):
         """ Attach an api_key to a machine_id. """
         raise NotImplementedError
@@ -1,5 +1,7 @@
+import time
 import logging
-from typing import Union, List
+from typing import Union, List, Iterator
+from flask import current_app
 
 from hubgrep_indexer.lib.block import Block
 from hubgrep_indexer.constants import (
@@ -8,6 +10,7 @@ from hubgrep_indexer.constants import (
     HOST_TYPE_GITLAB,
 )
 from hubgrep_indexer.models.hosting_service import HostingService
+from hubgrep_indexer.lib.hoster_scheduler import hoster_scheduler
 from hubgrep_indexer import state_manager
 
 logger = logging.getLogger(__name__)
@@ -23,7 +26,8 @@ class IStateHelper:
             cls,
             hosting_service: HostingService,
             block_uid: str,
-            parsed_repos: list,
+            repo_count: int,
+            received_ts: float = None,
     ) -> Union[bool, None]:
         """
         Default implementation for resolving if we have consumed all
@@ -33,6 +37,8 @@ class IStateHelper:
         and reaching the end of pagination means we reset the
         state and start over.
 
+        received_ts is when the block results came in (default: now), to tell how long it took to crawl the block.
+
         Returns state_manager.get_run_is_finished() OR None
         - true/false if we reached end, None if block is unrelated to the current run
         """
@@ -54,15 +60,19 @@ class IStateHelper:
         state_manager.finish_block(
             hoster_prefix=hosting_service.id, block_uid=block_uid
         )
-        if len(parsed_repos) == 0:
+        if repo_count == 0:
             state_manager.increment_empty_results_counter(hoster_prefix=hosting_service.id, amount=1)
         else:
             state_manager.set_empty_results_counter(hoster_prefix=hosting_service.id, count=0)
+        cls.adapt_batch_size(
+            hosting_service=hosting_service, block=block, repo_count=repo_count, timestamp_now=received_ts
+        )
+        hoster_scheduler.resolve_block(hosting_service=hosting_service, repo_count=repo_count)
 
         # check on the effects of the block transaction
         has_reached_end = cls.has_reached_end(
             hosting_service=hosting_service,
-            parsed_repos=parsed_repos,
+            repo_count=repo_count,
             block=block,
         )
         has_too_many_empty_results = cls.has_too_many_consecutive_empty_results(
@@ -72,9 +82,11 @@ class IStateHelper:
         if has_reached_end:
             logger.info(f"{hosting_service} - run has reached end")
             state_manager.set_has_run_hit_end(hoster_prefix=hosting_service.id, has_hit_end=True)
+            hoster_scheduler.finish_run(hosting_service=hosting_service, run_created_ts=run_created_ts)
         elif has_too_many_empty_results:
             logger.info(f"{hosting_service} - run has reached max empty results")
             state_manager.set_has_run_hit_end(hoster_prefix=hosting_service.id, has_hit_end=True)
+            hoster_scheduler.finish_run(hosting_service=hosting_service, run_created_ts=run_created_ts)
         else:
             # we are somewhere in the middle of a hosters repos
             # and we count up our confirmed ids and continue
@@ -82,7 +94,10 @@ class IStateHelper:
                 repo_id = block.ids[-1]
             else:
                 repo_id = block.to_id
-            state_manager.set_highest_confirmed_block_repo_id(hoster_prefix=hosting_service.id, repo_id=repo_id)
+            # blocks can come back out of order - dont move back behind a (bigger) block confirmed before
+            highest_confirmed_id = state_manager.get_highest_confirmed_block_repo_id(hoster_prefix=hosting_service.id)
+            if repo_id > highest_confirmed_id:
+                state_manager.set_highest_confirmed_block_repo_id(hoster_prefix=hosting_service.id, repo_id=repo_id)
 
         # 3 - indicate if a run is over, or still needs work
         has_run_hit_end = state_manager.get_has_run_hit_end(hoster_prefix=hosting_service.id)
@@ -93,10 +108,10 @@ class IStateHelper:
             if dead_blocks:
                 logger.warning(f"{hosting_service} - deleted dead blocks: {dead_blocks}")
 
-            active_blocks = cls.get_active_blocks(hosting_service=hosting_service, run_created_ts=run_created_ts)
-            if len(active_blocks) > 0:
+            if cls.has_active_blocks(hosting_service=hosting_service, run_created_ts=run_created_ts):
                 logger.info(
-                    f"{hosting_service} - run will finish once all remaining open blocks are finished: {active_blocks}")
+                    f"{hosting_service} - run will finish once all remaining open blocks are finished "
+                    f"({state_manager.count_blocks(hoster_prefix=hosting_service.id)} open)")
                 return False
 
             logger.info(f"{hosting_service} - run completed - last processed block: {block}")
@@ -105,14 +120,23 @@ class IStateHelper:
             return False
 
 
+    @classmethod
+    def _iter_active_blocks(cls, hosting_service: HostingService, run_created_ts: float) -> Iterator[Block]:
+        for block in state_manager.iter_blocks(hoster_prefix=hosting_service.id):
+            if block.run_created_ts == run_created_ts and not block.is_dead():
+                yield block
+
     @classmethod
     def get_active_blocks(cls, hosting_service: HostingService, run_created_ts: float) -> List[Block]:
         """ Retrieve all blocks still active in the current run. """
-        active_blocks = []
-        for block in state_manager.get_blocks_list(hoster_prefix=hosting_service.id):
-            if block.run_created_ts == run_created_ts and not block.is_dead():
-                active_blocks.append(block)
-        return active_blocks
+        return list(cls._iter_active_blocks(hosting_service=hosting_service, run_created_ts=run_created_ts))
+
+    @classmethod
+    def has_active_blocks(cls, hosting_service: HostingService, run_created_ts: float) -> bool:
+        """ Are there blocks still active in the current run? Stops at the first one found. """
+        for _ in cls._iter_active_blocks(hosting_service=hosting_service, run_created_ts=run_created_ts):
+            return True
+        return False
 
     @classmethod
     def has_too_many_consecutive_empty_results(cls, hosting_service: HostingService) -> bool:
@@ -123,7 +147,7 @@ class IStateHelper:
         return has_too_many_empty_results
 
     @classmethod
-    def has_reached_end(cls, hosting_service: HostingService, block: Block, parsed_repos: list) -> bool:
+    def has_reached_end(cls, hosting_service: HostingService, block: Block, repo_count: int) -> bool:
         """
         Try to find out if we reached the end of repos on this hoster.
 
@@ -136,7 +160,7 @@ class IStateHelper:
         we reach our conclusion that it's the end of pagination.
         """
         # we dont reason about partially filled results, only check/assume end of run if we reached 0 results
-        if len(parsed_repos) > 0:
+        if repo_count > 0:
             return False
 
         # get the ending repo id from a block we have seen containing results
@@ -144,15 +168,60 @@ class IStateHelper:
             hoster_prefix=hosting_service.id
         )
 
-        # get ending repo id of the block after the last confirmed one
-        last_block_id = highest_confirmed_id + state_manager.batch_size
-        # check if our current empty block comes after a block with confirmed results
-        return block.to_id == last_block_id
+        # check if our current empty block comes right after a block with confirmed results
+        # (block sizes can vary, so we compare where it starts)
+        return block.from_id == highest_confirmed_id + 1
+
+    @classmethod
+    def adapt_batch_size(cls, hosting_service: HostingService, block: Block, repo_count: int,
+                         timestamp_now: float = None) -> int:
+        """
+        Scale the block size of a hoster, so crawling a block takes about BLOCK_TARGET_DURATION seconds,
+        and returns no more than about BLOCK_TARGET_REPOS repos.
+
+        Crawl time is measured from the last attempt of the finished block, until timestamp_now (when
+        its results came in). A block with results gets the size it would have needed for the target
+        duration - but no more ids than it takes for BLOCK_TARGET_REPOS repos, at its yield (repos per id).
+        So dense id ranges dont end up in huge payloads, and sparse ones only grow as fast as crawling allows.
+        An empty block (no yield) was a wasted round trip, so we grow as fast as allowed.
+
+        The size moves by at most BLOCK_SIZE_MAX_STEP per block, and is averaged with the current
+        size - crawlers still return blocks handed out with an older size.
+
+        Returns the block size for the next blocks.
+        """
+        batch_size = state_manager.get_batch_size(hoster_prefix=hosting_service.id)
+        config = current_app.config
+        if not config["BLOCK_SIZE_ADAPTIVE"] or block.ids:
+            # blocks of cached ids dont tell us anything about the id ranges
+            return batch_size
+
+        if not timestamp_now:
+            timestamp_now = time.time()
+        block_size = block.to_id - block.from_id + 1
+        duration = timestamp_now - block.attempts_at[-1]
+        max_step = config["BLOCK_SIZE_MAX_STEP"]
+        if repo_count == 0 or duration <= 0:
+            step = max_step
+        else:
+            duration_block_size = config["BLOCK_TARGET_DURATION"] / duration * block_size
+            repo_yield = repo_count / block_size
+            repos_block_size = config["BLOCK_TARGET_REPOS"] / repo_yield
+            target_block_size = min(duration_block_size, repos_block_size)
+            step = min(max(target_block_size / block_size, 1 / max_step), max_step)
+
+        new_batch_size = round((batch_size + block_size * step) / 2)
+        new_batch_size = min(max(new_batch_size, config["BLOCK_SIZE_MIN"]), config["BLOCK_SIZE_MAX"])
+        if new_batch_size != batch_size:
+            logger.debug(f"{hosting_service} - block size {batch_size} -> {new_batch_size} "
+                         f"({repo_count} repos in {duration:.1f}s for {block_size} ids)")
+            state_manager.set_batch_size(hoster_prefix=hosting_service.id, batch_size=new_batch_size)
+        return new_batch_size
 
 
 class GitHubStateHelper(IStateHelper):
     @classmethod
-    def has_reached_end(cls, hosting_service: HostingService, block: Block, parsed_repos: list) -> bool:
+    def has_reached_end(cls, hosting_service: HostingService, block: Block, repo_count: int) -> bool:
         """
         We default to False for GitHub as we receive lots of gaps within results.
         Maybe a whole block contains private repos and we get nothing back,
@@ -1,15 +1,180 @@
 import time
+import uuid
 import logging
-from typing import Union, List, Dict
+from itertools import chain
+from typing import Union, List, Dict, Iterator
 
 from hubgrep_indexer.lib.state_manager.abstract_state_manager import AbstractStateManager
-from hubgrep_indexer.lib.block import Block
+from hubgrep_indexer.lib.block import Block, BLOCK_ENCODING_VERSION, BLOCK_HEADER_LUA_FORMAT, \
+    BLOCK_ATTEMPT_LUA_FORMAT, encode_block_tail
+from hubgrep_indexer.constants import BLOCK_STATUS_CREATED
 
 import redis
 import redislite
 
 logger = logging.getLogger(__name__)
 
+# hand out new blocks for one or more hosters, atomically and in one round trip
+#
+# KEYS: per hoster - state hash, blocks hash, block attempts sorted set
+# ARGV: timestamp now, encoding version, lua struct formats of the block header and attempts,
+#       the encoded rest of a new block (status and ids, see Block.to_bytes),
+#       state fields - batch size, run is finished, run created ts, highest block repo id,
+#       number of state fields to reset, followed by their field/value pairs (see RedisStateManager._get_reset_state),
+#       then per hoster - default batch size, block count, and a block uid and raw block uid (16 bytes) per block
+#
+# if the run of a hoster hit its end, it is reset for a new run first.
+# the batch size of a hoster is used, if it has one in its state hash.
+# blocks are stored in the compact encoding of Block.to_bytes, the layout is passed in from lib/block.py
+NEXT_BLOCKS_SCRIPT = """
+local now = ARGV[1]
+local encoding_version = tonumber(ARGV[2])
+local header_format = ARGV[3]
+local attempt_format = ARGV[4]
+local block_tail = ARGV[5]
+local batch_size_field = ARGV[6]
+local run_is_finished_field = ARGV[7]
+local run_created_ts_field = ARGV[8]
+local highest_block_repo_id_field = ARGV[9]
+local reset_state = {}
+for i = 11, 10 + tonumber(ARGV[10]) * 2 do
+    table.insert(reset_state, ARGV[i])
+end
+local arg_i = 11 + #reset_state
+local results = {}
+
+for hoster_i = 0, #KEYS / 3 - 1 do
+    local state_key = KEYS[hoster_i * 3 + 1]
+    local blocks_key = KEYS[hoster_i * 3 + 2]
+    local block_attempts_key = KEYS[hoster_i * 3 + 3]
+    local batch_size = tonumber(redis.call("HGET", state_key, batch_size_field) or 0)
+    if batch_size <= 0 then
+        batch_size = tonumber(ARGV[arg_i])
+    end
+    local block_count = tonumber(ARGV[arg_i + 1])
+    arg_i = arg_i + 2
+
+    local was_reset = 0
+    if redis.call("HGET", state_key, run_is_finished_field) == "1" then
+        redis.call("HSET", state_key, unpack(reset_state))
+        redis.call("DEL", blocks_key, block_attempts_key)
+        was_reset = 1
+    end
+
+    local run_created_ts = redis.call("HGET", state_key, run_created_ts_field)
+    if not run_created_ts or tonumber(run_created_ts) == 0 then
+        run_created_ts = now
+        redis.call("HSET", state_key, run_created_ts_field, run_created_ts)
+    end
+
+    local to_id = redis.call("HINCRBY", state_key, highest_block_repo_id_field, batch_size * block_count)
+    local from_id = to_id - batch_size * block_count + 1
+    local blocks = {}
+    for block_i = 0, block_count - 1 do
+        local uid = ARGV[arg_i]
+        local raw_uid = ARGV[arg_i + 1]
+        arg_i = arg_i + 2
+
+        local block_from_id = from_id + block_i * batch_size
+        local block_data = struct.pack(header_format,
+                encoding_version, raw_uid, tonumber(run_created_ts),
+                block_from_id, block_from_id + batch_size - 1, 1) ..
+            struct.pack(attempt_format, tonumber(now)) ..
+            block_tail
+        redis.call("HSET", blocks_key, uid, block_data)
+        redis.call("ZADD", block_attempts_key, now, uid)
+        table.insert(blocks, block_data)
+    end
+    table.insert(results, {was_reset, blocks})
+end
+return results
+"""
+
+# claim blocks we didnt receive an answer for, oldest first
+#
+# KEYS: blocks hash, block attempts sorted set
+# ARGV: timestamp now, blocks attempted before this are timed out, max number of blocks,
+#       lua struct formats of the block header and attempts
+#
+# a claimed block gets "now" appended to its attempts, and is not timed out anymore, so concurrent
+# requests never claim the same block. uids of blocks which are gone already are dropped on the way.
+# (with a very short timeout, we might see a block we just claimed again - then we are done)
+# blocks stored as json (before the compact encoding) are claimed as they are, without the new attempt.
+CLAIM_TIMED_OUT_BLOCKS_SCRIPT = """
+local now = ARGV[1]
+local timed_out_before = "(" .. ARGV[2]
+local count = tonumber(ARGV[3])
+local header_format = ARGV[4]
+local attempt_format = ARGV[5]
+local claimed = {}
+local claimed_uids = {}
+
+while #claimed < count do
+    local uids = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", timed_out_before, "LIMIT", 0, count - #claimed)
+    if #uids == 0 or claimed_uids[uids[1]] then
+        break
+    end
+    for _, uid in ipairs(uids) do
+        if claimed_uids[uid] then
+            break
+        end
+        local block_data = redis.call("HGET", KEYS[1], uid)
+        if not block_data then
+            redis.call("ZREM", KEYS[2], uid)
+        else
+            if string.sub(block_data, 1, 1) ~= "{" then
+                -- the attempt count closes the header, the attempts follow it
+                local header = {struct.unpack(header_format, block_data)}
+                local attempts_start = table.remove(header)
+                local attempt_count = header[#header]
+                local attempts_end = attempts_start + attempt_count * struct.size(attempt_format)
+                header[#header] = attempt_count + 1
+                block_data = struct.pack(header_format, unpack(header)) ..
+                    string.sub(block_data, attempts_start, attempts_end - 1) ..
+                    struct.pack(attempt_format, tonumber(now)) ..
+                    string.sub(block_data, attempts_end)
+                redis.call("HSET", KEYS[1], uid, block_data)
+            end
+            redis.call("ZADD", KEYS[2], now, uid)
+            table.insert(claimed, block_data)
+            claimed_uids[uid] = true
+        end
+    end
+end
+return claimed
+"""
+
+# pick the crawlable hosters of a type with the lowest scores
+#
+# KEYS: crawlable sorted set, finished sorted set, schedule version, hosters version
+# ARGV: hosters with a run created before this are crawlable again, hoster count, block count, cost per block
+#
+# returns false if the schedule is outdated (or missing), so it gets rebuilt.
+# blocks are spread round-robin over the picked hosters, each of them pays for its share.
+PICK_HOSTERS_SCRIPT = """
+if redis.call("GET", KEYS[3]) ~= (redis.call("GET", KEYS[4]) or "0") then
+    return false
+end
+
+local finished = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", ARGV[1], "WITHSCORES")
+for i = 1, #finished, 2 do
+    redis.call("ZADD", KEYS[1], finished[i + 1], finished[i])
+    redis.call("ZREM", KEYS[2], finished[i])
+end
+
+local block_count = tonumber(ARGV[3])
+local block_cost = tonumber(ARGV[4])
+local hoster_ids = redis.call("ZRANGE", KEYS[1], 0, tonumber(ARGV[2]) - 1)
+for i, hoster_id in ipairs(hoster_ids) do
+    local hoster_block_count = math.floor(block_count / #hoster_ids)
+    if i - 1 < block_count % #hoster_ids then
+        hoster_block_count = hoster_block_count + 1
+    end
+    redis.call("ZINCRBY", KEYS[1], hoster_block_count * block_cost, hoster_id)
+end
+return hoster_ids
+"""
+
 
 class RedisStateManager(AbstractStateManager):
     """
@@ -22,14 +187,34 @@ class RedisStateManager(AbstractStateManager):
 
         self.lock_key = "lock"
 
+        # all scalar run state of a hoster lives in one hash, these are its fields
+        # (they used to be separate keys, see `migrate_legacy_state`)
+        self.state_key = "state"
         self.run_created_ts_key = "run_created_ts"
-        self.block_map_key = "blocks"
         self.highest_block_repo_id_key = "highest_block_repo_id"
         self.highest_confirmed_block_repo_id_key = "highest_confirmed_block_repo_id"
         self.empty_results_counter_key = "empty_results_counter"
         self.run_is_finished_key = "run_is_finished"
+        # not reset with the run
+        self.batch_size_key = "batch_size"
+
+        self.block_map_key = "blocks"
+        # sorted set of block uids, scored by the timestamp of their last attempt
+        self.block_attempts_key = "block_attempts"
         self.machine_api_key_key = "machine_api_key"
         self.active_api_keys_key = "active_api_key"
+        # not bound to a hoster, bumped when hosting services change
+        self.hosters_version_key = "hosters_version"
+        # per hoster type - sorted sets of crawlable hosters (by priority) and
+        # finished hosters (by run_created_ts), and the hosters version they were built for
+        self.schedule_key = "schedule"
+        self.schedule_crawlable_key = "crawlable"
+        self.schedule_finished_key = "finished"
+        self.schedule_version_key = "version"
+
+        self._next_blocks_script = None
+        self._claim_timed_out_blocks_script = None
+        self._pick_hosters_script = None
 
     def init_app(self, app, *args, **kwargs):
         redis_url = app.config["REDIS_URL"]
@@ -37,6 +222,9 @@ class RedisStateManager(AbstractStateManager):
             self.redis = redis.from_url(redis_url)
         else:
             self.redis = redislite.Redis()
+        self._next_blocks_script = self.redis.register_script(NEXT_BLOCKS_SCRIPT)
+        self._claim_timed_out_blocks_script = self.redis.register_script(CLAIM_TIMED_OUT_BLOCKS_SCRIPT)
+        self._pick_hosters_script = self.redis.register_script(PICK_HOSTERS_SCRIPT)
 
     @classmethod
     def _get_redis_key(cls, key_prefix: str, key: str) -> str:
@@ -53,83 +241,206 @@ class RedisStateManager(AbstractStateManager):
         lock = self.redis.lock(redis_key)
         return lock
 
+    def _get_state_key(self, hoster_prefix: str) -> str:
+        return self._get_redis_key(hoster_prefix, self.state_key)
+
+    def _get_state_fields(self) -> List[str]:
+        return [
+            self.highest_block_repo_id_key,
+            self.highest_confirmed_block_repo_id_key,
+            self.empty_results_counter_key,
+            self.run_created_ts_key,
+            self.run_is_finished_key,
+        ]
+
+    def _get_reset_state(self, run_created_ts: float) -> Dict:
+        """The state hash of a new run (also used by NEXT_BLOCKS_SCRIPT, when it starts the next run)."""
+        return {
+            self.run_created_ts_key: run_created_ts,
+            self.run_is_finished_key: 0,
+            self.highest_block_repo_id_key: 0,
+            self.highest_confirmed_block_repo_id_key: 0,
+            self.empty_results_counter_key: 0,
+        }
+
+    def _set_state_value(self, hoster_prefix: str, field: str, value):
+        self.redis.hset(self._get_state_key(hoster_prefix), field, value)
+
+    def _get_state_value(self, hoster_prefix: str, field: str):
+        return self.redis.hget(self._get_state_key(hoster_prefix), field)
+
+    def _parse_state_hash(self, state_hash: Dict[bytes, bytes]) -> Dict:
+        def _get(field: str):
+            return state_hash.get(field.encode(), None)
+
+        return dict(
+            highest_block_repo_id=int(_get(self.highest_block_repo_id_key) or 0),
+            highest_confirmed_repo_id=int(_get(self.highest_confirmed_block_repo_id_key) or 0),
+            empty_results_count=int(_get(self.empty_results_counter_key) or 0),
+            run_created_ts=float(_get(self.run_created_ts_key) or 0),
+            run_is_finished=bool(int(_get(self.run_is_finished_key) or 0)),
+            batch_size=int(_get(self.batch_size_key) or 0) or self.batch_size,
+        )
+
+    def get_state_dict(self, hoster_prefix: str) -> Dict:
+        """Get the state of a hoster in a single HGETALL."""
+        state_hash = self.redis.hgetall(self._get_state_key(hoster_prefix))
+        return self._parse_state_hash(state_hash)
+
+    def get_state_dicts(self, hoster_prefixes: List[str]) -> Dict[str, Dict]:
+        """Get the state dicts of many hosters in a single round trip, accessed by their prefix."""
+        pipeline = self.redis.pipeline(transaction=False)
+        for hoster_prefix in hoster_prefixes:
+            pipeline.hgetall(self._get_state_key(hoster_prefix))
+        state_hashes = pipeline.execute() if hoster_prefixes else []
+        return {
+            hoster_prefix: self._parse_state_hash(state_hash)
+            for hoster_prefix, state_hash in zip(hoster_prefixes, state_hashes)
+        }
+
+    def migrate_legacy_state(self, hoster_prefix: str) -> bool:
+        """
+        Move the state of a hoster from separate keys (<prefix>:<field>) into its state hash,
+        and index open blocks which dont have their last attempt in the sorted set yet.
+
+        Returns True if there was anything to migrate.
+        """
+        fields = self._get_state_fields()
+        legacy_keys = [self._get_redis_key(hoster_prefix, field) for field in fields]
+        values = self.redis.mget(legacy_keys)
+        mapping = {field: value for field, value in zip(fields, values) if value is not None}
+
+        block_attempts_key = self._get_redis_key(hoster_prefix, self.block_attempts_key)
+        block_attempts = {
+            block.uid: block.attempts_at[-1]
+            for block in self.iter_blocks(hoster_prefix)
+            if self.redis.zscore(block_attempts_key, block.uid) is None
+        }
+        if not mapping and not block_attempts:
+            return False
+
+        pipeline = self.redis.pipeline(transaction=True)
+        if mapping:
+            pipeline.hset(self._get_state_key(hoster_prefix), mapping=mapping)
+            pipeline.delete(*legacy_keys)
+        if block_attempts:
+            pipeline.zadd(block_attempts_key, block_attempts)
+        pipeline.execute()
+        return True
+
     def set_highest_block_repo_id(self, hoster_prefix: str, repo_id: int):
-        redis_key = self._get_redis_key(hoster_prefix, self.highest_block_repo_id_key)
-        self.redis.set(redis_key, repo_id)
+        self._set_state_value(hoster_prefix, self.highest_block_repo_id_key, repo_id)
 
     def get_highest_block_repo_id(self, hoster_prefix: str) -> int:
-        redis_key = self._get_redis_key(hoster_prefix, self.highest_block_repo_id_key)
-        highest_repo_id_str: str = self.redis.get(redis_key)
-        if not highest_repo_id_str:
-            highest_repo_id = 0
-        else:
-            highest_repo_id = int(highest_repo_id_str)
-        return highest_repo_id
+        return int(self._get_state_value(hoster_prefix, self.highest_block_repo_id_key) or 0)
 
     def set_highest_confirmed_block_repo_id(self, hoster_prefix: str, repo_id: int):
-        redis_key = self._get_redis_key(
-            hoster_prefix, self.highest_confirmed_block_repo_id_key
-        )
-        self.redis.set(redis_key, repo_id)
+        self._set_state_value(hoster_prefix, self.highest_confirmed_block_repo_id_key, repo_id)
 
     def get_highest_confirmed_block_repo_id(self, hoster_prefix: str) -> int:
-        redis_key = self._get_redis_key(
-            hoster_prefix, self.highest_confirmed_block_repo_id_key
-        )
-        repo_id_str: str = self.redis.get(redis_key)
-        if not repo_id_str:
-            highest_repo_id = 0
-        else:
-            highest_repo_id = int(repo_id_str)
-        return highest_repo_id
+        return int(self._get_state_value(hoster_prefix, self.highest_confirmed_block_repo_id_key) or 0)
 
     def set_empty_results_counter(self, hoster_prefix: str, count: int):
-        redis_key = self._get_redis_key(hoster_prefix, self.empty_results_counter_key)
-        self.redis.set(redis_key, count)
+        self._set_state_value(hoster_prefix, self.empty_results_counter_key, count)
 
     def get_empty_results_counter(self, hoster_prefix: str) -> int:
-        redis_key = self._get_redis_key(hoster_prefix, self.empty_results_counter_key)
-        if not self.redis.get(redis_key):
-            self.set_empty_results_counter(hoster_prefix, 0)
-        counter_str: str = self.redis.get(redis_key)
-        return int(counter_str)
+        return int(self._get_state_value(hoster_prefix, self.empty_results_counter_key) or 0)
+
+    def increment_empty_results_counter(self, hoster_prefix: str, amount: int = 1):
+        self.redis.hincrby(self._get_state_key(hoster_prefix), self.empty_results_counter_key, amount)
+
+    def get_batch_size(self, hoster_prefix: str) -> int:
+        return int(self._get_state_value(hoster_prefix, self.batch_size_key) or 0) or self.batch_size
+
+    def set_batch_size(self, hoster_prefix: str, batch_size: int):
+        self._set_state_value(hoster_prefix, self.batch_size_key, batch_size)
 
     def push_new_block(self, hoster_prefix: str, block: Block):
         redis_key = self._get_redis_key(hoster_prefix, self.block_map_key)
-        self.redis.hset(redis_key, block.uid, block.to_json())
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.hset(redis_key, block.uid, block.to_bytes())
+        pipeline.zadd(self._get_redis_key(hoster_prefix, self.block_attempts_key), {block.uid: block.attempts_at[-1]})
+        pipeline.execute()
+
+    def get_next_block(self, hoster_prefix: str) -> Block:
+        """
+        Return the next new block.
+        """
+        return self.get_next_blocks({hoster_prefix: 1})[hoster_prefix][0]
+
+    def get_next_blocks(self, hoster_block_counts: Dict[str, int]) -> Dict[str, List[Block]]:
+        """
+        Return new blocks for several hosters at once, accessed by their prefix.
+
+        Moving the cursors, (re)starting runs and storing the blocks happen atomically
+        in a lua script, so concurrent workers never hand out the same range.
+        """
+        now = time.time()
+        reset_state = self._get_reset_state(run_created_ts=now)
+        keys = []
+        args = [
+            repr(now), BLOCK_ENCODING_VERSION, BLOCK_HEADER_LUA_FORMAT, BLOCK_ATTEMPT_LUA_FORMAT,
+            encode_block_tail(status=BLOCK_STATUS_CREATED, ids=None),
+            self.batch_size_key, self.run_is_finished_key, self.run_created_ts_key, self.highest_block_repo_id_key,
+            len(reset_state), *chain.from_iterable(reset_state.items()),
+        ]
+        for hoster_prefix, block_count in hoster_block_counts.items():
+            keys.extend([
+                self._get_state_key(hoster_prefix),
+                self._get_redis_key(hoster_prefix, self.block_map_key),
+                self._get_redis_key(hoster_prefix, self.block_attempts_key),
+            ])
+            args.extend([self.batch_size, block_count])
+            for _ in range(block_count):
+                block_uid = uuid.uuid4()
+                args.extend([block_uid.hex, block_uid.bytes])
+        if not keys:
+            return {}
+
+        results = self._next_blocks_script(keys=keys, args=args, client=self.redis)
+        hoster_blocks = {}
+        for hoster_prefix, (was_reset, encoded_blocks) in zip(hoster_block_counts.keys(), results):
+            if was_reset:
+                logger.warning(f"{hoster_prefix} - hoster was finished, resetting for a new run!")
+            hoster_blocks[hoster_prefix] = [Block.from_bytes(block_data) for block_data in encoded_blocks]
+        return hoster_blocks
 
     def set_run_created_ts(self, hoster_prefix: str, timestamp: float = None):
         """Set a timestamp for when a run was created. No value or None will use time.time()."""
         if timestamp is None:
             timestamp = time.time()
-        redis_key = self._get_redis_key(hoster_prefix, self.run_created_ts_key)
-        self.redis.set(redis_key, timestamp)
+        self._set_state_value(hoster_prefix, self.run_created_ts_key, timestamp)
 
     def get_run_created_ts(self, hoster_prefix: str):
         """When was the current run created? Defaults to 0 if it never ran."""
-        redis_key = self._get_redis_key(hoster_prefix, self.run_created_ts_key)
-        if not self.redis.get(redis_key):
-            self.set_run_created_ts(hoster_prefix, 0)
-        return float(self.redis.get(redis_key))
+        return float(self._get_state_value(hoster_prefix, self.run_created_ts_key) or 0)
 
     def get_has_run_hit_end(self, hoster_prefix: str) -> bool:
-        redis_key = self._get_redis_key(hoster_prefix, self.run_is_finished_key)
-        is_finished_str = self.redis.get(redis_key)
-        if is_finished_str:
-            is_finished_str = int(is_finished_str)
-        return bool(is_finished_str)
+        return bool(int(self._get_state_value(hoster_prefix, self.run_is_finished_key) or 0))
 
     def set_has_run_hit_end(self, hoster_prefix: str, has_hit_end: bool):
-        redis_key = self._get_redis_key(hoster_prefix, self.run_is_finished_key)
-        self.redis.set(redis_key, int(has_hit_end))
+        self._set_state_value(hoster_prefix, self.run_is_finished_key, int(has_hit_end))
+
+    def reset(self, hoster_prefix: str):
+        """
+        Reset state under a specific prefix
+        (i.e. one gitea instance, but not the rest).
+        """
+        logger.warning(f"reset state for hoster: {hoster_prefix}")
+        self.redis.hset(self._get_state_key(hoster_prefix), mapping=self._get_reset_state(run_created_ts=time.time()))
+        self._reset_blocks(hoster_prefix)
 
     def update_block(self, hoster_prefix: str, block: Block):
         """Store changes applied to a block."""
         redis_key = self._get_redis_key(hoster_prefix, self.block_map_key)
-        old_block = self.redis.hget(redis_key, block.uid)
-        if old_block:
+        if self.redis.hexists(redis_key, block.uid):
             # only update existing blocks
-            self.redis.hset(redis_key, block.uid, block.to_json())
+            pipeline = self.redis.pipeline(transaction=True)
+            pipeline.hset(redis_key, block.uid, block.to_bytes())
+            pipeline.zadd(
+                self._get_redis_key(hoster_prefix, self.block_attempts_key), {block.uid: block.attempts_at[-1]}
+            )
+            pipeline.execute()
         else:
             logger.info(
                 f"(ignoring call) attempted to update non-existing block state, uid: {block.uid}"
@@ -137,29 +448,161 @@ class RedisStateManager(AbstractStateManager):
 
     def _delete_block(self, hoster_prefix: str, block_uid: str):
         redis_key = self._get_redis_key(hoster_prefix, self.block_map_key)
-        block = self.redis.hget(redis_key, block_uid)
-        self.redis.hdel(redis_key, block_uid)
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.hget(redis_key, block_uid)
+        pipeline.hdel(redis_key, block_uid)
+        pipeline.zrem(self._get_redis_key(hoster_prefix, self.block_attempts_key), block_uid)
+        block, _, _ = pipeline.execute()
         return block
 
+    def _reset_blocks(self, hoster_prefix: str):
+        self.redis.delete(
+            self._get_redis_key(hoster_prefix, self.block_map_key),
+            self._get_redis_key(hoster_prefix, self.block_attempts_key),
+        )
+
+    def get_timed_out_block(self, hoster_prefix: str, timestamp_now=None) -> Union[Block, None]:
+        """
+        Try to get a block we didnt receive an answer for.
+
+        The oldest one is looked up by its last attempt in a sorted set, without loading every open block,
+        and claimed atomically (see CLAIM_TIMED_OUT_BLOCKS_SCRIPT).
+
+        timestamp_now: use a timestamp instead of time.time()
+        """
+        blocks = self.get_timed_out_blocks(hoster_prefix=hoster_prefix, count=1, timestamp_now=timestamp_now)
+        return blocks[0] if blocks else None
+
+    def get_timed_out_blocks(self, hoster_prefix: str, count: int, timestamp_now=None) -> List[Block]:
+        """
+        Get up to <count> blocks we didnt receive an answer for, oldest first - claimed in one round trip.
+        """
+        if not timestamp_now:
+            timestamp_now = time.time()
+
+        keys = [
+            self._get_redis_key(hoster_prefix, self.block_map_key),
+            self._get_redis_key(hoster_prefix, self.block_attempts_key),
+        ]
+        args = [
+            repr(timestamp_now), repr(timestamp_now - self.block_timeout), count,
+            BLOCK_HEADER_LUA_FORMAT, BLOCK_ATTEMPT_LUA_FORMAT,
+        ]
+        blocks = []
+        for block_data in self._claim_timed_out_blocks_script(keys=keys, args=args, client=self.redis):
+            block = Block.from_bytes(block_data)
+            if block_data[:1] == b"{":
+                # json blocks are claimed already, only their attempt is recorded here
+                block.attempts_at.append(timestamp_now)
+                self.update_block(hoster_prefix=hoster_prefix, block=block)
+            blocks.append(block)
+        return blocks
+
     def get_blocks_dict(self, hoster_prefix: str) -> Dict[str, Block]:
         """Get all blocks as a dict accessed by their id."""
         redis_key = self._get_redis_key(hoster_prefix, self.block_map_key)
-        block_jsons = self.redis.hgetall(redis_key)
+        encoded_blocks = self.redis.hgetall(redis_key)
         blocks = {}
-        for block_json in block_jsons.values():
-            block = Block.from_json(block_json)
+        for block_data in encoded_blocks.values():
+            block = Block.from_bytes(block_data)
             blocks[block.uid] = block
         return blocks
 
+    def iter_blocks(self, hoster_prefix: str) -> Iterator[Block]:
+        """Iterate over all blocks with HSCAN, without loading them all at once."""
+        redis_key = self._get_redis_key(hoster_prefix, self.block_map_key)
+        for _, block_data in self.redis.hscan_iter(redis_key):
+            yield Block.from_bytes(block_data)
+
+    def get_block(self, hoster_prefix: str, block_uid: str) -> Union[Block, None]:
+        """Return an existing Block or None"""
+        if block_uid is None:
+            return None
+        block_data = self.redis.hget(self._get_redis_key(hoster_prefix, self.block_map_key), block_uid)
+        if not block_data:
+            return None
+        return Block.from_bytes(block_data)
+
+    def has_block(self, hoster_prefix: str, block_uid: str) -> bool:
+        return bool(self.redis.hexists(self._get_redis_key(hoster_prefix, self.block_map_key), block_uid))
+
+    def count_blocks(self, hoster_prefix: str) -> int:
+        return self.redis.hlen(self._get_redis_key(hoster_prefix, self.block_map_key))
+
     def get_blocks_list(self, hoster_prefix: str) -> List[Block]:
         """Get all blocks in a list."""
         redis_key = self._get_redis_key(hoster_prefix, self.block_map_key)
-        block_jsons = self.redis.hgetall(redis_key)
+        encoded_blocks = self.redis.hgetall(redis_key)
         blocks = []
-        for block_json in block_jsons.values():
-            blocks.append(Block.from_json(block_json))
+        for block_data in encoded_blocks.values():
+            blocks.append(Block.from_bytes(block_data))
         return blocks
 
+    def get_hosters_version(self) -> int:
+        return int(self.redis.get(self.hosters_version_key) or 0)
+
+    def bump_hosters_version(self):
+        self.redis.incr(self.hosters_version_key)
+
+    def _get_schedule_key(self, hosting_service_type: str, key: str) -> str:
+        return self._get_redis_key(f"{self.schedule_key}:{hosting_service_type}", key)
+
+    def get_schedule_version(self, hosting_service_type: str) -> Union[int, None]:
+        version = self.redis.get(self._get_schedule_key(hosting_service_type, self.schedule_version_key))
+        return None if version is None else int(version)
+
+    def set_schedule(self, hosting_service_type: str, crawlable: Dict[int, float], finished: Dict[int, float],
+                     version: int):
+        crawlable_key = self._get_schedule_key(hosting_service_type, self.schedule_crawlable_key)
+        finished_key = self._get_schedule_key(hosting_service_type, self.schedule_finished_key)
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.delete(crawlable_key, finished_key)
+        if crawlable:
+            pipeline.zadd(crawlable_key, crawlable)
+        if finished:
+            pipeline.zadd(finished_key, finished)
+        pipeline.set(self._get_schedule_key(hosting_service_type, self.schedule_version_key), version)
+        pipeline.execute()
+
+    def pick_scheduled_hosters(self, hosting_service_type: str, finished_before_ts: float, hoster_count: int,
+                               block_count: int, block_cost: float) -> Union[List[int], None]:
+        """
+        Pick the <hoster_count> crawlable hosters with the lowest scores, after making hosters
+        whose run was created before <finished_before_ts> crawlable again.
+
+        Done in a lua script, in one round trip and O(log n) for n hosters of the type.
+        Returns None if the schedule was built for another hosters version.
+        """
+        keys = [
+            self._get_schedule_key(hosting_service_type, self.schedule_crawlable_key),
+            self._get_schedule_key(hosting_service_type, self.schedule_finished_key),
+            self._get_schedule_key(hosting_service_type, self.schedule_version_key),
+            self.hosters_version_key,
+        ]
+        args = [repr(finished_before_ts), hoster_count, block_count, repr(block_cost)]
+        hoster_ids = self._pick_hosters_script(keys=keys, args=args, client=self.redis)
+        if hoster_ids is None:
+            return None
+        return [int(hoster_id) for hoster_id in hoster_ids]
+
+    def finish_scheduled_hoster(self, hosting_service_type: str, hosting_service_id: int, run_created_ts: float):
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.zrem(self._get_schedule_key(hosting_service_type, self.schedule_crawlable_key), hosting_service_id)
+        pipeline.zadd(
+            self._get_schedule_key(hosting_service_type, self.schedule_finished_key),
+            {hosting_service_id: run_created_ts},
+        )
+        pipeline.execute()
+
+    def delay_scheduled_hoster(self, hosting_service_type: str, hosting_service_id: int, amount: float):
+        # (only if its crawlable - XX doesnt add missing members)
+        self.redis.zadd(
+            self._get_schedule_key(hosting_service_type, self.schedule_crawlable_key),
+            {hosting_service_id: amount},
+            xx=True,
+            incr=True,
+        )
+
     def set_machine_api_key(self, hosting_service_id: str, machine_id: str, api_key: str):
         """ Attach an api_key to a machine_id. """
         machine_key = self._get_machine_id_key(hosting_service_id=hosting_service_id, machine_id=machine_id)
@@ -1,3 +1,4 @@
+import re
 import logging
 from typing import TYPE_CHECKING
 from contextlib import contextmanager
@@ -22,6 +23,8 @@ class TableHelper:
 
     commit runs on leaving context
     """
+    # run tables known to exist in this process, so ingesting doesnt look them up on every request
+    _existing_run_tables = set()
 
     @classmethod
     @contextmanager
@@ -40,34 +43,265 @@ class TableHelper:
         drop table (if exists)
         """
         cur.execute(f"drop table if exists {table_name}")
+        cls._existing_run_tables.discard(table_name)
 
     @classmethod
-    def recreate_finished_hoster_repo_table(cls, cur, hosting_service: 'HostingService') -> None:
+    def create_hoster_repo_partition(cls, cur, hosting_service: 'HostingService') -> None:
         """
-        drop and recreate the finished table for a hosting service
+        create the partition for a hosting services repos (if it doesnt exist)
+
+        the repo tables of each type are list-partitioned by hosting_service_id,
+        every hosting service gets its own partition when its added.
+        (cur can be a db api cursor or an sqlalchemy connection)
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        partition_table = Repository.get_partition_table_name(hosting_service)
+        cur.execute(
+            f"""
+                create table if not exists {partition_table}
+                partition of {repo_class.__tablename__}
+                for values in ({int(hosting_service.id)})
+                """
+        )
+
+    @classmethod
+    def drop_hoster_repo_tables(cls, cur, hosting_service: 'HostingService') -> None:
+        """
+        drop the partition, run, staging and (previous) finished table of a hosting service
+        (cur can be a db api cursor or an sqlalchemy connection)
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        cls.drop_table(cur, Repository.get_partition_table_name(hosting_service))
+        cls.drop_table(cur, Repository.get_run_table_name(hosting_service))
+        cls.drop_table(cur, Repository.get_staging_table_name(hosting_service))
+        cls.drop_table(cur, Repository.get_finished_table_name(hosting_service))
+        cls.drop_table(cur, Repository.get_previous_finished_table_name(hosting_service))
+
+    @classmethod
+    def detach_hoster_repo_partition(cls, cur, hosting_service: 'HostingService') -> str:
+        """
+        turn the partition of a hosting service into its staging table, and attach a new (empty) partition
+
+        only touches the tables of this hosting service, the repos are never copied.
+        (detaching needs a short exclusive lock on the repo table of the type,
+        so it waits for open transactions on it)
+
+        returns the name of the staging table
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        partition_table = Repository.get_partition_table_name(hosting_service)
+        staging_table = Repository.get_staging_table_name(hosting_service)
+
+        # left over by a rotation which didnt make it to the swap
+        cls.drop_table(cur, staging_table)
+        cls.create_hoster_repo_partition(cur, hosting_service)
+        cur.execute(f"alter table {repo_class.__tablename__} detach partition {partition_table}")
+        cur.execute(f"alter table {partition_table} rename to {staging_table}")
+        cls.create_hoster_repo_partition(cur, hosting_service)
+        return staging_table
+
+    @classmethod
+    def ensure_hoster_repo_run_table(cls, cur, hosting_service: 'HostingService') -> str:
+        """
+        create the run table of a hosting service (if it doesnt exist), for REPOS_UNLOGGED_RUNS
+
+        the run table collects the repos of a run instead of the partition - its UNLOGGED
+        and has no indexes, they are built once the run is finished (see `build_staging_indexes`).
+
+        returns the name of the run table
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        run_table = Repository.get_run_table_name(hosting_service)
+        if run_table in cls._existing_run_tables:
+            return run_table
+        if cls.table_exists(cur, run_table):
+            # (a table we create below isnt cached - our transaction might still roll back)
+            cls._existing_run_tables.add(run_table)
+            return run_table
+
+        # requests of the same hoster might try at once (released with the transaction)
+        cur.execute("select pg_advisory_xact_lock(%s)", (hosting_service.id,))
+        cur.execute(
+            f"create unlogged table if not exists {run_table} (like {repo_class.__tablename__} including defaults)"
+        )
+        return run_table
+
+    @classmethod
+    def detach_hoster_repo_run_table(cls, cur, hosting_service: 'HostingService') -> str:
+        """
+        turn the run table of a hosting service into its staging table, and create a new (empty) one
+
+        returns the name of the staging table
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        staging_table = Repository.get_staging_table_name(hosting_service)
+
+        # left over by a rotation which didnt make it to the swap
+        cls.drop_table(cur, staging_table)
+        run_table = cls.ensure_hoster_repo_run_table(cur, hosting_service)
+        cur.execute(f"alter table {run_table} rename to {staging_table}")
+        cls._existing_run_tables.discard(run_table)
+        cls.ensure_hoster_repo_run_table(cur, hosting_service)
+        return staging_table
+
+    @classmethod
+    def build_staging_indexes(cls, cur, hosting_service: 'HostingService') -> None:
+        """
+        make the staging table from an unlogged run table crash safe,
+        and build the constraints (primary key) and indexes the partitions of its repo table have
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        staging_table = Repository.get_staging_table_name(hosting_service)
+
+        # (before the indexes, so only the table is rewritten)
+        cur.execute(f"alter table {staging_table} set logged")
+        # constraints backed by an index (primary key, unique, exclusion) - they build their index themselves
+        cur.execute(
+            """
+            select pg_get_constraintdef(oid) from pg_constraint
+            where conrelid = %s::regclass and contype in ('p', 'u', 'x')
+            """,
+            (repo_class.__tablename__,),
+        )
+        for constraint_definition, in cur.fetchall():
+            cur.execute(f"alter table {staging_table} add {constraint_definition}")
+        # the remaining indexes
+        cur.execute(
+            """
+            select pg_get_indexdef(i.indexrelid) from pg_index i
+            where i.indrelid = %s::regclass and not exists (
+                select 1 from pg_constraint c where c.conrelid = i.indrelid and c.conindid = i.indexrelid
+            )
+            """,
+            (repo_class.__tablename__,),
+        )
+        for index_definition, in cur.fetchall():
+            # "CREATE [UNIQUE] INDEX <name> ON ONLY <table> USING ..." - without a name, postgres picks a free one
+            index_definition = re.sub(
+                r" INDEX \S+ ON (ONLY )?\S+ ", f" INDEX ON {staging_table} ", index_definition, count=1
+            )
+            cur.execute(index_definition)
+
+    @classmethod
+    def delete_duplicate_repos(cls, cur, hosting_service: 'HostingService', table_name: str) -> int:
+        """
+        keep only the newest row (highest id) of each repo (foreign id) in a repo table of a hosting service
+
+        crawlers retry timed out blocks, and late results of the first attempt are added as well.
+
+        returns the number of deleted rows
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        foreign_id = Repository.repo_class_for_type(hosting_service.type).get_foreign_id_column()
+        cur.execute(
+            f"""
+                delete from {table_name} a
+                using {table_name} b
+                where
+                    a.hosting_service_id = b.hosting_service_id
+                    and a.{foreign_id} = b.{foreign_id}
+                    and a.id < b.id
+                """
+        )
+        return cur.rowcount
+
+    @classmethod
+    def move_table_rows(cls, cur, source_table: str, target_table: str) -> int:
+        """
+        move all rows of a table into another one with the same columns
+
+        returns the number of moved rows
+        """
+        cur.execute(f"insert into {target_table} select * from {source_table}")
+        row_count = cur.rowcount
+        cur.execute(f"truncate {source_table}")
+        return row_count
+
+    @classmethod
+    def table_exists(cls, cur, table_name: str) -> bool:
+        cur.execute("select to_regclass(%s)", (table_name,))
+        return cur.fetchone()[0] is not None
+
+    @classmethod
+    def swap_finished_hoster_repo_table(cls, cur, hosting_service: 'HostingService') -> str:
+        """
+        replace the finished table of a hosting service with its staging table
+
+        only renames, so it should run in a transaction of its own - readers of the finished table
+        never see it missing, and are only blocked for the swap itself.
+
+        returns the name the previous finished table was moved to, drop it afterwards
+        """
+        from hubgrep_indexer.models.repositories.abstract_repository import Repository
+        staging_table = Repository.get_staging_table_name(hosting_service)
+        finished_table = Repository.get_finished_table_name(hosting_service)
+        old_table = Repository.get_previous_finished_table_name(hosting_service)
+
+        cls.drop_table(cur, old_table)
+        cur.execute(f"alter table if exists {finished_table} rename to {old_table}")
+        cur.execute(f"alter table {staging_table} rename to {finished_table}")
+        return old_table
+
+    @classmethod
+    def ensure_incremental_hoster_repo_table(cls, cur, hosting_service: 'HostingService') -> None:
+        """
+        create the finished table for a hosting service in the incremental layout (see REPOS_INCREMENTAL)
+
+        on top of the repo columns, it has
+        - seen_run_ts: run_created_ts of the last run which saw the repo
+        - removed_at: when the repo wasnt seen by a run anymore, null while its around
+        and a unique index on (hosting_service_id, <foreign id>)
+
+        finished tables swapped in by `swap_finished_hoster_repo_table` are converted.
         """
         from hubgrep_indexer.models.repositories.abstract_repository import Repository
         repo_class = Repository.repo_class_for_type(hosting_service.type)
         source_table = repo_class.__tablename__
         target_table = Repository.get_finished_table_name(hosting_service)
+        foreign_id = repo_class.get_foreign_id_column()
 
-        cls.drop_table(cur, target_table)
+        if cls.has_column(cur, target_table, "seen_run_ts"):
+            return
 
+        logger.info(f"creating incremental repo table {target_table}")
+        cur.execute(f"create table if not exists {target_table} (like {source_table} including defaults)")
+        cur.execute(
+            f"""
+                alter table {target_table}
+                alter column id set default nextval(pg_get_serial_sequence('{source_table}', 'id')),
+                add column if not exists seen_run_ts double precision not null default 0,
+                add column if not exists removed_at timestamp
+                """
+        )
+        # finished tables from before deduplication may hold a repo more than once
+        cls.delete_duplicate_repos(cur, hosting_service, target_table)
         cur.execute(
             f"""
-                create table {target_table}
-                as select *
-                from {source_table}
-                where hosting_service_id = %s
-                """,
-            (hosting_service.id,),
+                create unique index if not exists {target_table}_foreign_id
+                on {target_table} (hosting_service_id, {foreign_id})
+                """
+        )
+
+    @classmethod
+    def has_column(cls, cur, table_name: str, column_name: str) -> bool:
+        """
+        check if a table (exists and) has a column
+        """
+        cur.execute(
+            "select 1 from information_schema.columns where table_name = %s and column_name = %s",
+            (table_name, column_name),
         )
+        return cur.fetchone() is not None
 
     @classmethod
-    def count_table_rows(cls, cur, table_name: str) -> int:
+    def count_table_rows(cls, cur, table_name: str, where: str = "") -> int:
         """
-        count table rows
+        count table rows (matching an optional where clause)
         """
-        cur.execute(f"select count(*) from {table_name}")
+        cur.execute(f"select count(*) from {table_name} {where}")
         return cur.fetchone()[0]
 
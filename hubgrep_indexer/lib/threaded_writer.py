@@ -0,0 +1,88 @@
+"""
+a file-like object, which hands what is written to it to another file on a separate thread
+
+used for exports, so postgres COPY output is read on one thread and compressed on another
+(zlib & co. release the GIL while compressing).
+"""
+import queue
+import logging
+import threading
+from typing import BinaryIO, Union
+
+logger = logging.getLogger(__name__)
+
+# stops the writer thread
+_CLOSE = None
+
+
+class ThreadedWriter:
+    """
+    Write to a (binary) file on a separate thread.
+
+    Writes are collected into chunks of <chunk_size> bytes, at most <queue_size> chunks wait for the
+    writer thread. The file is closed when the ThreadedWriter is closed, errors of the writer thread are
+    raised on the next write/close.
+
+    use like
+    ```
+    with ThreadedWriter(gzip.open("export.csv.gz", "wb")) as writer:
+        cur.copy_expert("COPY ... TO STDOUT", writer)
+    ```
+    """
+
+    def __init__(self, file: BinaryIO, chunk_size: int = 1024 * 1024, queue_size: int = 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        # number of (uncompressed) bytes written
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error: Union[BaseException, None] = None
+        self._thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self._thread.start()
+
+    def _write_chunks(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is _CLOSE:
+                return
+            if self._error:
+                # keep taking chunks, so writes dont block on a full queue
+                continue
+            try:
+                self.file.write(chunk)
+            except BaseException as e:
+                logger.exception(f"could not write to {self.file}")
+                self._error = e
+
+    def _raise_error(self):
+        if self._error:
+            raise IOError(f"writing to {self.file} failed") from self._error
+
+    def write(self, data: Union[bytes, bytearray, memoryview]) -> int:
+        self._raise_error()
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= self.chunk_size:
+            self._queue.put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        try:
+            if self._buffer:
+                self._queue.put(bytes(self._buffer))
+                self._buffer.clear()
+        finally:
+            self._queue.put(_CLOSE)
+            self._thread.join()
+            self.file.close()
+        self._raise_error()
+
+    def __enter__(self) -> "ThreadedWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,4 +1,19 @@
+from typing import Iterable, Iterator
+
+
 def obscurify_secret(secret: str, visible_ratio: int = 3, obscured_char: str = "*") -> str:
     """ Get a partially visible "secret" string, only revealing the latter part of the input. """
     visible = len(secret) // visible_ratio
     return f"{obscured_char * visible * (visible_ratio - 1)}{secret[-visible:]}"
+
+
+def chunked(iterable: Iterable, chunk_size: int) -> Iterator[list]:
+    """ Yield lists of (at most) chunk_size items from any iterable, without materializing it. """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -2,12 +2,15 @@ import os
 import datetime
 import time
 import logging
-from typing import TYPE_CHECKING
+from typing import List, TYPE_CHECKING
 from pathlib import Path
 
 from flask import current_app
+from sqlalchemy import or_
 
 from hubgrep_indexer import db
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP, EXPORT_FORMAT_CSV, EXPORT_FORMAT_PARQUET
+from hubgrep_indexer.lib.export_codecs import get_file_extension
 from hubgrep_indexer.models.repositories.abstract_repository import Repository
 
 if TYPE_CHECKING:
@@ -32,6 +35,15 @@ class ExportMeta(db.Model):
 
     repo_count = db.Column(db.Integer, nullable=True)
 
+    # compression of the file (see hubgrep_indexer.lib.export_codecs), None for gzip exports from before codecs
+    codec = db.Column(db.String(10), nullable=True)
+
+    # csv or parquet (unified exports only), None for csv exports from before formats
+    export_format = db.Column(db.String(10), nullable=True)
+
+    # only the repos added, changed or removed since the previous run (csv only), None for full exports
+    is_delta = db.Column(db.Boolean, nullable=True)
+
     def __str__(self):
         return f"Export {self.hosting_service.hoster_name} @ {self.created_at}"
 
@@ -45,20 +57,57 @@ class ExportMeta(db.Model):
         self.file_path = None
         db.session.commit()
 
+    @classmethod
+    def query_exports(
+        cls, hosting_service_id: int, unified: bool, export_format: str = EXPORT_FORMAT_CSV, delta: bool = False
+    ):
+        """
+        query the (full or delta) exports of a hosting service which still have their file, newest first
+        """
+        query = cls.query_live_exports(hosting_service_id).filter_by(is_raw=(not unified))
+        if export_format == EXPORT_FORMAT_CSV:
+            query = query.filter(or_(cls.export_format == None, cls.export_format == EXPORT_FORMAT_CSV))
+        else:
+            query = query.filter(cls.export_format == export_format)
+        if delta:
+            query = query.filter(cls.is_delta == True)
+        else:
+            query = query.filter(or_(cls.is_delta == None, cls.is_delta == False))
+        return query
+
+    @classmethod
+    def query_live_exports(cls, hosting_service_id: int):
+        """
+        query all exports of a hosting service which still have their file, newest first
+        """
+        return cls.query.filter_by(hosting_service_id=hosting_service_id).filter(
+            cls.file_path != None
+        ).order_by(cls.created_at.desc())
+
     @classmethod
     def _get_default_export_filename(
         cls,
         hosting_service: "HostingService",
         timestamp: datetime.datetime,
         unified=False,
+        codec=EXPORT_CODEC_GZIP,
+        export_format=EXPORT_FORMAT_CSV,
+        delta=False,
     ):
         """
-        returns something like "codeberg.org_unified_20211231_1200.csv.gz"
+        returns something like "codeberg.org_unified_20211231_1200.csv.gz" (".csv.zst" for zstd...)
+
+        parquet exports are compressed internally, they are always ".parquet"
+        delta exports are "codeberg.org_unified_delta_20211231_1200.csv.gz"
         """
         date_str = timestamp.strftime("%Y%m%d_%H%M")
         export_base_name = f"{hosting_service.hoster_name}"
         export_base_name += "_unified" if unified else "_raw"
-        filename_suffix = f"_{date_str}.csv.gz"
+        export_base_name += "_delta" if delta else ""
+        if export_format == EXPORT_FORMAT_PARQUET:
+            filename_suffix = f"_{date_str}.parquet"
+        else:
+            filename_suffix = f"_{date_str}.csv{get_file_extension(codec)}"
         export_filename = export_base_name + filename_suffix
         return export_filename
 
@@ -68,36 +117,98 @@ class ExportMeta(db.Model):
         hosting_service: "HostingService",
         unified=False,
         export_filename=None,
+        codec=None,
+        export_format=EXPORT_FORMAT_CSV,
+        delta=False,
     ) -> str:
         """
-        Export this hosters repositories to a gzipped json file.
+        Export this hosters repositories to a csv file, compressed with <codec> (default: EXPORT_CODEC).
+
+        Unified exports can be written as (typed) parquet files instead, with <export_format>.
+        With <delta>, only the repos added, changed or removed since the previous run are exported
+        (needs its finished table, see `Repository.has_previous_finished_table`).
 
         returns `Export` (needs to be commited to the db!)
         """
+        if export_format == EXPORT_FORMAT_PARQUET and not unified:
+            raise ValueError("parquet exports are unified only")
+        if export_format == EXPORT_FORMAT_PARQUET and delta:
+            raise ValueError("delta exports are csv only")
         now = datetime.datetime.now()
+        codec = codec or current_app.config["EXPORT_CODEC"]
         if not export_filename:
             export_filename = cls._get_default_export_filename(
-                hosting_service, now, unified
+                hosting_service, now, unified, codec, export_format, delta
             )
 
         logger.debug(f"exporting repos for {hosting_service}...")
         repo_class: Repository = Repository.repo_class_for_type(hosting_service.type)
-        repo_count = repo_class.count_export_rows(hosting_service)
+        if delta:
+            delta_counts = repo_class.count_delta_rows(hosting_service)
+            logger.info(f"{hosting_service} changes since the previous run: {delta_counts}")
+            repo_count = sum(delta_counts.values())
+        else:
+            repo_count = repo_class.count_export_rows(hosting_service)
 
         before = time.time()
-        if not unified:
-            repo_class.export_csv_gz(hosting_service, export_filename)
+        if delta:
+            repo_class.export_delta_csv_gz(hosting_service, export_filename, unified=unified, codec=codec)
+        elif not unified:
+            repo_class.export_csv_gz(hosting_service, export_filename, codec=codec)
+        elif export_format == EXPORT_FORMAT_PARQUET:
+            repo_class.export_unified_parquet(hosting_service, export_filename, codec=codec)
         else:
             repo_class.export_unified_csv_gz(
-                hosting_service, export_filename
+                hosting_service, export_filename, codec=codec
             )
         logger.info(f"exporting {repo_count} repos took {time.time() - before}s")
+        return cls._new_export(hosting_service, now, export_filename, repo_count, unified, codec, export_format, delta)
+
+    @classmethod
+    def create_exports_single_pass(cls, hosting_service: "HostingService", codec=None) -> List["ExportMeta"]:
+        """
+        Export this hosters repositories to a raw and a unified csv (compressed like `create_export`),
+        reading them only once.
+
+        returns the raw and the unified `Export` (need to be commited to the db!)
+        """
+        now = datetime.datetime.now()
+        codec = codec or current_app.config["EXPORT_CODEC"]
+        raw_filename = cls._get_default_export_filename(hosting_service, now, unified=False, codec=codec)
+        unified_filename = cls._get_default_export_filename(hosting_service, now, unified=True, codec=codec)
 
+        logger.debug(f"exporting repos for {hosting_service} (single pass)...")
+        repo_class: Repository = Repository.repo_class_for_type(hosting_service.type)
+        repo_count = repo_class.count_export_rows(hosting_service)
+
+        before = time.time()
+        repo_class.export_csv_gz_single_pass(hosting_service, raw_filename, unified_filename, codec=codec)
+        logger.info(f"exporting {repo_count} repos (single pass) took {time.time() - before}s")
+        return [
+            cls._new_export(hosting_service, now, raw_filename, repo_count, unified=False, codec=codec),
+            cls._new_export(hosting_service, now, unified_filename, repo_count, unified=True, codec=codec),
+        ]
+
+    @classmethod
+    def _new_export(
+        cls,
+        hosting_service: "HostingService",
+        created_at: datetime.datetime,
+        export_filename: str,
+        repo_count: int,
+        unified: bool,
+        codec: str,
+        export_format: str = EXPORT_FORMAT_CSV,
+        delta: bool = False,
+    ) -> "ExportMeta":
         export = cls()
-        export.created_at = now
+        export.created_at = created_at
         export.file_path = export_filename
         export.hosting_service_id = hosting_service.id
         export.repo_count = repo_count
         export.is_raw = not unified
+        export.codec = codec
+        export.export_format = export_format
+        export.is_delta = delta
         return export
 
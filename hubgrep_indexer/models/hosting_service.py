@@ -1,6 +1,8 @@
 import logging
 import time
 import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 from urllib.parse import urlparse
 import logging
@@ -10,12 +12,15 @@ from urllib.parse import urljoin
 from urllib.parse import urlparse
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.engine import ResultProxy
-from sqlalchemy import func
+from sqlalchemy import func, event
+from sqlalchemy.orm import object_session
 from flask import current_app
 
-from hubgrep_indexer import db
+from hubgrep_indexer import db, state_manager
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP, EXPORT_FORMAT_CSV, EXPORT_FORMAT_PARQUET
 from hubgrep_indexer.models.export_meta import ExportMeta
 from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from hubgrep_indexer.lib.table_helper import TableHelper
 
 logger = logging.getLogger(__name__)
 
@@ -57,28 +62,34 @@ class HostingService(db.Model):
         api_keys.append(api_key)
         self.api_keys = api_keys
 
-    def get_exports_dict(self, unified=False) -> List[Dict]:
+    def get_exports_dict(self, unified=False, export_format=EXPORT_FORMAT_CSV, delta=False) -> List[Dict]:
         """
-        Shorthand for the query to this hosters exports, sorted by datetime (newest first).
+        Shorthand for the query to this hosters (full or delta) exports, sorted by datetime (newest first).
         """
-        query = ExportMeta.query.filter_by(
-            hosting_service_id=self.id, is_raw=(not unified)
-        ).filter(ExportMeta.file_path != None)
-        query = query.order_by(ExportMeta.created_at.desc()).all()
+        query = ExportMeta.query_exports(self.id, unified, export_format, delta).all()
+        return [self._get_export_dict(export) for export in query]
 
-        results_base_url = current_app.config["RESULTS_BASE_URL"]
-        exports = []
-        for export in query:
-            export_url = urljoin(results_base_url, export.file_path)
-            exports.append(
-                dict(
-                    created_at=export.created_at.isoformat(),
-                    url=export_url,
-                    repo_count=export.repo_count,
-                )
-            )
+    def _get_all_exports_dicts(self) -> Dict[tuple, List[Dict]]:
+        """
+        All exports of this hoster, from a single query - by (unified, export_format, delta), newest first.
+        """
+        exports = defaultdict(list)
+        for export in ExportMeta.query_live_exports(self.id):
+            export_dict = self._get_export_dict(export)
+            exports[(not export.is_raw, export_dict["format"], export_dict["is_delta"])].append(export_dict)
         return exports
 
+    @classmethod
+    def _get_export_dict(cls, export: ExportMeta) -> Dict:
+        return dict(
+            created_at=export.created_at.isoformat(),
+            url=urljoin(current_app.config["RESULTS_BASE_URL"], export.file_path),
+            repo_count=export.repo_count,
+            codec=export.codec or EXPORT_CODEC_GZIP,
+            format=export.export_format or EXPORT_FORMAT_CSV,
+            is_delta=bool(export.is_delta),
+        )
+
     def get_crawler_request_headers(self):
         """
         Get crawler request headers for this service.
@@ -120,21 +131,50 @@ class HostingService(db.Model):
             d["api_keys"] = self.api_keys
             d["crawler_request_headers"] = self.get_crawler_request_headers()
         if include_exports:
-            d["exports_raw"] = self.get_exports_dict(unified=False)
-            d["exports_unified"] = self.get_exports_dict(unified=True)
+            exports = self._get_all_exports_dicts()
+            d["exports_raw"] = exports[(False, EXPORT_FORMAT_CSV, False)]
+            d["exports_unified"] = exports[(True, EXPORT_FORMAT_CSV, False)]
+            d["exports_unified_parquet"] = exports[(True, EXPORT_FORMAT_PARQUET, False)]
+            d["exports_raw_delta"] = exports[(False, EXPORT_FORMAT_CSV, True)]
+            d["exports_unified_delta"] = exports[(True, EXPORT_FORMAT_CSV, True)]
         return d
 
     def export_repos(self):
+        """
+        Make the raw and the unified export at the same time, each on its own thread and db connection.
+
+        With EXPORT_SINGLE_PASS, both are written from a single read of the repos instead.
+        With EXPORT_PARQUET, a unified parquet export is made as well (on a thread of its own).
+        With EXPORT_DELTAS, raw and unified delta exports against the previous run are made as well
+        (on threads of their own), if its finished table is still around.
+        """
         before = time.time()
-        # make temp table
-        logger.info(f"{self}: exporting raw!")
-        export = ExportMeta.create_export(self, unified=False)
-        db.session.add(export)
-        db.session.commit()
+        app = current_app._get_current_object()
+
+        def create_export(unified: bool, export_format: str, delta: bool = False) -> ExportMeta:
+            with app.app_context():
+                export_kind = f"{'unified' if unified else 'raw'} {export_format}{' delta' if delta else ''}"
+                logger.info(f"{self}: exporting {export_kind}!")
+                return ExportMeta.create_export(self, unified=unified, export_format=export_format, delta=delta)
+
+        export_args = []
+        if not current_app.config["EXPORT_SINGLE_PASS"]:
+            export_args += [(False, EXPORT_FORMAT_CSV), (True, EXPORT_FORMAT_CSV)]
+        if current_app.config["EXPORT_PARQUET"]:
+            export_args.append((True, EXPORT_FORMAT_PARQUET))
+        if current_app.config["EXPORT_DELTAS"]:
+            if Repository.repo_class_for_type(self.type).has_previous_finished_table(self):
+                export_args += [(False, EXPORT_FORMAT_CSV, True), (True, EXPORT_FORMAT_CSV, True)]
+            else:
+                logger.info(f"{self}: no previous run to make delta exports against")
 
-        logger.info(f"{self}: exporting unified!")
-        export = ExportMeta.create_export(self, unified=True)
-        db.session.add(export)
+        exports = []
+        with ThreadPoolExecutor(max_workers=max(len(export_args), 1)) as export_executor:
+            export_futures = [export_executor.submit(create_export, *args) for args in export_args]
+            if current_app.config["EXPORT_SINGLE_PASS"]:
+                exports += ExportMeta.create_exports_single_pass(self)
+            exports += [future.result() for future in export_futures]
+        db.session.add_all(exports)
         db.session.commit()
 
         logger.debug(f"exported repos for {self} - took {time.time() - before}s")
@@ -149,16 +189,16 @@ class HostingService(db.Model):
 
         return hosting_service
 
-    def handle_finished_run(self):
+    def handle_finished_run(self, run_created_ts: float = None):
         """
-        after finishing a run, rotate and export
+        after finishing a run (created at run_created_ts), rotate and export
 
-        should be called via hubgrep_indexer.executor.submit(hosting_service.handle_finished_run)
+        should be called via hubgrep_indexer.executor.submit(hosting_service.handle_finished_run, run_created_ts)
         """
         repo_class = Repository.repo_class_for_type(self.type)
         ts_rotate_start = time.time()
         logger.info(f"{self} run is finished, rotating repos! :confetti:")
-        repo_class.rotate(self)
+        repo_class.rotate(self, run_created_ts=run_created_ts)
         logger.debug(f"rotated repos for {self} - took {ts_rotate_start - time.time()}s")
         self.export_repos()
 
@@ -172,3 +212,33 @@ class HostingService(db.Model):
         repo_class = Repository.repo_class_for_type(self.type)
         return repo_class.query.filter_by(hosting_service=self)
 
+
+
+@event.listens_for(HostingService, "after_insert")
+def _create_repo_partition(mapper, connection, hosting_service: HostingService):
+    # in the same transaction, so there is never a hoster without a place for its repos
+    TableHelper.create_hoster_repo_partition(connection, hosting_service)
+
+
+@event.listens_for(HostingService, "before_delete")
+def _drop_repo_tables(mapper, connection, hosting_service: HostingService):
+    TableHelper.drop_hoster_repo_tables(connection, hosting_service)
+
+
+@event.listens_for(HostingService, "after_insert")
+@event.listens_for(HostingService, "after_update")
+@event.listens_for(HostingService, "after_delete")
+def _hosting_service_changed(mapper, connection, hosting_service: HostingService):
+    # remember the change until its committed, only then other processes may reload their hosters
+    object_session(hosting_service).info["hosting_services_changed"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _bump_hosters_version(session):
+    if session.info.pop("hosting_services_changed", False):
+        state_manager.bump_hosters_version()
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_hosting_service_changes(session):
+    session.info.pop("hosting_services_changed", None)
@@ -3,19 +3,25 @@ All hoster repo classes are inherited from the AbstractRepository class defined
 
 This module contains helpers to export the repos as well.
 """
+import io
+import string
 import logging
-import gzip
+import datetime
 
-from typing import Union, TYPE_CHECKING
+from typing import Union, Tuple, Iterable, List, Dict, TYPE_CHECKING
 
 from flask import current_app
 from sqlalchemy.ext.declarative import declared_attr
 from hubgrep_indexer.lib.table_helper import TableHelper
+from hubgrep_indexer.lib.threaded_writer import ThreadedWriter
+from hubgrep_indexer.lib.csv_split_writer import CsvSplitWriter, CsvSplitOutput
+from hubgrep_indexer.lib.export_codecs import open_export_file
 
 from hubgrep_indexer.constants import (
     HOST_TYPE_GITHUB,
     HOST_TYPE_GITEA,
     HOST_TYPE_GITLAB,
+    EXPORT_CODEC_GZIP,
 )
 
 from hubgrep_indexer import db
@@ -29,20 +35,36 @@ logger = logging.getLogger(__name__)
 class Repository(db.Model):
     __abstract__ = True
 
-    id = db.Column(db.BigInteger, primary_key=True)
+    # repos are list-partitioned per hosting service (see TableHelper.create_hoster_repo_partition),
+    # the partition key has to be part of the primary key
+    __table_args__ = dict(postgresql_partition_by="LIST (hosting_service_id)")
 
-    # foreign keys in abstract classes need to be defined in attributes
-    # https://stackoverflow.com/questions/32341408/sqlalchemy-concrete-inheritance-but-parent-has-foreignkey/32344269#32344269
-    @declared_attr
-    def hosting_service_id(cls):
-        return db.Column(
-            db.Integer, db.ForeignKey("hosting_service.id"), nullable=False
-        )
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+
+    # no foreign key - it would end up on the detached partitions, and dropping those would need an
+    # exclusive lock on the hosting_service table. partitions go with their hosting service instead.
+    hosting_service_id = db.Column(db.Integer, primary_key=True, nullable=False)
 
     @classmethod
     def get_finished_table_name(cls, hosting_service: 'HostingService'):
         return f"hoster_{hosting_service.id}_repositories_complete"
 
+    @classmethod
+    def get_partition_table_name(cls, hosting_service: 'HostingService'):
+        return f"hoster_{hosting_service.id}_repositories"
+
+    @classmethod
+    def get_run_table_name(cls, hosting_service: 'HostingService'):
+        return f"hoster_{hosting_service.id}_repositories_run"
+
+    @classmethod
+    def get_staging_table_name(cls, hosting_service: 'HostingService'):
+        return f"hoster_{hosting_service.id}_repositories_staging"
+
+    @classmethod
+    def get_previous_finished_table_name(cls, hosting_service: 'HostingService'):
+        return f"{cls.get_finished_table_name(hosting_service)}_old"
+
     # order is important here!
     # should be the same as in hubgrep_search/hubgrep/cli_blueprint/import_data.py
     unified_select_template = """
@@ -63,6 +85,26 @@ class Repository(db.Model):
         {repo_url} as repo_url
         """
 
+    # postgres types of the columns in `unified_select_template`, for typed (parquet) exports
+    # (foreign ids arent numbers on all hosters, gitlab keeps its counts as strings)
+    unified_column_types = dict(
+        foreign_id="text",
+        name="text",
+        username="text",
+        description="text",
+        created_at="timestamp",
+        updated_at="timestamp",
+        pushed_at="timestamp",
+        stars_count="bigint",
+        forks_count="bigint",
+        is_fork="boolean",
+        is_archived="boolean",
+        is_mirror="boolean",
+        is_empty="boolean",
+        homepage_url="text",
+        repo_url="text",
+    )
+
     @property
     def unification_mapping(self):
         """
@@ -84,7 +126,14 @@ class Repository(db.Model):
         raise NotImplementedError
 
     @classmethod
-    def get_unified_select_sql(cls, hosting_service: "HostingService") -> str:
+    def get_foreign_id_column(cls) -> str:
+        """
+        the column of the id a repo has on its hoster
+        """
+        return cls.unification_mapping["foreign_id"]
+
+    @classmethod
+    def get_unified_select_sql(cls, hosting_service: "HostingService", where: str = "") -> str:
         """
         get the sql statement for a "unified" export for this hostingservices repos.
 
@@ -98,13 +147,44 @@ class Repository(db.Model):
             {SELECT_MAPPING}
         from
             {TABLE_NAME}
+        {WHERE}
         """
         select_statement = unified_select_template.format(
             SELECT_MAPPING=unified_select_part,
             TABLE_NAME=cls.get_finished_table_name(hosting_service),
+            WHERE=where,
         )
         return select_statement
 
+    @classmethod
+    def get_unified_columns(cls) -> List[str]:
+        """
+        the columns of unified exports, in order (named like the fields of `unified_select_template`)
+        """
+        return [field for _, field, _, _ in string.Formatter().parse(cls.unified_select_template) if field]
+
+    @classmethod
+    def get_unified_typed_select_sql(cls, hosting_service: "HostingService", where: str = "") -> str:
+        """
+        like `get_unified_select_sql`, but casting each column to its `unified_column_types` type
+        """
+        typed_select_part = ",\n".join(
+            f"cast({cls.unification_mapping[column]} as {cls.unified_column_types[column]}) as {column}"
+            for column in cls.get_unified_columns()
+        )
+        return f"select {typed_select_part} from {cls.get_finished_table_name(hosting_service)} {where}"
+
+    @classmethod
+    def _get_finished_table_where(cls, cur, hosting_service: "HostingService") -> str:
+        """
+        where clause selecting the current repos of the finished table
+
+        incremental tables (see REPOS_INCREMENTAL) keep the repos which have been removed
+        """
+        if TableHelper.has_column(cur, cls.get_finished_table_name(hosting_service), "removed_at"):
+            return "where removed_at is null"
+        return ""
+
     @classmethod
     def clean_string(cls, string: Union[str, None]) -> str:
         """
@@ -120,43 +200,250 @@ class Repository(db.Model):
 
     @declared_attr
     def hosting_service(cls):
-        return db.relationship("HostingService")
+        return db.relationship(
+            "HostingService",
+            primaryjoin=f"HostingService.id == {cls.__name__}.hosting_service_id",
+            foreign_keys=f"{cls.__name__}.hosting_service_id",
+        )
 
     @classmethod
-    def rotate(cls, hosting_service: "HostingService") -> None:
+    def rotate(cls, hosting_service: "HostingService", run_created_ts: float = None) -> None:
         """
-        drop and recreate the table for the hoster repos of this run
+        make the partition with the hoster repos of this run its finished table,
+        and start over with an empty partition
+
+        the partition is detached into a staging table first, and swapped in by renaming -
+        the previous finished table stays readable until then, and is dropped afterwards
+        (with EXPORT_DELTAS, its kept until the next rotation - for the delta exports).
+        with REPOS_UNLOGGED_RUNS, the run table takes the place of the partition.
+        repos added more than once during the run (retried blocks) are only kept once.
 
         use at the end of a hoster run to put the newest version of the hosters repos
         in its separate table before making exports
+
+        with REPOS_INCREMENTAL, repos are upserted into the finished table during the run already,
+        and we only mark the repos the run (created at run_created_ts) didnt see as removed.
         """
         logger.debug(f"rotating repos for {hosting_service}")
         repo_class = cls.repo_class_for_type(hosting_service.type)
+        if current_app.config["REPOS_INCREMENTAL"]:
+            repo_class._rotate_incremental(hosting_service, run_created_ts)
+            return
 
+        # separate transactions, so the finished table is only locked for the swap itself
+        is_unlogged = current_app.config["REPOS_UNLOGGED_RUNS"]
+        with TableHelper._cursor() as cur:
+            if is_unlogged:
+                staging_table = TableHelper.detach_hoster_repo_run_table(cur, hosting_service)
+            else:
+                staging_table = TableHelper.detach_hoster_repo_partition(cur, hosting_service)
         with TableHelper._cursor() as cur:
-            TableHelper.recreate_finished_hoster_repo_table(cur, hosting_service)
+            # repos which ended up in the other layout (i.e. before switching REPOS_UNLOGGED_RUNS)
+            partition_table = repo_class.get_partition_table_name(hosting_service)
+            run_table = repo_class.get_run_table_name(hosting_service)
+            if is_unlogged:
+                TableHelper.move_table_rows(cur, partition_table, staging_table)
+            elif TableHelper.table_exists(cur, run_table):
+                TableHelper.move_table_rows(cur, run_table, staging_table)
+                TableHelper.drop_table(cur, run_table)
+            duplicate_count = TableHelper.delete_duplicate_repos(cur, hosting_service, staging_table)
+            if duplicate_count:
+                logger.info(f"deleted {duplicate_count} duplicate repos of {hosting_service}")
+            if is_unlogged:
+                TableHelper.build_staging_indexes(cur, hosting_service)
+            # fresh statistics before anyone reads it (only locks the staging table)
+            cur.execute(f"analyze {staging_table}")
+            old_table = TableHelper.swap_finished_hoster_repo_table(cur, hosting_service)
+        if not current_app.config["EXPORT_DELTAS"]:
+            with TableHelper._cursor() as cur:
+                TableHelper.drop_table(cur, old_table)
+
+    @classmethod
+    def _get_upsert_sql(cls, hosting_service: "HostingService", select_statement: str) -> str:
+        """
+        sql to upsert the rows of a select (ordered like `row_columns`, then seen_run_ts)
+        into the incremental finished table of the hoster
+        """
+        foreign_id = cls.get_foreign_id_column()
+        columns = ", ".join(cls.row_columns)
+        updates = ", ".join(
+            f"{column} = excluded.{column}"
+            for column in cls.row_columns
+            if column not in ("hosting_service_id", foreign_id)
+        )
+        return f"""
+            insert into {cls.get_finished_table_name(hosting_service)} ({columns}, seen_run_ts)
+            {select_statement}
+            on conflict (hosting_service_id, {foreign_id}) do update
+            set {updates}, seen_run_ts = excluded.seen_run_ts, removed_at = null
+            """
+
+    @classmethod
+    def upsert_rows(cls, cur, hosting_service: "HostingService", rows: Iterable[tuple], run_created_ts: float) -> int:
+        """
+        upsert rows (ordered like `row_columns`) into the finished table of the hoster, marking them
+        as seen by the run created at run_created_ts (see REPOS_INCREMENTAL)
 
-            # clean up our working table
+        rows are copied into a temporary table first, and merged from there.
+        returns the number of rows written
+        """
+        TableHelper.ensure_incremental_hoster_repo_table(cur, hosting_service)
+
+        # a statement cant upsert the same repo twice - the last one wins
+        hoster_index = cls.row_columns.index("hosting_service_id")
+        foreign_id_index = cls.row_columns.index(cls.get_foreign_id_column())
+        rows = list({(row[hoster_index], row[foreign_id_index]): row for row in rows}.values())
+
+        columns = ", ".join(cls.row_columns)
+        staging_table = f"{cls.__tablename__}_upsert"
+        cur.execute(
+            f"""
+            create temporary table if not exists {staging_table}
+            on commit drop
+            as select {columns} from {cls.__tablename__} with no data
+            """
+        )
+        cur.execute(f"truncate {staging_table}")
+        cls.copy_from_rows(cur, rows, table_name=staging_table)
+        cur.execute(
+            cls._get_upsert_sql(hosting_service, f"select {columns}, %s from {staging_table}"),
+            (run_created_ts,),
+        )
+        return len(rows)
+
+    @classmethod
+    def _rotate_incremental(cls, hosting_service: "HostingService", run_created_ts: Union[float, None]) -> None:
+        """
+        end an incremental run: merge what is left in the working table,
+        and mark the repos the run didnt see as removed
+        """
+        with TableHelper._cursor() as cur:
+            TableHelper.ensure_incremental_hoster_repo_table(cur, hosting_service)
+
+            # repos which still ended up in the working table (i.e. before switching to incremental runs)
+            partition_table = cls.get_partition_table_name(hosting_service)
+            foreign_id = cls.get_foreign_id_column()
+            columns = ", ".join(cls.row_columns)
+            cur.execute(
+                cls._get_upsert_sql(
+                    hosting_service,
+                    f"""
+                    select distinct on (hosting_service_id, {foreign_id}) {columns}, %s
+                    from {partition_table}
+                    order by hosting_service_id, {foreign_id}, id desc
+                    """,
+                ),
+                (run_created_ts or 0,),
+            )
+            cur.execute(f"truncate {partition_table}")
+
+            if run_created_ts is None:
+                logger.warning(f"(skipping) run of {hosting_service} is unknown, cant mark removed repos")
+                return
             cur.execute(
                 f"""
-                delete
-                from {repo_class.__tablename__}
+                update {cls.get_finished_table_name(hosting_service)}
+                set removed_at = now()
                 where
-                    hosting_service_id = %s
+                    seen_run_ts < %s
+                    and removed_at is null
                 """,
-                (
-                    hosting_service.id,
-                ),
+                (run_created_ts,),
             )
+            logger.info(f"marked {cur.rowcount} repos of {hosting_service} as removed")
+
+    # column order of the rows built by `row_from_dict`,
+    # has to be defined for all subclasses
+    row_columns: Tuple[str, ...] = ()
+
+    @classmethod
+    def row_from_dict(cls, hosting_service_id, d: dict) -> tuple:
+        """
+        parse a crawler repo dict into an insert-ready row, ordered like `row_columns`
+
+        this skips instantiating (and instrumenting) a model,
+        for repos we only insert and never read back.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def from_dict(cls, hosting_service_id, d: dict, update=True):
+        row = cls.row_from_dict(hosting_service_id, d)
+        return cls(**dict(zip(cls.row_columns, row)))
+
+    def to_copy_row(self) -> tuple:
+        """
+        this repo as a row, ordered like `row_columns`
+        """
+        return tuple(getattr(self, column) for column in self.row_columns)
+
+    @classmethod
+    def _to_copy_value(cls, value) -> str:
+        """
+        format a python value for postgres' COPY text format
+        """
+        if value is None:
+            return "\\N"
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, str):
+            return (
+                value.replace("\\", "\\\\")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r")
+            )
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return str(value)
+
+    @classmethod
+    def copy_from_rows(cls, cur, rows: Iterable[tuple], table_name: str = None) -> int:
+        """
+        stream rows (ordered like `row_columns`) into our table (or table_name) via COPY FROM STDIN
+
+        returns the number of rows written
+        """
+        buffer = io.StringIO()
+        row_count = 0
+        for row in rows:
+            buffer.write("\t".join([cls._to_copy_value(value) for value in row]))
+            buffer.write("\n")
+            row_count += 1
+        buffer.seek(0)
+
+        columns = ", ".join(cls.row_columns)
+        cur.copy_expert(
+            f"COPY {table_name or cls.__tablename__} ({columns}) FROM STDIN",
+            buffer,
+        )
+        return row_count
+
+    @classmethod
+    def _open_export_file(cls, export_filename: str, codec: str) -> ThreadedWriter:
+        """
+        open an export file in RESULTS_PATH, compressing with <codec> on a separate thread
+        """
+        return ThreadedWriter(open_export_file(
+            f"{current_app.config['RESULTS_PATH']}/{export_filename}",
+            codec,
+            level=current_app.config["EXPORT_COMPRESSION_LEVEL"],
+            threads=current_app.config["EXPORT_COMPRESSION_THREADS"],
+        ))
 
     @classmethod
-    def _copy_to_csv(cls, select_statement, export_filename):
+    def _copy_to_csv(cls, select_statement, export_filename, codec: str = EXPORT_CODEC_GZIP) -> int:
+        """
+        COPY the results of a select into a compressed csv (on its own connection),
+        compressing on a separate thread
+
+        returns the (uncompressed) size of the csv
+        """
         logger.debug("running export...")
         con = db.engine.raw_connection()
         try:
             cur = con.cursor()
-            result_path = f"{current_app.config['RESULTS_PATH']}/{export_filename}"
-            with gzip.open(result_path, "w") as gzfile:
+            with cls._open_export_file(export_filename, codec) as writer:
                 cur.copy_expert(
                     f"""
                         COPY ({select_statement})
@@ -164,8 +451,9 @@ class Repository(db.Model):
                         delimiter ';'
                         csv header
                         """,
-                    gzfile,
+                    writer,
                 )
+            return writer.bytes_written
         finally:
             con.close()
 
@@ -174,22 +462,162 @@ class Repository(db.Model):
         cls,
         hosting_service: "HostingService",
         filename: str,
-    ) -> None:
+        codec: str = EXPORT_CODEC_GZIP,
+    ) -> int:
         """
-        export table content to a csv
+        export table content to a csv (compressed with <codec>)
+
+        returns the (uncompressed) size of the csv
         """
         finished_table_name = cls.get_finished_table_name(hosting_service)
-        select_statement = f"select * from {finished_table_name}"
-        cls._copy_to_csv(select_statement, filename)
+        columns = ", ".join(column.name for column in cls.__table__.columns)
+        with TableHelper._cursor() as cur:
+            where = cls._get_finished_table_where(cur, hosting_service)
+        select_statement = f"select {columns} from {finished_table_name} {where}"
+        return cls._copy_to_csv(select_statement, filename, codec)
 
     @classmethod
     def export_unified_csv_gz(
         cls,
         hosting_service: "HostingService",
         filename: str,
-    ) -> None:
-        select_statement = cls.get_unified_select_sql(hosting_service)
-        cls._copy_to_csv(select_statement, filename)
+        codec: str = EXPORT_CODEC_GZIP,
+    ) -> int:
+        """
+        export table content, mapped to the unified columns, to a csv (compressed with <codec>)
+
+        returns the (uncompressed) size of the csv
+        """
+        with TableHelper._cursor() as cur:
+            where = cls._get_finished_table_where(cur, hosting_service)
+        select_statement = cls.get_unified_select_sql(hosting_service, where=where)
+        return cls._copy_to_csv(select_statement, filename, codec)
+
+    @classmethod
+    def export_unified_parquet(
+        cls,
+        hosting_service: "HostingService",
+        filename: str,
+        codec: str = EXPORT_CODEC_GZIP,
+    ) -> int:
+        """
+        export table content, mapped to the unified columns and typed, to a parquet file
+
+        COPYs a csv, converted by arrow while its read (see `write_parquet`), into row groups of about
+        EXPORT_PARQUET_ROW_GROUP_SIZE repos - each column chunk compressed with <codec>
+
+        returns the number of exported repos
+        """
+        # pyarrow is only needed with EXPORT_PARQUET
+        from hubgrep_indexer.lib.parquet_writer import get_arrow_schema, write_parquet
+
+        with TableHelper._cursor() as cur:
+            where = cls._get_finished_table_where(cur, hosting_service)
+        select_statement = cls.get_unified_typed_select_sql(hosting_service, where=where)
+        schema = get_arrow_schema([(column, cls.unified_column_types[column]) for column in cls.get_unified_columns()])
+
+        logger.debug("running parquet export...")
+        con = db.engine.raw_connection()
+        try:
+            cur = con.cursor()
+            return write_parquet(
+                lambda csv_file: cur.copy_expert(f"COPY ({select_statement}) TO STDOUT csv header", csv_file),
+                f"{current_app.config['RESULTS_PATH']}/{filename}",
+                schema,
+                codec,
+                compression_level=current_app.config["EXPORT_COMPRESSION_LEVEL"],
+                row_group_size=current_app.config["EXPORT_PARQUET_ROW_GROUP_SIZE"],
+            )
+        finally:
+            con.close()
+
+    @classmethod
+    def has_previous_finished_table(cls, hosting_service: "HostingService") -> bool:
+        """
+        check if the finished table of the previous run is still around, to make delta exports against
+        (incremental runs update the finished table in place, there is none)
+        """
+        if current_app.config["REPOS_INCREMENTAL"]:
+            return False
+        with TableHelper._cursor() as cur:
+            return TableHelper.table_exists(cur, cls.get_previous_finished_table_name(hosting_service))
+
+    @classmethod
+    def get_delta_select_sql(cls, hosting_service: "HostingService", unified: bool = False) -> str:
+        """
+        get the sql statement for a delta export - the repos added, changed or removed since the previous run
+
+        repos are matched by their foreign id, and changed when the columns the
+        updated_at/pushed_at unified columns are mapped to changed. each row starts with its "change"
+        (added, changed or removed), followed by the raw or unified columns - removed repos as they were.
+        """
+        new_table = cls.get_finished_table_name(hosting_service)
+        old_table = cls.get_previous_finished_table_name(hosting_service)
+        foreign_id = cls.get_foreign_id_column()
+        raw_columns = [column.name for column in cls.__table__.columns]
+        # gitlab maps both to last_activity_at
+        change_columns = list(dict.fromkeys(
+            [cls.unification_mapping["updated_at"], cls.unification_mapping["pushed_at"]]
+        ))
+
+        def columns_of(alias: str) -> str:
+            return ", ".join(f"{alias}.{column}" for column in raw_columns)
+
+        def match(alias: str, other_alias: str) -> str:
+            return (
+                f"{alias}.hosting_service_id = {other_alias}.hosting_service_id"
+                f" and {alias}.{foreign_id} = {other_alias}.{foreign_id}"
+            )
+
+        if unified:
+            select_part = cls.unified_select_template.format_map(cls.unification_mapping)
+        else:
+            select_part = ", ".join(raw_columns)
+        return f"""
+        select change, {select_part}
+        from (
+            select 'added' as change, {columns_of("n")}
+            from {new_table} n
+            where not exists (select 1 from {old_table} o where {match("o", "n")})
+            union all
+            select 'changed' as change, {columns_of("n")}
+            from {new_table} n
+            join {old_table} o on {match("o", "n")}
+            where ({", ".join(f"n.{column}" for column in change_columns)})
+                is distinct from ({", ".join(f"o.{column}" for column in change_columns)})
+            union all
+            select 'removed' as change, {columns_of("o")}
+            from {old_table} o
+            where not exists (select 1 from {new_table} n where {match("n", "o")})
+        ) as delta
+        """
+
+    @classmethod
+    def export_delta_csv_gz(
+        cls,
+        hosting_service: "HostingService",
+        filename: str,
+        unified: bool = False,
+        codec: str = EXPORT_CODEC_GZIP,
+    ) -> int:
+        """
+        export the repos which changed since the previous run (see `get_delta_select_sql`)
+        to a csv (compressed with <codec>)
+
+        returns the (uncompressed) size of the csv
+        """
+        return cls._copy_to_csv(cls.get_delta_select_sql(hosting_service, unified=unified), filename, codec)
+
+    @classmethod
+    def count_delta_rows(cls, hosting_service: "HostingService") -> Dict[str, int]:
+        """
+        count the added, changed and removed repos since the previous run
+        """
+        with TableHelper._cursor() as cur:
+            cur.execute(f"select change, count(*) from ({cls.get_delta_select_sql(hosting_service)}) as d group by change")
+            counts = dict(added=0, changed=0, removed=0)
+            counts.update(cur.fetchall())
+            return counts
 
     @classmethod
     def count_export_rows(cls, hosting_service: "HostingService") -> int:
@@ -198,13 +626,65 @@ class Repository(db.Model):
         """
         finished_table_name = cls.get_finished_table_name(hosting_service)
         with TableHelper._cursor() as cur:
-            return TableHelper.count_table_rows(cur, finished_table_name)
-
-    def to_dict(self):
-        raise NotImplementedError
+            where = cls._get_finished_table_where(cur, hosting_service)
+            return TableHelper.count_table_rows(cur, finished_table_name, where=where)
 
     @classmethod
-    def from_dict(cls, hosting_service_id, d: dict, update=True):
+    def export_csv_gz_single_pass(
+        cls,
+        hosting_service: "HostingService",
+        raw_filename: str,
+        unified_filename: str,
+        codec: str = EXPORT_CODEC_GZIP,
+    ) -> Tuple[int, int]:
+        """
+        export table content to a raw and a unified csv (compressed with <codec>), reading the table only once
+
+        one COPY selects the raw columns, followed by the unified columns which arent raw columns
+        (i.e. constants), and every record is split into both csvs.
+
+        returns the (uncompressed) sizes of the raw and the unified csv
+        """
+        raw_columns = [column.name for column in cls.__table__.columns]
+        unified_columns = cls.get_unified_columns()
+        select_parts = list(raw_columns)
+        unified_field_indexes = []
+        for unified_column in unified_columns:
+            expression = cls.unification_mapping[unified_column]
+            if expression in raw_columns:
+                unified_field_indexes.append(raw_columns.index(expression))
+            else:
+                unified_field_indexes.append(len(select_parts))
+                select_parts.append(f"{expression} as {unified_column}")
+
+        with TableHelper._cursor() as cur:
+            where = cls._get_finished_table_where(cur, hosting_service)
+        select_statement = f"select {', '.join(select_parts)} from {cls.get_finished_table_name(hosting_service)} {where}"
+
+        logger.debug("running single pass export...")
+        con = db.engine.raw_connection()
+        try:
+            cur = con.cursor()
+            with cls._open_export_file(raw_filename, codec) as raw_writer, \
+                    cls._open_export_file(unified_filename, codec) as unified_writer:
+                split_writer = CsvSplitWriter([
+                    CsvSplitOutput(raw_writer, field_indexes=list(range(len(raw_columns)))),
+                    CsvSplitOutput(unified_writer, field_indexes=unified_field_indexes, header=unified_columns),
+                ])
+                cur.copy_expert(
+                    f"""
+                        COPY ({select_statement})
+                        TO STDOUT
+                        delimiter ';'
+                        csv header
+                        """,
+                    split_writer,
+                )
+            return raw_writer.bytes_written, unified_writer.bytes_written
+        finally:
+            con.close()
+
+    def to_dict(self):
         raise NotImplementedError
 
     @classmethod
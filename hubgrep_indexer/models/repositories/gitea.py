@@ -80,35 +80,54 @@ class GiteaRepository(Repository):
         repo_url="html_url",
     )
 
-    @classmethod
-    def from_dict(cls, hosting_service_id, d: dict, update=True):
-        owner_username = d["owner"]["username"]
-        name = d["name"]
-        gitea_id = d["id"]
-
-        repo = cls()
-
-        repo.hosting_service_id = hosting_service_id
-        repo.gitea_id = gitea_id
-        repo.name = cls.clean_string(name)
-        repo.owner_username = cls.clean_string(owner_username)
-        repo.description = cls.clean_string(d["description"])
-        repo.empty = d["empty"]
-        repo.private = d["private"]
-        repo.fork = d["fork"]
-        repo.mirror = d["mirror"]
-        repo.size = d["size"]
-        repo.html_url = d["html_url"]
-        repo.website = d["website"]
-        repo.stars_count = d["stars_count"]
-        repo.forks_count = d["forks_count"]
-        repo.watchers_count = d["watchers_count"]
-        repo.open_issues_count = d["open_issues_count"]
-        repo.default_branch = d["default_branch"]
-        repo.created_at = iso8601.parse_date(d["created_at"])
-        repo.updated_at = iso8601.parse_date(d["updated_at"])
+    # column order of the rows built by `row_from_dict`
+    row_columns = (
+        "hosting_service_id",
+        "gitea_id",
+        "name",
+        "owner_username",
+        "description",
+        "empty",
+        "private",
+        "fork",
+        "mirror",
+        "size",
+        "html_url",
+        "website",
+        "stars_count",
+        "forks_count",
+        "watchers_count",
+        "open_issues_count",
+        "default_branch",
+        "created_at",
+        "updated_at",
+        "pushed_at",
+    )
 
-        return repo
+    @classmethod
+    def row_from_dict(cls, hosting_service_id, d: dict) -> tuple:
+        return (
+            hosting_service_id,
+            d["id"],
+            cls.clean_string(d["name"]),
+            cls.clean_string(d["owner"]["username"]),
+            cls.clean_string(d["description"]),
+            d["empty"],
+            d["private"],
+            d["fork"],
+            d["mirror"],
+            d["size"],
+            d["html_url"],
+            d["website"],
+            d["stars_count"],
+            d["forks_count"],
+            d["watchers_count"],
+            d["open_issues_count"],
+            d["default_branch"],
+            iso8601.parse_date(d["created_at"]),
+            iso8601.parse_date(d["updated_at"]),
+            None,  # gitea doesnt tell us about pushes
+        )
 
     def to_dict(self) -> Dict[str, str]:
         repo = dict()
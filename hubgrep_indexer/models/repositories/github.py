@@ -81,45 +81,75 @@ class GithubRepository(Repository):
         repo_id = int(decoded.split("Repository")[1])
         return repo_id
 
-    @classmethod
-    def from_dict(cls, hosting_service_id, d: dict, update=True) -> "GithubRepository":
-        owner_login = d["owner"]["login"]
-        name = d["name"]
-        github_id = cls.github_id_from_base64(d["id"])
-
-        repo = cls()
+    # column order of the rows built by `row_from_dict`
+    row_columns = (
+        "hosting_service_id",
+        "github_id",
+        "name",
+        "homepage_url",
+        "url",
+        "created_at",
+        "updated_at",
+        "pushed_at",
+        "short_description_html",
+        "description",
+        "is_archived",
+        "is_private",
+        "is_fork",
+        "is_empty",
+        "is_disabled",
+        "is_locked",
+        "is_template",
+        "stargazer_count",
+        "fork_count",
+        "disk_usage",
+        "owner_login",
+        "primary_language_name",
+        "license_name",
+        "license_nickname",
+    )
 
-        repo.hosting_service_id = hosting_service_id
-        repo.github_id = github_id
-        repo.name = cls.clean_string(name)
-        repo.homepage_url = cls.clean_string(d["homepageUrl"])
-        repo.url = cls.clean_string(d["url"])
-        repo.created_at = iso8601.parse_date(d["createdAt"])
-        repo.updated_at = iso8601.parse_date(d["updatedAt"])
+    @classmethod
+    def row_from_dict(cls, hosting_service_id, d: dict) -> tuple:
         if d.get("pushedAt", None):
-            repo.pushed_at = iso8601.parse_date(d["pushedAt"])
+            pushed_at = iso8601.parse_date(d["pushedAt"])
         else:
-            repo.pushed_at = None
-        repo.short_description_html = cls.clean_string(d["shortDescriptionHTML"])
-        repo.description = cls.clean_string(d["description"])
-        repo.is_archived = d["isArchived"]
-        repo.is_private = d["isPrivate"]
-        repo.is_fork = d["isFork"]
-        repo.is_empty = d["isEmpty"]
-        repo.is_disabled = d["isDisabled"]
-        repo.is_locked = d["isLocked"]
-        repo.is_template = d["isTemplate"]
-        repo.stargazer_count = d["stargazerCount"]
-        repo.fork_count = d["forkCount"]
-        repo.disk_usage = d["diskUsage"]
-        repo.owner_login = cls.clean_string(owner_login)
+            pushed_at = None
+        primary_language_name = None
         if isinstance(d["primaryLanguage"], dict):
-            repo.primary_language_name = d["primaryLanguage"].get("name", None)
+            primary_language_name = d["primaryLanguage"].get("name", None)
+        license_name = None
+        license_nickname = None
         if isinstance(d["licenseInfo"], dict):
-            repo.license_name = d["licenseInfo"].get("name", None)
-            repo.license_nickname = d["licenseInfo"].get("nickname", None)
-
-        return repo
+            license_name = d["licenseInfo"].get("name", None)
+            license_nickname = d["licenseInfo"].get("nickname", None)
+
+        return (
+            hosting_service_id,
+            cls.github_id_from_base64(d["id"]),
+            cls.clean_string(d["name"]),
+            cls.clean_string(d["homepageUrl"]),
+            cls.clean_string(d["url"]),
+            iso8601.parse_date(d["createdAt"]),
+            iso8601.parse_date(d["updatedAt"]),
+            pushed_at,
+            cls.clean_string(d["shortDescriptionHTML"]),
+            cls.clean_string(d["description"]),
+            d["isArchived"],
+            d["isPrivate"],
+            d["isFork"],
+            d["isEmpty"],
+            d["isDisabled"],
+            d["isLocked"],
+            d["isTemplate"],
+            d["stargazerCount"],
+            d["forkCount"],
+            d["diskUsage"],
+            cls.clean_string(d["owner"]["login"]),
+            primary_language_name,
+            license_name,
+            license_nickname,
+        )
 
     def to_dict(self) -> Dict[str, str]:
         repo = dict()
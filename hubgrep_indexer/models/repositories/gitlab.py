@@ -108,34 +108,50 @@ class GitlabRepository(Repository):
         repo_url="http_url_to_repo"
     )
 
-    @classmethod
-    def from_dict(cls, hosting_service_id, d: dict, update=True) -> "GitlabRepository":
-        user_name = d["namespace"]["path"]
-        name = d["name"]
-        gitlab_id = d["id"]
-
-        repo = cls()
-
-        repo.hosting_service_id = hosting_service_id
-        repo.gitlab_id = gitlab_id
-        repo.name = cls.clean_string(name)
-        repo.user_name = cls.clean_string(user_name)
-        repo.description = cls.clean_string(d["description"])
-        repo.name_with_namespace = cls.clean_string(d["name_with_namespace"])
-        repo.path = cls.clean_string(d["path"])
-        repo.path_with_namespace = cls.clean_string(d["path_with_namespace"])
-        repo.created_at = iso8601.parse_date(d["created_at"])
-        repo.last_activity_at = iso8601.parse_date(d["last_activity_at"])
-        repo.default_branch = d.get("default_branch", None)
-        repo.ssh_url_to_repo = d["ssh_url_to_repo"]
-        repo.http_url_to_repo = d["http_url_to_repo"]
-        repo.web_url = d["web_url"]
-        repo.readme_url = d["readme_url"]
-        repo.avatar_url = d["avatar_url"]
-        repo.forks_count = d["forks_count"]
-        repo.star_count = d["star_count"]
+    # column order of the rows built by `row_from_dict`
+    row_columns = (
+        "hosting_service_id",
+        "gitlab_id",
+        "name",
+        "user_name",
+        "description",
+        "name_with_namespace",
+        "path",
+        "path_with_namespace",
+        "created_at",
+        "last_activity_at",
+        "default_branch",
+        "ssh_url_to_repo",
+        "http_url_to_repo",
+        "web_url",
+        "readme_url",
+        "avatar_url",
+        "forks_count",
+        "star_count",
+    )
 
-        return repo
+    @classmethod
+    def row_from_dict(cls, hosting_service_id, d: dict) -> tuple:
+        return (
+            hosting_service_id,
+            d["id"],
+            cls.clean_string(d["name"]),
+            cls.clean_string(d["namespace"]["path"]),
+            cls.clean_string(d["description"]),
+            cls.clean_string(d["name_with_namespace"]),
+            cls.clean_string(d["path"]),
+            cls.clean_string(d["path_with_namespace"]),
+            iso8601.parse_date(d["created_at"]),
+            iso8601.parse_date(d["last_activity_at"]),
+            d.get("default_branch", None),
+            d["ssh_url_to_repo"],
+            d["http_url_to_repo"],
+            d["web_url"],
+            d["readme_url"],
+            d["avatar_url"],
+            d["forks_count"],
+            d["star_count"],
+        )
 
     def to_dict(self) -> Dict[str, str]:
         repo = dict()
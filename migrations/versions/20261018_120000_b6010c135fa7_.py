@@ -0,0 +1,76 @@
+"""partition repo tables by hosting service
+
+Revision ID: b6010c135fa7
+Revises: 13a4650f65a5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'b6010c135fa7'
+down_revision = '13a4650f65a5'
+branch_labels = None
+depends_on = None
+
+# (hoster type, foreign id column) of the repo tables
+REPO_TABLES = [
+    ('github', 'github_id'),
+    ('gitea', 'gitea_id'),
+    ('gitlab', 'gitlab_id'),
+]
+
+
+def _recreate_repo_table(table_name: str, old_table_name: str, hoster_type: str, foreign_id: str, partitioned: bool):
+    """ move a repo table out of the way, and recreate it (partitioned or not) with its repos """
+    op.execute(f"alter table {table_name} rename to {old_table_name}")
+    op.execute(f"alter index {table_name}_pkey rename to {old_table_name}_pkey")
+    op.execute(f"drop index if exists repo_ident_index_{hoster_type}")
+
+    partition_by = "partition by list (hosting_service_id)" if partitioned else ""
+    primary_key = "id, hosting_service_id" if partitioned else "id"
+    op.execute(f"create table {table_name} (like {old_table_name} including defaults) {partition_by}")
+    op.execute(f"alter table {table_name} add primary key ({primary_key})")
+    if not partitioned:
+        # (partitions go with their hosting service instead)
+        op.execute(
+            f"alter table {table_name} add constraint {table_name}_hosting_service_id_fkey "
+            f"foreign key (hosting_service_id) references hosting_service (id)"
+        )
+    op.execute(f"alter sequence {table_name}_id_seq owned by {table_name}.id")
+    op.execute(f"create index repo_ident_index_{hoster_type} on {table_name} (hosting_service_id, {foreign_id})")
+
+    if partitioned:
+        # one partition per hosting service, new ones are created when adding a hosting service
+        hoster_ids = op.get_bind().execute(
+            sa.text(
+                f"""
+                select id from hosting_service where type = :type
+                union
+                select distinct hosting_service_id from {old_table_name}
+                """
+            ),
+            type=hoster_type,
+        )
+        for hoster_id, in hoster_ids:
+            op.execute(
+                f"create table hoster_{hoster_id}_repositories partition of {table_name} for values in ({hoster_id})"
+            )
+
+    op.execute(f"insert into {table_name} select * from {old_table_name}")
+    # (drops the partitions as well)
+    op.execute(f"drop table {old_table_name}")
+
+
+def upgrade():
+    for hoster_type, foreign_id in REPO_TABLES:
+        table_name = f"{hoster_type}_repositories"
+        _recreate_repo_table(table_name, f"{table_name}_unpartitioned", hoster_type, foreign_id, partitioned=True)
+
+
+def downgrade():
+    for hoster_type, foreign_id in REPO_TABLES:
+        table_name = f"{hoster_type}_repositories"
+        _recreate_repo_table(table_name, f"{table_name}_partitioned", hoster_type, foreign_id, partitioned=False)
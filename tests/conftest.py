@@ -6,6 +6,7 @@ import pytest
 from hubgrep_indexer.lib.init_logging import init_logging
 
 from hubgrep_indexer import create_app, db, state_manager
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
 from hubgrep_indexer.models.hosting_service import HostingService
 from hubgrep_indexer.models.export_meta import ExportMeta
 from hubgrep_indexer.models.repositories.gitea import GiteaRepository
@@ -21,6 +22,7 @@ init_logging()
 def before_and_after_each_test():
     # before each test
     state_manager.redis = redislite.Redis()
+    hoster_registry.clear()
     yield
     # after each test
     state_manager.redis.flushdb()
@@ -39,7 +41,9 @@ def test_app(request):
         db.session.query(GithubRepository).delete()
         db.session.query(GitlabRepository).delete()
         db.session.query(ExportMeta).delete()
-        db.session.query(HostingService).delete()
+        # (one by one, dropping their repo partitions)
+        for hosting_service in HostingService.query.all():
+            db.session.delete(hosting_service)
         db.session.commit()
 
     yield app
@@ -3,8 +3,9 @@ import time
 import logging
 from hubgrep_indexer.models.repositories.abstract_repository import Repository
 from hubgrep_indexer.lib.table_helper import TableHelper
-from hubgrep_indexer import db
+from hubgrep_indexer import db, state_manager
 from hubgrep_indexer.constants import HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB
+from tests.conftest import _add_hosting_service
 from tests.helpers import get_mock_repos
 from hubgrep_indexer.api_blueprint.add_repos import _append_repos
 
@@ -22,6 +23,8 @@ class TestRepository:
         # its just a helper function, but why not test here as well
         assert repo_class.query.count() == 1
         assert repo.name == mock_repos[0]["name"]
+        # end our transaction - rotating needs an exclusive lock on the repo tables
+        db.session.commit()
 
     @pytest.mark.parametrize(
         "hosting_service",  # matched against hosting_service fixture in conftest.py
@@ -71,6 +74,7 @@ class TestRepository:
         self._commit_mock_repos(hosting_service)
         # we added a repo
         assert repo_class.query.count() == 1
+        db.session.commit()
 
         # rotating should move repos over to finished table
         repo_class.rotate(hosting_service)
@@ -83,6 +87,7 @@ class TestRepository:
         self._commit_mock_repos(hosting_service)
 
         assert repo_class.query.count() == 1
+        db.session.commit()
         # rotate deletes the last run, leaving only the newest repo
         repo_class.rotate(hosting_service)
         assert repo_class.query.count() == 0
@@ -90,3 +95,306 @@ class TestRepository:
         with TableHelper._cursor() as cur:
             assert TableHelper.count_table_rows(cur, finished_tablename) == 1
 
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_copy_from_rows(self, test_app, hosting_service):
+        """
+        rows written via COPY should read back the same as orm inserted repos
+        """
+        with test_app.app_context():
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            repo = repo_class.from_dict(hosting_service.id, mock_repos[0])
+            # things the COPY text format has to escape
+            repo.description = "tab\there\nnewline\\backslash"
+            repo.name = ""
+
+            with TableHelper._cursor() as cur:
+                row_count = repo_class.copy_from_rows(cur, [repo.to_copy_row()])
+            assert row_count == 1
+
+            copied_repo = repo_class.query.first()
+            assert copied_repo.description == repo.description
+            assert copied_repo.name == ""
+            assert copied_repo.hosting_service_id == hosting_service.id
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_row_from_dict(self, test_app, hosting_service):
+        """
+        rows should cover every column but the id, and match the parsed model
+        """
+        with test_app.app_context():
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+
+            table_columns = {column.name for column in repo_class.__table__.columns}
+            assert set(repo_class.row_columns) == table_columns - {"id"}
+
+            row = repo_class.row_from_dict(hosting_service.id, mock_repos[0])
+            repo = repo_class.from_dict(hosting_service.id, mock_repos[0])
+            assert len(row) == len(repo_class.row_columns)
+            assert row == repo.to_copy_row()
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_rotate_incremental(self, test_app, test_client, hosting_service):
+        """
+        repos are upserted into the finished table during a run,
+        and the ones a run didnt see are marked as removed at its end
+        """
+        with test_app.app_context():
+            test_app.config["REPOS_INCREMENTAL"] = True
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            finished_tablename = repo_class.get_finished_table_name(hosting_service)
+            foreign_id_column = repo_class.get_foreign_id_column()
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+
+            # first run - repeated repos are only kept once
+            state_manager.set_run_created_ts(hosting_service.id, 1000)
+            _append_repos(hosting_service, mock_repos + mock_repos[:1])
+            assert repo_class.query.count() == 0
+            db.session.commit()
+            with TableHelper._cursor() as cur:
+                assert TableHelper.count_table_rows(cur, finished_tablename) == len(mock_repos)
+            repo_class.rotate(hosting_service, run_created_ts=1000)
+            assert repo_class.count_export_rows(hosting_service) == len(mock_repos)
+
+            # second run - sees all repos but the last, one of them renamed
+            state_manager.set_run_created_ts(hosting_service.id, 2000)
+            seen_repos = [dict(repo) for repo in mock_repos[:-1]]
+            seen_repos[0]["name"] = "renamed"
+            _append_repos(hosting_service, seen_repos)
+            repo_class.rotate(hosting_service, run_created_ts=2000)
+
+            with TableHelper._cursor() as cur:
+                assert TableHelper.count_table_rows(cur, finished_tablename) == len(mock_repos)
+                assert TableHelper.count_table_rows(
+                    cur, finished_tablename, where="where removed_at is not null"
+                ) == 1
+                cur.execute(f"select name from {finished_tablename} where {foreign_id_column} = %s",
+                            (repo_class.row_from_dict(hosting_service.id, seen_repos[0])[
+                                 repo_class.row_columns.index(foreign_id_column)],))
+                assert cur.fetchone()[0] == "renamed"
+            assert repo_class.count_export_rows(hosting_service) == len(mock_repos) - 1
+
+            # a removed repo comes back
+            state_manager.set_run_created_ts(hosting_service.id, 3000)
+            _append_repos(hosting_service, mock_repos)
+            repo_class.rotate(hosting_service, run_created_ts=3000)
+            assert repo_class.count_export_rows(hosting_service) == len(mock_repos)
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_rotate_incremental_converts_finished_table(self, test_app, test_client, hosting_service):
+        """ switching to incremental runs keeps the repos of the last finished (rotated) run """
+        with test_app.app_context():
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            finished_tablename = repo_class.get_finished_table_name(hosting_service)
+            self._commit_mock_repos(hosting_service)
+            repo_class.rotate(hosting_service)
+
+            test_app.config["REPOS_INCREMENTAL"] = True
+            # repos left in the working table are carried over as well
+            self._commit_mock_repos(hosting_service)
+            repo_class.rotate(hosting_service, run_created_ts=1000)
+            assert repo_class.query.count() == 0
+            with TableHelper._cursor() as cur:
+                assert TableHelper.has_column(cur, finished_tablename, "removed_at")
+                assert TableHelper.count_table_rows(cur, finished_tablename) == 1
+            assert repo_class.count_export_rows(hosting_service) == 1
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_rotate_keeps_other_hosters(self, test_app, test_client, hosting_service):
+        """
+        every hoster has its own partition, rotating one hoster never touches the repos of the others
+        """
+        with test_app.app_context():
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            other_hosting_service = _add_hosting_service(api_url="https://other.com/", type=hosting_service.type)
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            _append_repos(hosting_service, mock_repos[:1])
+            _append_repos(other_hosting_service, mock_repos)
+
+            repo_class.rotate(hosting_service)
+            assert repo_class.query.filter_by(hosting_service_id=hosting_service.id).count() == 0
+            assert repo_class.query.filter_by(hosting_service_id=other_hosting_service.id).count() == len(mock_repos)
+            assert repo_class.count_export_rows(hosting_service) == 1
+            db.session.commit()
+
+            # the partitions go with their hoster
+            partition_table = repo_class.get_partition_table_name(other_hosting_service)
+            db.session.delete(other_hosting_service)
+            db.session.commit()
+            with TableHelper._cursor() as cur:
+                cur.execute("select to_regclass(%s)", (partition_table,))
+                assert cur.fetchone()[0] is None
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_rotate_swaps_finished_table(self, test_app, test_client, hosting_service):
+        """
+        rotating swaps in the new finished table, without leaving staging or old tables behind
+        """
+        with test_app.app_context():
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            finished_tablename = repo_class.get_finished_table_name(hosting_service)
+            staging_tablename = repo_class.get_staging_table_name(hosting_service)
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            _append_repos(hosting_service, mock_repos)
+            repo_class.rotate(hosting_service)
+
+            # a rotation which didnt make it to the swap
+            with TableHelper._cursor() as cur:
+                cur.execute(f"create table {staging_tablename} (like {finished_tablename})")
+
+            _append_repos(hosting_service, mock_repos[:1])
+            repo_class.rotate(hosting_service)
+            assert repo_class.count_export_rows(hosting_service) == 1
+            with TableHelper._cursor() as cur:
+                for table_name in [staging_tablename, f"{finished_tablename}_old"]:
+                    cur.execute("select to_regclass(%s)", (table_name,))
+                    assert cur.fetchone()[0] is None
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    @pytest.mark.parametrize("use_copy", [True, False])
+    def test_rotate_unlogged(self, test_app, test_client, hosting_service, use_copy):
+        """
+        repos of a run go into an unlogged table without indexes,
+        which is indexed, made crash safe and swapped in at the end of the run
+        """
+        with test_app.app_context():
+            test_app.config["REPOS_UNLOGGED_RUNS"] = True
+            test_app.config["INGEST_USE_COPY"] = use_copy
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            finished_tablename = repo_class.get_finished_table_name(hosting_service)
+            run_tablename = repo_class.get_run_table_name(hosting_service)
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+
+            # repos of the partition, from before switching
+            test_app.config["REPOS_UNLOGGED_RUNS"] = False
+            _append_repos(hosting_service, mock_repos[:1])
+            test_app.config["REPOS_UNLOGGED_RUNS"] = True
+            _append_repos(hosting_service, mock_repos[1:])
+
+            def get_persistence(cur, table_name):
+                cur.execute("select relpersistence from pg_class where relname = %s", (table_name,))
+                return cur.fetchone()[0]
+
+            def count_indexes(cur, table_name):
+                cur.execute("select count(*) from pg_indexes where tablename = %s", (table_name,))
+                return cur.fetchone()[0]
+
+            def get_primary_key(cur, table_name):
+                cur.execute(
+                    "select pg_get_constraintdef(oid) from pg_constraint where conrelid = %s::regclass and contype = 'p'",
+                    (table_name,),
+                )
+                return cur.fetchone()
+
+            with TableHelper._cursor() as cur:
+                assert TableHelper.count_table_rows(cur, run_tablename) == len(mock_repos) - 1
+                assert get_persistence(cur, run_tablename) == "u"
+                assert count_indexes(cur, run_tablename) == 0
+
+            repo_class.rotate(hosting_service)
+            assert repo_class.count_export_rows(hosting_service) == len(mock_repos)
+            assert repo_class.query.count() == 0
+            with TableHelper._cursor() as cur:
+                assert TableHelper.count_table_rows(cur, run_tablename) == 0
+                assert get_persistence(cur, finished_tablename) == "p"
+                assert count_indexes(cur, finished_tablename) == count_indexes(cur, repo_class.__tablename__)
+                assert count_indexes(cur, finished_tablename) > 0
+                # a primary key, not just a unique index like it
+                assert get_primary_key(cur, finished_tablename) == get_primary_key(cur, repo_class.__tablename__)
+                assert get_primary_key(cur, finished_tablename) is not None
+
+            # switching back picks up the repos left in the run table
+            _append_repos(hosting_service, mock_repos[:1])
+            test_app.config["REPOS_UNLOGGED_RUNS"] = False
+            repo_class.rotate(hosting_service)
+            assert repo_class.count_export_rows(hosting_service) == 1
+            with TableHelper._cursor() as cur:
+                assert not TableHelper.table_exists(cur, run_tablename)
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA],
+        indirect=True,
+    )
+    def test_run_table_is_cached(self, test_app, test_client, hosting_service, monkeypatch):
+        """
+        the run table is only looked up until its known to exist, and again after a rotation
+        """
+        with test_app.app_context():
+            test_app.config["REPOS_UNLOGGED_RUNS"] = True
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            lookups = []
+            table_exists = TableHelper.table_exists
+            monkeypatch.setattr(
+                TableHelper, "table_exists", lambda cur, table_name: lookups.append(table_name) or table_exists(
+                    cur, table_name
+                )
+            )
+
+            for _ in range(3):
+                _append_repos(hosting_service, mock_repos)
+            # created by the first, found by the second request
+            assert len(lookups) == 2
+
+            repo_class.rotate(hosting_service)
+            lookups.clear()
+            _append_repos(hosting_service, mock_repos)
+            _append_repos(hosting_service, mock_repos)
+            assert len(lookups) == 1
+            repo_class.rotate(hosting_service)
+            assert repo_class.count_export_rows(hosting_service) == len(mock_repos)
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    @pytest.mark.parametrize("is_unlogged", [True, False])
+    def test_rotate_deduplicates(self, test_app, test_client, hosting_service, is_unlogged):
+        """
+        repos added again (from a retried block) only end up once in the finished table, with their newest data
+        """
+        with test_app.app_context():
+            test_app.config["REPOS_UNLOGGED_RUNS"] = is_unlogged
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            finished_tablename = repo_class.get_finished_table_name(hosting_service)
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            _append_repos(hosting_service, mock_repos)
+            retried_repos = [dict(repo) for repo in mock_repos]
+            retried_repos[0]["name"] = "retried"
+            _append_repos(hosting_service, retried_repos)
+
+            repo_class.rotate(hosting_service)
+            assert repo_class.count_export_rows(hosting_service) == len(mock_repos)
+            with TableHelper._cursor() as cur:
+                assert TableHelper.count_table_rows(cur, finished_tablename, where="where name = 'retried'") == 1
@@ -5,7 +5,7 @@ from unittest import mock
 
 from hubgrep_indexer.models.export_meta import ExportMeta
 from hubgrep_indexer.models.repositories.abstract_repository import Repository
-from hubgrep_indexer.constants import HOST_TYPE_GITEA
+from hubgrep_indexer.constants import HOST_TYPE_GITEA, EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_FORMAT_PARQUET
 
 
 class TestExportMeta:
@@ -21,6 +21,20 @@ class TestExportMeta:
         )
 
         assert filename.startswith(f"{hosting_service.hoster_name}_raw_19700101_0000")
+        assert filename.endswith(".csv.gz")
+
+        filename = ExportMeta._get_default_export_filename(
+            hosting_service, timestamp, unified=True, codec=EXPORT_CODEC_ZSTD
+        )
+        assert filename == f"{hosting_service.hoster_name}_unified_19700101_0000.csv.zst"
+
+        filename = ExportMeta._get_default_export_filename(
+            hosting_service, timestamp, unified=True, codec=EXPORT_CODEC_ZSTD, export_format=EXPORT_FORMAT_PARQUET
+        )
+        assert filename == f"{hosting_service.hoster_name}_unified_19700101_0000.parquet"
+
+        filename = ExportMeta._get_default_export_filename(hosting_service, timestamp, unified=False, delta=True)
+        assert filename == f"{hosting_service.hoster_name}_raw_delta_19700101_0000.csv.gz"
 
     @pytest.mark.parametrize(
         "hosting_service",  # matched against hosting_service fixture in conftest.py
@@ -47,3 +61,18 @@ class TestExportMeta:
             assert export.file_path == "export"
             assert export.repo_count == 1
             assert export.is_raw is True
+            assert export.codec == EXPORT_CODEC_GZIP
+
+            export = ExportMeta.create_export(hosting_service, unified=True, codec=EXPORT_CODEC_ZSTD)
+            repo_class.export_unified_csv_gz.assert_called_once_with(
+                hosting_service, export.file_path, codec=EXPORT_CODEC_ZSTD
+            )
+            assert export.file_path.endswith(".csv.zst")
+            assert export.codec == EXPORT_CODEC_ZSTD
+
+            # parquet exports are unified only
+            with pytest.raises(ValueError):
+                ExportMeta.create_export(hosting_service, unified=False, export_format=EXPORT_FORMAT_PARQUET)
+            # delta exports are csv only
+            with pytest.raises(ValueError):
+                ExportMeta.create_export(hosting_service, unified=True, export_format=EXPORT_FORMAT_PARQUET, delta=True)
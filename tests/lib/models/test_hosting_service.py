@@ -1,8 +1,22 @@
+import csv
+import gzip
+import base64
+import datetime
 import pytest
+import pyarrow.parquet as pq
+import zstandard
+from pathlib import Path
 
+from hubgrep_indexer.api_blueprint.add_repos import _append_repos
+from hubgrep_indexer.models.export_meta import ExportMeta
 from hubgrep_indexer.models.hosting_service import HostingService
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from hubgrep_indexer.models.repositories.github import GithubRepository
 from hubgrep_indexer import db
-from hubgrep_indexer.constants import HOST_TYPE_GITEA
+from hubgrep_indexer.constants import HOST_TYPE_GITEA, HOST_TYPE_GITHUB, HOST_TYPE_GITLAB
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_FORMAT_CSV, EXPORT_FORMAT_PARQUET
+from tests.conftest import _add_hosting_service
+from tests.helpers import get_mock_repos
 
 
 class TestHostingService:
@@ -36,3 +50,236 @@ class TestHostingService:
                 api_url=hosting_service.api_url
             ).first()
             assert len(same_hosting_service.api_keys) == 0
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_export_repos(self, test_app, test_client, hosting_service):
+        """ raw and unified exports are made at once, and both registered """
+        with test_client:
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            _append_repos(hosting_service, mock_repos)
+            Repository.repo_class_for_type(hosting_service.type).rotate(hosting_service)
+
+            hosting_service.export_repos()
+            for unified in [False, True]:
+                exports = hosting_service.get_exports_dict(unified=unified)
+                assert len(exports) == 1
+                assert exports[0]["repo_count"] == len(mock_repos)
+            for export in ExportMeta.query.filter_by(hosting_service_id=hosting_service.id):
+                result_path = Path(test_app.config["RESULTS_PATH"]).joinpath(export.file_path)
+                with gzip.open(result_path, "rt") as f:
+                    # header + repos
+                    assert len(f.read().splitlines()) == len(mock_repos) + 1
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_export_repos_single_pass(self, test_app, test_client, hosting_service):
+        """ a single pass export has the same content as the raw and unified export made on their own """
+        with test_client:
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            _append_repos(hosting_service, mock_repos)
+            Repository.repo_class_for_type(hosting_service.type).rotate(hosting_service)
+
+            def read_exports() -> dict:
+                # (exports of the same minute have the same filename, read them before the next one)
+                contents = {}
+                for export in ExportMeta.query.filter_by(hosting_service_id=hosting_service.id):
+                    assert export.repo_count == len(mock_repos)
+                    result_path = Path(test_app.config["RESULTS_PATH"]).joinpath(export.file_path)
+                    with gzip.open(result_path, "rb") as f:
+                        contents[export.is_raw] = f.read()
+                    export.delete_file()
+                    db.session.delete(export)
+                db.session.commit()
+                return contents
+
+            hosting_service.export_repos()
+            separate_contents = read_exports()
+            test_app.config["EXPORT_SINGLE_PASS"] = True
+            try:
+                hosting_service.export_repos()
+            finally:
+                test_app.config["EXPORT_SINGLE_PASS"] = False
+            single_pass_contents = read_exports()
+
+            assert set(single_pass_contents) == {True, False}
+            assert single_pass_contents == separate_contents
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITHUB],
+        indirect=True,
+    )
+    @pytest.mark.parametrize("single_pass", [False, True])
+    def test_export_repos_zstd(self, test_app, test_client, hosting_service, single_pass):
+        """ the export codec shows in filenames and the exports dict """
+        with test_client:
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            _append_repos(hosting_service, mock_repos)
+            Repository.repo_class_for_type(hosting_service.type).rotate(hosting_service)
+
+            test_app.config["EXPORT_CODEC"] = EXPORT_CODEC_ZSTD
+            test_app.config["EXPORT_SINGLE_PASS"] = single_pass
+            try:
+                hosting_service.export_repos()
+            finally:
+                test_app.config["EXPORT_CODEC"] = EXPORT_CODEC_GZIP
+                test_app.config["EXPORT_SINGLE_PASS"] = False
+
+            for unified in [False, True]:
+                exports = hosting_service.get_exports_dict(unified=unified)
+                assert len(exports) == 1
+                assert exports[0]["codec"] == EXPORT_CODEC_ZSTD
+                assert exports[0]["url"].endswith(".csv.zst")
+            for export in ExportMeta.query.filter_by(hosting_service_id=hosting_service.id):
+                result_path = Path(test_app.config["RESULTS_PATH"]).joinpath(export.file_path)
+                with open(result_path, "rb") as f:
+                    csv = zstandard.ZstdDecompressor().stream_reader(f).read().decode()
+                # header + repos
+                assert len(csv.splitlines()) == len(mock_repos) + 1
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    @pytest.mark.parametrize("single_pass", [False, True])
+    def test_export_repos_parquet(self, test_app, test_client, hosting_service, single_pass):
+        """ the parquet export has the content of the unified csv export, typed """
+        with test_client:
+            mock_repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            _append_repos(hosting_service, mock_repos)
+            Repository.repo_class_for_type(hosting_service.type).rotate(hosting_service)
+
+            test_app.config["EXPORT_PARQUET"] = True
+            test_app.config["EXPORT_SINGLE_PASS"] = single_pass
+            try:
+                hosting_service.export_repos()
+            finally:
+                test_app.config["EXPORT_PARQUET"] = False
+                test_app.config["EXPORT_SINGLE_PASS"] = False
+
+            hoster_dict = test_client.get("/api/v1/hosters").json[0]
+            assert len(hoster_dict["exports_unified"]) == 1
+            assert hoster_dict["exports_unified"][0]["format"] == EXPORT_FORMAT_CSV
+            assert len(hoster_dict["exports_unified_parquet"]) == 1
+            assert hoster_dict["exports_unified_parquet"][0]["format"] == EXPORT_FORMAT_PARQUET
+            assert hoster_dict["exports_unified_parquet"][0]["url"].endswith(".parquet")
+
+            results_path = Path(test_app.config["RESULTS_PATH"])
+            csv_export, parquet_export = [
+                ExportMeta.query_exports(hosting_service.id, unified=True, export_format=export_format).one()
+                for export_format in [EXPORT_FORMAT_CSV, EXPORT_FORMAT_PARQUET]
+            ]
+            with gzip.open(results_path.joinpath(csv_export.file_path), "rt") as f:
+                csv_rows = list(csv.DictReader(f, delimiter=";"))
+            parquet_rows = pq.read_table(results_path.joinpath(parquet_export.file_path)).to_pylist()
+
+            assert parquet_export.repo_count == len(parquet_rows) == len(csv_rows) == len(mock_repos)
+            for csv_row, parquet_row in zip(csv_rows, parquet_rows):
+                assert list(parquet_row) == list(csv_row)
+                assert parquet_row["foreign_id"] == csv_row["foreign_id"]
+                assert parquet_row["stars_count"] == int(csv_row["stars_count"])
+                assert parquet_row["is_fork"] == (csv_row["is_fork"] == "t")
+                assert isinstance(parquet_row["created_at"], datetime.datetime)
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITHUB, HOST_TYPE_GITLAB],
+        indirect=True,
+    )
+    def test_export_repos_delta(self, test_app, test_client, hosting_service):
+        """ delta exports hold the repos added, changed and removed since the previous run """
+        with test_client:
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            repo, changed_repo = get_mock_repos(hosting_service_type=hosting_service.type)
+            removed_repo = _copy_mock_repo(hosting_service.type, repo, new_id=True)
+            added_repo = _copy_mock_repo(hosting_service.type, repo, new_id=True, new_id_suffix=2)
+            test_app.config["EXPORT_DELTAS"] = True
+            try:
+                _append_repos(hosting_service, [repo, changed_repo, removed_repo])
+                repo_class.rotate(hosting_service)
+                hosting_service.export_repos()
+                # nothing to compare the first run to
+                assert hosting_service.get_exports_dict(unified=True, delta=True) == []
+
+                _append_repos(hosting_service, [
+                    repo,
+                    _copy_mock_repo(hosting_service.type, changed_repo, new_timestamp=True),
+                    added_repo,
+                ])
+                repo_class.rotate(hosting_service)
+                hosting_service.export_repos()
+            finally:
+                test_app.config["EXPORT_DELTAS"] = False
+
+            hoster_dict = test_client.get("/api/v1/hosters").json[0]
+            for key in ["exports_raw_delta", "exports_unified_delta"]:
+                assert len(hoster_dict[key]) == 1
+                assert hoster_dict[key][0]["is_delta"] is True
+                assert hoster_dict[key][0]["repo_count"] == 3
+                assert "_delta_" in hoster_dict[key][0]["url"]
+            # the full exports of both runs
+            assert len(hoster_dict["exports_unified"]) == 2
+            assert hoster_dict["exports_unified"][0]["is_delta"] is False
+            # (the exports are loaded at once, and split up by kind)
+            assert hoster_dict["exports_raw"] == hosting_service.get_exports_dict(unified=False)
+            assert hoster_dict["exports_unified_delta"] == hosting_service.get_exports_dict(unified=True, delta=True)
+
+            delta_export = ExportMeta.query_exports(hosting_service.id, unified=True, delta=True).one()
+            with gzip.open(Path(test_app.config["RESULTS_PATH"]).joinpath(delta_export.file_path), "rt") as f:
+                delta_rows = list(csv.DictReader(f, delimiter=";"))
+            changes = {row["foreign_id"]: row["change"] for row in delta_rows}
+            assert changes == {
+                _foreign_id(hosting_service.type, added_repo): "added",
+                _foreign_id(hosting_service.type, changed_repo): "changed",
+                _foreign_id(hosting_service.type, removed_repo): "removed",
+            }
+            assert list(delta_rows[0]) == ["change"] + repo_class.get_unified_columns()
+
+    @pytest.mark.parametrize(
+        "hosting_service",  # matched against hosting_service fixture in conftest.py
+        [HOST_TYPE_GITHUB],
+        indirect=True,
+    )
+    def test_export_all(self, test_app, test_client, hosting_service):
+        """ hosting services with a finished run are exported, the others skipped """
+        with test_client:
+            _add_hosting_service(api_url="https://not_finished.com/", type=hosting_service.type)
+            _append_repos(hosting_service, get_mock_repos(hosting_service_type=hosting_service.type))
+            Repository.repo_class_for_type(hosting_service.type).rotate(hosting_service)
+
+            result = test_app.test_cli_runner().invoke(args=["cli", "export-all", "--workers", "2"])
+            assert result.exit_code == 0
+            assert "exported 1 of 2 hosting services" in result.output
+            assert len(hosting_service.get_exports_dict(unified=True)) == 1
+
+
+def _copy_mock_repo(hosting_service_type: str, repo: dict, new_id=False, new_id_suffix=1, new_timestamp=False) -> dict:
+    """ a copy of a mock repo, as another repo (<new_id>) or updated since (<new_timestamp>) """
+    repo = dict(repo)
+    if new_id:
+        if hosting_service_type == HOST_TYPE_GITHUB:
+            github_id = GithubRepository.github_id_from_base64(repo["id"]) + 1000 * new_id_suffix
+            repo["id"] = base64.b64encode(f"010:Repository{github_id}".encode()).decode()
+        else:
+            repo["id"] = repo["id"] + 1000 * new_id_suffix
+    if new_timestamp:
+        if hosting_service_type == HOST_TYPE_GITHUB:
+            repo["updatedAt"] = "2021-01-01T00:00:00Z"
+        else:
+            repo["last_activity_at"] = "2021-01-01T00:00:00.000Z"
+    return repo
+
+
+def _foreign_id(hosting_service_type: str, repo: dict) -> str:
+    """ the foreign id of a mock repo, as exported """
+    if hosting_service_type == HOST_TYPE_GITHUB:
+        return str(GithubRepository.github_id_from_base64(repo["id"]))
+    return str(repo["id"])
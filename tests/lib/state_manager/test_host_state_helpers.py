@@ -44,7 +44,7 @@ class TestHostStateHelpers:
             has_reached_end = state_helper.has_reached_end(
                 hosting_service=hosting_service,
                 block=new_block,
-                parsed_repos=repos,
+                repo_count=len(repos),
             )
             if hosting_service.type == HOST_TYPE_GITHUB:
                 # github should not assume end on single empty results
@@ -81,7 +81,7 @@ class TestHostStateHelpers:
             has_reached_end = state_helper.has_reached_end(
                 hosting_service=hosting_service,
                 block=new_block,
-                parsed_repos=repos,
+                repo_count=len(repos),
             )
             if hosting_service.type == HOST_TYPE_GITHUB:
                 # github should not assume end on single empty results
@@ -126,6 +126,9 @@ class TestHostStateHelpers:
                 if not block.uid == old_block.uid and not block.uid == new_block.uid:
                     assert False
 
+            assert state_helper.has_active_blocks(hosting_service=hosting_service, run_created_ts=run_created_ts)
+            assert not state_helper.has_active_blocks(hosting_service=hosting_service, run_created_ts=-1)
+
     @pytest.mark.parametrize(
         'hosting_service',
         HOSTER_TYPES,
@@ -141,7 +144,7 @@ class TestHostStateHelpers:
             state_helper.resolve_state(
                 hosting_service=hosting_service,
                 block_uid=old_block.uid,
-                parsed_repos=repos,
+                repo_count=len(repos),
             )
 
             new_block = state_manager.get_next_block(
@@ -191,7 +194,7 @@ class TestHostStateHelpers:
             state_helper.resolve_state(
                 hosting_service=hosting_service,
                 block_uid=new_block.uid,
-                parsed_repos=repos,
+                repo_count=len(repos),
             )
 
             blocks = state_manager.get_blocks_list(hoster_prefix=hosting_service.id)
@@ -219,7 +222,7 @@ class TestHostStateHelpers:
                 state_helper.resolve_state(
                     hosting_service=hosting_service,
                     block_uid=_block_uid,
-                    parsed_repos=_repos,
+                    repo_count=len(_repos),
                 )
 
             runs = 10
@@ -272,3 +275,87 @@ class TestHostStateHelpers:
 
             assert last_block.from_id == id_start + 1
             assert last_block.to_id == id_start * 2
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_state_helpers_adapt_batch_size(self, test_app, test_client, hosting_service):
+        with test_client:
+            test_app.config["BLOCK_SIZE_ADAPTIVE"] = True
+            test_app.config["BLOCK_TARGET_DURATION"] = 20
+            state_helper = get_state_helper(hosting_service=hosting_service)
+            block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            started = block.attempts_at[-1]
+
+            def adapt(repo_count, duration):
+                return state_helper.adapt_batch_size(
+                    hosting_service=hosting_service,
+                    block=block,
+                    repo_count=repo_count,
+                    timestamp_now=started + duration,
+                )
+
+            # on target - stays as is
+            assert adapt(repo_count=500, duration=20) == state_manager.batch_size
+            # fast, but dense - capped by BLOCK_TARGET_REPOS, instead of growing
+            assert adapt(repo_count=1000, duration=1) == state_manager.batch_size
+            test_app.config["BLOCK_TARGET_REPOS"] = 500
+            assert adapt(repo_count=1000, duration=1) == 750
+            test_app.config["BLOCK_TARGET_REPOS"] = 1000
+            state_manager.set_batch_size(hoster_prefix=hosting_service.id, batch_size=state_manager.batch_size)
+            # twice as slow - averaged with the current size, to converge without overshooting
+            assert adapt(repo_count=500, duration=40) == 750
+            assert state_manager.get_batch_size(hoster_prefix=hosting_service.id) == 750
+            # (much) faster than the target, or empty - grows by the max step at most
+            assert adapt(repo_count=1, duration=1) == round((750 + 2000) / 2)
+            assert adapt(repo_count=0, duration=1) == round((1375 + 2000) / 2)
+
+            # bounded
+            test_app.config["BLOCK_SIZE_MAX"] = 1500
+            assert adapt(repo_count=0, duration=1) == 1500
+            test_app.config["BLOCK_SIZE_MIN"] = 1000
+            assert adapt(repo_count=1000, duration=1000) == 1000
+
+            # blocks of cached ids are ignored, as is everything when disabled
+            block.ids = [1, 2, 3]
+            assert adapt(repo_count=0, duration=1) == 1000
+            block.ids = None
+            test_app.config["BLOCK_SIZE_ADAPTIVE"] = False
+            assert adapt(repo_count=0, duration=1) == 1000
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_state_helpers_resolve_state_adapted_batch_size(self, test_app, test_client, hosting_service):
+        with test_client:
+            test_app.config["BLOCK_SIZE_ADAPTIVE"] = True
+            state_helper = get_state_helper(hosting_service=hosting_service)
+            first_block, second_block = state_manager.get_next_blocks({hosting_service.id: 2})[hosting_service.id]
+
+            # returned quickly with results - blocks get bigger
+            state_helper.resolve_state(hosting_service=hosting_service, block_uid=first_block.uid, repo_count=10)
+            batch_size = state_manager.get_batch_size(hoster_prefix=hosting_service.id)
+            assert batch_size > state_manager.batch_size
+            third_block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            assert third_block.from_id == second_block.to_id + 1
+            assert third_block.to_id == second_block.to_id + batch_size
+
+            # out of order - confirming the third block, the second doesnt move the confirmed ids back
+            state_helper.resolve_state(hosting_service=hosting_service, block_uid=third_block.uid, repo_count=10)
+            state_helper.resolve_state(hosting_service=hosting_service, block_uid=second_block.uid, repo_count=10)
+            assert state_manager.get_highest_confirmed_block_repo_id(hoster_prefix=hosting_service.id) == \
+                third_block.to_id
+
+            # the (differently sized) block right after the confirmed ones comes back empty
+            last_block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            assert last_block.to_id - last_block.from_id != third_block.to_id - third_block.from_id
+            has_reached_end = state_helper.has_reached_end(
+                hosting_service=hosting_service,
+                block=last_block,
+                repo_count=0,
+            )
+            assert has_reached_end is (hosting_service.type != HOST_TYPE_GITHUB)
@@ -1,6 +1,7 @@
 import pytest
 import time
 from multiprocessing import Process
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import current_app
 from hubgrep_indexer import state_manager
@@ -33,6 +34,77 @@ class TestRedisStateManager:
             # second block should start at end of first block+1
             block = state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
             assert block.from_id == state_manager.batch_size + 1
+            assert block.run_created_ts == state_manager.get_run_created_ts(HOSTER_PREFIX)
+            assert state_manager.get_block(HOSTER_PREFIX, block.uid).to_dict() == block.to_dict()
+
+    def test_get_next_block_concurrently(self, test_client):
+        app = current_app._get_current_object()
+
+        def _get_block_ranges(_):
+            with app.app_context():
+                return [
+                    (block.from_id, block.to_id)
+                    for block in (state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX) for _ in range(25))
+                ]
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ranges = [r for block_ranges in pool.map(_get_block_ranges, range(8)) for r in block_ranges]
+
+        # no range is handed out twice, and there are no gaps
+        assert len(set(ranges)) == 200
+        assert sorted(ranges)[-1][1] == 200 * state_manager.batch_size
+        assert state_manager.get_highest_block_repo_id(HOSTER_PREFIX) == 200 * state_manager.batch_size
+        assert len(state_manager.get_blocks_list(HOSTER_PREFIX)) == 200
+
+    def test_get_next_blocks(self, test_client):
+        with test_client:
+            other_prefix = "hoster_2"
+            state_manager.get_next_block(hoster_prefix=other_prefix)
+            hoster_blocks = state_manager.get_next_blocks({HOSTER_PREFIX: 3, other_prefix: 2})
+            assert [block.from_id for block in hoster_blocks[HOSTER_PREFIX]] == [
+                1, state_manager.batch_size + 1, state_manager.batch_size * 2 + 1
+            ]
+            assert [block.to_id for block in hoster_blocks[other_prefix]] == [
+                state_manager.batch_size * 2, state_manager.batch_size * 3
+            ]
+            assert state_manager.count_blocks(HOSTER_PREFIX) == 3
+            assert state_manager.count_blocks(other_prefix) == 3
+            assert state_manager.get_highest_block_repo_id(HOSTER_PREFIX) == state_manager.batch_size * 3
+            assert state_manager.get_next_blocks({}) == {}
+
+    def test_batch_size(self, test_client):
+        with test_client:
+            assert state_manager.get_batch_size(HOSTER_PREFIX) == state_manager.batch_size
+            state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
+
+            state_manager.set_batch_size(HOSTER_PREFIX, 250)
+            hoster_blocks = state_manager.get_next_blocks({HOSTER_PREFIX: 2})
+            assert [(block.from_id, block.to_id) for block in hoster_blocks[HOSTER_PREFIX]] == [
+                (state_manager.batch_size + 1, state_manager.batch_size + 250),
+                (state_manager.batch_size + 251, state_manager.batch_size + 500),
+            ]
+            assert state_manager.get_state_dict(HOSTER_PREFIX)["batch_size"] == 250
+
+            # the block size belongs to the hoster, not the run
+            state_manager.reset(HOSTER_PREFIX)
+            assert state_manager.get_batch_size(HOSTER_PREFIX) == 250
+            assert state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX).to_id == 250
+
+    def test_get_next_block_starts_new_run(self, test_client):
+        with test_client:
+            old_block = state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
+            state_manager.set_highest_confirmed_block_repo_id(HOSTER_PREFIX, 100)
+            state_manager.set_empty_results_counter(HOSTER_PREFIX, 3)
+            state_manager.set_has_run_hit_end(HOSTER_PREFIX, True)
+
+            block = state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
+            assert block.from_id == 1
+            assert not state_manager.get_has_run_hit_end(HOSTER_PREFIX)
+            # the same fields as a manual reset
+            assert state_manager.get_highest_confirmed_block_repo_id(HOSTER_PREFIX) == 0
+            assert state_manager.get_empty_results_counter(HOSTER_PREFIX) == 0
+            assert list(state_manager.get_blocks_dict(HOSTER_PREFIX).keys()) == [block.uid]
+            assert block.run_created_ts >= old_block.run_created_ts
 
     def test_get_timed_out_block(self, test_client):
         with test_client:
@@ -44,15 +116,103 @@ class TestRedisStateManager:
 
             assert block.uid == timed_out_block.uid
 
+    def test_get_timed_out_block_oldest_first(self, test_client):
+        with test_client:
+            blocks = [state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX) for _ in range(3)]
+            for i, block in enumerate(reversed(blocks)):
+                block.attempts_at.append(100.0 + i)
+                state_manager.update_block(hoster_prefix=HOSTER_PREFIX, block=block)
+            state_manager.finish_block(hoster_prefix=HOSTER_PREFIX, block_uid=blocks[-1].uid)
+
+            timestamp_now = 100.0 + state_manager.block_timeout + 1.5
+            timed_out_block = state_manager.get_timed_out_block(HOSTER_PREFIX, timestamp_now=timestamp_now)
+            assert timed_out_block.uid == blocks[1].uid
+            assert timed_out_block.attempts_at[-1] == timestamp_now
+            # block 1 was just re-attempted, block 0 isnt old enough yet
+            assert state_manager.get_timed_out_block(HOSTER_PREFIX, timestamp_now=timestamp_now) is None
+
+            block_attempts_key = state_manager._get_redis_key(HOSTER_PREFIX, state_manager.block_attempts_key)
+            assert state_manager.redis.zcard(block_attempts_key) == 2
+            state_manager.reset(HOSTER_PREFIX)
+            assert state_manager.redis.zcard(block_attempts_key) == 0
+
+    def test_get_timed_out_block_concurrently(self, test_client):
+        app = current_app._get_current_object()
+        with test_client:
+            blocks = [state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX) for _ in range(20)]
+        timestamp_now = blocks[-1].attempts_at[0] + state_manager.block_timeout + 1
+
+        def _claim_blocks(_):
+            with app.app_context():
+                claimed = []
+                while True:
+                    block = state_manager.get_timed_out_block(HOSTER_PREFIX, timestamp_now=timestamp_now)
+                    if not block:
+                        return claimed
+                    claimed.append(block)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            claimed = [block for blocks in pool.map(_claim_blocks, range(8)) for block in blocks]
+
+        # every block is re-attempted exactly once
+        assert sorted(block.uid for block in claimed) == sorted(block.uid for block in blocks)
+        for block in state_manager.get_blocks_list(HOSTER_PREFIX):
+            assert block.attempts_at[1:] == [timestamp_now]
+
+    def test_get_timed_out_blocks(self, test_client):
+        with test_client:
+            blocks = [state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX) for _ in range(5)]
+            timestamp_now = blocks[-1].attempts_at[0] + state_manager.block_timeout + 1
+            timed_out_blocks = state_manager.get_timed_out_blocks(HOSTER_PREFIX, count=3, timestamp_now=timestamp_now)
+            assert [block.uid for block in timed_out_blocks] == [block.uid for block in blocks[:3]]
+            timed_out_blocks = state_manager.get_timed_out_blocks(HOSTER_PREFIX, count=3, timestamp_now=timestamp_now)
+            assert [block.uid for block in timed_out_blocks] == [block.uid for block in blocks[3:]]
+
+            # blocks we just claimed arent claimed twice, even if they are timed out again right away
+            state_manager.block_timeout = -1
+            try:
+                timed_out_blocks = state_manager.get_timed_out_blocks(
+                    HOSTER_PREFIX, count=10, timestamp_now=timestamp_now + 1
+                )
+            finally:
+                state_manager.block_timeout = 60
+            assert sorted(block.uid for block in timed_out_blocks) == sorted(block.uid for block in blocks)
+
+    def test_get_timed_out_json_block(self, test_client):
+        with test_client:
+            block = state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
+            state_manager.redis.hset(
+                state_manager._get_redis_key(HOSTER_PREFIX, state_manager.block_map_key), block.uid, block.to_json()
+            )
+            timestamp_now = block.attempts_at[0] + state_manager.block_timeout + 1
+            timed_out_block = state_manager.get_timed_out_block(HOSTER_PREFIX, timestamp_now=timestamp_now)
+            assert timed_out_block.attempts_at == [block.attempts_at[0], timestamp_now]
+            assert state_manager.get_block(HOSTER_PREFIX, block.uid).attempts_at == timed_out_block.attempts_at
+
     def test_get_and_update_block(self, test_client):
         with test_client:
             old_block = state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
-            old_block.attempts_at.append("im an int timestamp, really!")
+            old_block.attempts_at.append(1234.5)
             state_manager.update_block(hoster_prefix=HOSTER_PREFIX, block=old_block)
             block = state_manager.get_block(hoster_prefix=HOSTER_PREFIX, block_uid=old_block.uid)
 
             assert block.attempts_at[-1] == old_block.attempts_at[-1]
 
+    def test_block_lookups(self, test_client):
+        with test_client:
+            blocks = [state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX) for _ in range(3)]
+            assert state_manager.count_blocks(HOSTER_PREFIX) == 3
+            assert state_manager.has_block(HOSTER_PREFIX, blocks[1].uid)
+            assert state_manager.get_block(HOSTER_PREFIX, blocks[1].uid).from_id == blocks[1].from_id
+            assert sorted(block.uid for block in state_manager.iter_blocks(HOSTER_PREFIX)) == sorted(
+                block.uid for block in blocks
+            )
+
+            state_manager.finish_block(HOSTER_PREFIX, blocks[1].uid)
+            assert state_manager.count_blocks(HOSTER_PREFIX) == 2
+            assert not state_manager.has_block(HOSTER_PREFIX, blocks[1].uid)
+            assert state_manager.get_block(HOSTER_PREFIX, blocks[1].uid) is None
+
     def test_delete_block(self, test_client):
         with test_client:
             block = state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
@@ -236,3 +396,75 @@ class TestRedisStateManager:
         retrieved_api_key_2 = state_manager.get_machine_api_key(hosting_service_id=hosting_service.id,
                                                                      machine_id=machine_id)
         assert retrieved_api_key_2 is None
+
+    def test_get_state_dicts(self):
+        other_prefix = "hoster_2"
+        state_manager.set_highest_block_repo_id(HOSTER_PREFIX, 100)
+        state_manager.set_highest_confirmed_block_repo_id(HOSTER_PREFIX, 40)
+        state_manager.set_empty_results_counter(HOSTER_PREFIX, 3)
+        state_manager.set_run_created_ts(HOSTER_PREFIX, 11.5)
+        state_manager.set_has_run_hit_end(HOSTER_PREFIX, True)
+
+        state_dicts = state_manager.get_state_dicts([HOSTER_PREFIX, other_prefix])
+        assert state_dicts[HOSTER_PREFIX] == dict(
+            highest_block_repo_id=100,
+            highest_confirmed_repo_id=40,
+            empty_results_count=3,
+            run_created_ts=11.5,
+            run_is_finished=True,
+            batch_size=state_manager.batch_size,
+        )
+        # an untouched hoster gets the defaults
+        assert state_dicts[other_prefix] == dict(
+            highest_block_repo_id=0,
+            highest_confirmed_repo_id=0,
+            empty_results_count=0,
+            run_created_ts=0,
+            run_is_finished=False,
+            batch_size=state_manager.batch_size,
+        )
+        assert state_manager.get_state_dict(HOSTER_PREFIX) == state_dicts[HOSTER_PREFIX]
+        assert state_manager.get_state_dicts([]) == {}
+
+    def test_state_is_one_hash(self):
+        state_manager.reset(HOSTER_PREFIX)
+        state_manager.increment_empty_results_counter(HOSTER_PREFIX, amount=2)
+        state_manager.increment_empty_results_counter(HOSTER_PREFIX)
+        assert state_manager.get_empty_results_counter(HOSTER_PREFIX) == 3
+
+        state_key = state_manager._get_state_key(HOSTER_PREFIX)
+        assert state_manager.redis.type(state_key) == b"hash"
+        assert state_manager.redis.hlen(state_key) == 5
+
+    def test_migrate_legacy_state(self):
+        other_prefix = "hoster_2"
+        redis = state_manager.redis
+        redis.set(f"{HOSTER_PREFIX}:highest_block_repo_id", 100)
+        redis.set(f"{HOSTER_PREFIX}:highest_confirmed_block_repo_id", 40)
+        redis.set(f"{HOSTER_PREFIX}:run_created_ts", 11.5)
+        redis.set(f"{HOSTER_PREFIX}:run_is_finished", 1)
+
+        assert state_manager.migrate_legacy_state(HOSTER_PREFIX)
+        assert not state_manager.migrate_legacy_state(other_prefix)
+        assert state_manager.get_state_dict(HOSTER_PREFIX) == dict(
+            highest_block_repo_id=100,
+            highest_confirmed_repo_id=40,
+            empty_results_count=0,
+            run_created_ts=11.5,
+            run_is_finished=True,
+            batch_size=state_manager.batch_size,
+        )
+        assert not redis.exists(f"{HOSTER_PREFIX}:highest_block_repo_id")
+        assert not redis.exists(f"{HOSTER_PREFIX}:run_created_ts")
+        # running it again is a no-op
+        assert not state_manager.migrate_legacy_state(HOSTER_PREFIX)
+
+    def test_migrate_legacy_block_attempts(self, test_client):
+        with test_client:
+            block = state_manager.get_next_block(hoster_prefix=HOSTER_PREFIX)
+            block_attempts_key = state_manager._get_redis_key(HOSTER_PREFIX, state_manager.block_attempts_key)
+            state_manager.redis.delete(block_attempts_key)
+            assert state_manager.get_timed_out_block(HOSTER_PREFIX, timestamp_now=time.time() + 1000) is None
+
+            assert state_manager.migrate_legacy_state(HOSTER_PREFIX)
+            assert state_manager.get_timed_out_block(HOSTER_PREFIX, timestamp_now=time.time() + 1000).uid == block.uid
@@ -0,0 +1,51 @@
+import json
+import struct
+
+from hubgrep_indexer import state_manager
+from hubgrep_indexer.lib.block import Block, _get_lua_struct_format
+
+
+class TestBlock:
+    def test_bytes_roundtrip(self, test_client):
+        with test_client:
+            block = Block.new(from_id=1001, to_id=2000, run_created_ts=1626000000.123456)
+            block.attempts_at.append(1626000060.5)
+            block_copy = Block.from_bytes(block.to_bytes())
+            assert block_copy.to_dict() == block.to_dict()
+
+            # ids are stored as deltas, in any order
+            block.ids = [5, 7, 7, 300000, 12, 2 ** 40, 0]
+            block.run_created_ts = None
+            block_copy = Block.from_bytes(block.to_bytes())
+            assert block_copy.ids == block.ids
+            assert block_copy.run_created_ts is None
+
+            block.ids = []
+            assert Block.from_bytes(block.to_bytes()).ids == []
+
+    def test_from_bytes_reads_json(self, test_client):
+        with test_client:
+            block = Block.new(from_id=1, to_id=1000, run_created_ts=1626000000.0, ids=[1, 2, 3])
+            block_copy = Block.from_bytes(json.dumps(block.to_dict()).encode("utf-8"))
+            assert block_copy.to_dict() == block.to_dict()
+
+    def test_bytes_are_compact(self, test_client):
+        with test_client:
+            block = Block.new(from_id=1, to_id=1000, run_created_ts=1626000000.0, ids=list(range(1, 1001)))
+            assert len(block.to_bytes()) < len(block.to_json()) / 2
+
+    def test_lua_struct_format(self):
+        assert _get_lua_struct_format(struct.Struct("<B16sdqqH")) == "<Bc16di8i8H"
+        assert _get_lua_struct_format(struct.Struct("<icq")) == "<i4c1i8"
+        assert _get_lua_struct_format(struct.Struct("<2d")) == "<dd"
+
+    def test_bytes_match_lua_encoding(self, test_client):
+        """
+        blocks written by the hand-out script decode like the ones encoded in python
+        """
+        with test_client:
+            block = state_manager.get_next_block(hoster_prefix="hoster_1")
+            block_data = state_manager.redis.hget(
+                state_manager._get_redis_key("hoster_1", state_manager.block_map_key), block.uid
+            )
+            assert block_data == block.to_bytes()
@@ -50,9 +50,7 @@ class TestBlockHelpers:
     def test_get_loadbalanced_block(self, test_client, hoster_type):
         """
         register two hosting_services, test load balancing
-
-        see comment in get_loadbalanced_block: the behavior is a bit odd,
-        so the test has to be adjusted
+        (the hoster with the older run comes first)
         """
         with test_client:
             # we create two hosters, and explicitly set one to a very low 
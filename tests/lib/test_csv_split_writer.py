@@ -0,0 +1,26 @@
+import io
+
+from hubgrep_indexer.lib.csv_split_writer import split_csv_record, CsvSplitWriter, CsvSplitOutput
+
+
+class TestCsvSplitWriter:
+    def test_split_csv_record(self):
+        assert split_csv_record(b"1;abc;;t\n") == [b"1", b"abc", b"", b"t"]
+        # quoted fields keep their quotes, "" (empty string) stays apart from null
+        assert split_csv_record(b'1;"a;b";"";"say ""hi""\nthere"\n') == [
+            b"1",
+            b'"a;b"',
+            b'""',
+            b'"say ""hi""\nthere"',
+        ]
+
+    def test_write(self):
+        raw, unified = io.BytesIO(), io.BytesIO()
+        writer = CsvSplitWriter([
+            CsvSplitOutput(raw, field_indexes=[0, 1, 2]),
+            CsvSplitOutput(unified, field_indexes=[3, 1], header=["constant", "b"]),
+        ])
+        for record in [b"a;b;c;constant\n", b'1;"x;y";;const\n', b'2;"multi\nline";"";const\n']:
+            writer.write(record)
+        assert raw.getvalue() == b'a;b;c\n1;"x;y";\n2;"multi\nline";""\n'
+        assert unified.getvalue() == b'constant;b\nconst;"x;y"\nconst;"multi\nline"\n'
@@ -0,0 +1,30 @@
+import gzip
+
+import pytest
+import zstandard
+
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_CODEC_NONE
+from hubgrep_indexer.lib.export_codecs import get_file_extension, open_export_file
+
+_DECOMPRESS = {
+    EXPORT_CODEC_GZIP: gzip.decompress,
+    EXPORT_CODEC_ZSTD: lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+    EXPORT_CODEC_NONE: lambda data: data,
+}
+
+
+class TestExportCodecs:
+    @pytest.mark.parametrize("codec", [EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_CODEC_NONE])
+    @pytest.mark.parametrize("level, threads", [(None, 0), (1, 2)])
+    def test_open_export_file(self, tmp_path, codec, level, threads):
+        path = tmp_path.joinpath(f"export.csv{get_file_extension(codec)}")
+        content = b"".join(f"{i};repo {i}\n".encode() for i in range(10000))
+        with open_export_file(str(path), codec, level=level, threads=threads) as f:
+            f.write(content)
+        assert _DECOMPRESS[codec](path.read_bytes()) == content
+
+    def test_unknown_codec(self, tmp_path):
+        with pytest.raises(ValueError):
+            get_file_extension("rar")
+        with pytest.raises(ValueError):
+            open_export_file(str(tmp_path.joinpath("export.csv.rar")), "rar")
@@ -0,0 +1,71 @@
+import pytest
+
+from hubgrep_indexer import db, state_manager
+from hubgrep_indexer.lib.hoster_registry import hoster_registry
+from hubgrep_indexer.models.hosting_service import HostingService
+from tests.conftest import _add_hosting_service
+from tests.helpers import HOSTER_TYPES
+
+
+class TestHosterRegistry:
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_get_is_cached(self, test_client, hosting_service):
+        with test_client:
+            assert hoster_registry.get(hosting_service.id).api_keys == ["secret"]
+
+            # changes which dont go through the session arent seen...
+            db.session.execute(
+                HostingService.__table__.update().values(api_keys=["changed"])
+            )
+            assert hoster_registry.get(str(hosting_service.id)).api_keys == ["secret"]
+
+            # ...until the version is bumped
+            version = state_manager.get_hosters_version()
+            state_manager.bump_hosters_version()
+            assert hoster_registry.get(hosting_service.id).api_keys == ["changed"]
+            assert state_manager.get_hosters_version() == version + 1
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_commits_bump_version(self, test_client, hosting_service):
+        with test_client:
+            assert hoster_registry.filter_by_type(hosting_service.type) == [hoster_registry.get(hosting_service.id)]
+            version = state_manager.get_hosters_version()
+
+            hosting_service.add_api_key("other_secret")
+            db.session.add(hosting_service)
+            db.session.commit()
+            assert state_manager.get_hosters_version() == version + 1
+            assert hoster_registry.get(hosting_service.id).api_keys == ["secret", "other_secret"]
+
+            other_hosting_service = _add_hosting_service("https://other.com/", type=hosting_service.type)
+            assert [h.id for h in hoster_registry.filter_by_type(hosting_service.type)] == [
+                hosting_service.id,
+                other_hosting_service.id,
+            ]
+            assert hoster_registry.get(-1) is None
+
+    def test_get_unknown(self, test_client, monkeypatch):
+        with test_client:
+            loads = []
+            load = hoster_registry._load
+            monkeypatch.setattr(hoster_registry, "_load", lambda version: loads.append(version) or load(version))
+
+            assert hoster_registry.get("abc") is None
+            assert hoster_registry.get(None) is None
+            # the first lookup loads the hosters, misses right after dont reload them
+            for _ in range(3):
+                assert hoster_registry.get(12345) is None
+            assert len(loads) == 1
+
+            # ...until the interval passed
+            monkeypatch.setattr(hoster_registry, "miss_reload_interval", 0)
+            assert hoster_registry.get(12345) is None
+            assert len(loads) == 2
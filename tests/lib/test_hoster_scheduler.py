@@ -0,0 +1,87 @@
+import time
+import pytest
+
+from hubgrep_indexer import state_manager
+from hubgrep_indexer.lib.hoster_scheduler import hoster_scheduler
+from hubgrep_indexer.lib.state_manager.host_state_helpers import get_state_helper
+from tests.conftest import _add_hosting_service
+from tests.helpers import HOSTER_TYPES
+
+
+def _add_hosting_services(hoster_type: str, count: int):
+    return [
+        _add_hosting_service(api_url=f"https://test_{hoster_type}_{i}.com/", type=hoster_type, api_key=f"secret_{i}")
+        for i in range(count)
+    ]
+
+
+class TestHosterScheduler:
+    @pytest.mark.parametrize("hoster_type", HOSTER_TYPES)
+    def test_pick_oldest_run_first(self, test_client, hoster_type):
+        with test_client:
+            old, recent, finished = _add_hosting_services(hoster_type, 3)
+            state_manager.set_run_created_ts(old.id, 1000)
+            state_manager.set_run_created_ts(recent.id, time.time())
+            state_manager.set_run_created_ts(finished.id, time.time())
+            state_manager.set_has_run_hit_end(finished.id, True)
+
+            assert hoster_scheduler.pick(hoster_type) == [old.id]
+            assert hoster_scheduler.pick(hoster_type, hoster_count=5) == [old.id, recent.id]
+            assert state_manager.get_schedule_version(hoster_type) == state_manager.get_hosters_version()
+
+    @pytest.mark.parametrize("hoster_type", HOSTER_TYPES)
+    def test_pick_takes_turns(self, test_client, hoster_type):
+        with test_client:
+            hosting_services = _add_hosting_services(hoster_type, 3)
+            # a fresh state - every hoster is equally old
+            picked = [hoster_scheduler.pick(hoster_type)[0] for _ in range(9)]
+            for hosting_service in hosting_services:
+                assert picked.count(hosting_service.id) == 3
+
+            # picking several hosters at once charges each for its share of the blocks
+            assert len(set(hoster_scheduler.pick(hoster_type, hoster_count=3, block_count=4))) == 3
+            picked = [hoster_scheduler.pick(hoster_type)[0] for _ in range(2)]
+            assert len(set(picked)) == 2
+
+    @pytest.mark.parametrize("hoster_type", HOSTER_TYPES)
+    def test_finished_run_waits(self, test_app, test_client, hoster_type):
+        with test_client:
+            hosting_service, other_hosting_service = _add_hosting_services(hoster_type, 2)
+            state_manager.set_run_created_ts(other_hosting_service.id, time.time())
+            assert hoster_scheduler.pick(hoster_type) == [hosting_service.id]
+
+            hoster_scheduler.finish_run(hosting_service, run_created_ts=time.time())
+            assert hoster_scheduler.pick(hoster_type, hoster_count=2) == [other_hosting_service.id]
+
+            # ...until the run is old enough
+            test_app.config["OLD_RUN_AGE"] = -10
+            assert sorted(hoster_scheduler.pick(hoster_type, hoster_count=2)) == sorted([
+                other_hosting_service.id, hosting_service.id
+            ])
+
+    @pytest.mark.parametrize("hoster_type", HOSTER_TYPES)
+    def test_empty_blocks_fall_behind(self, test_client, hoster_type):
+        with test_client:
+            empty_hosting_service, hosting_service = _add_hosting_services(hoster_type, 2)
+            state_helper = get_state_helper(hosting_service=empty_hosting_service)
+            hoster_scheduler.pick(hoster_type)
+            block = state_manager.get_next_block(hoster_prefix=empty_hosting_service.id)
+            # (not the end of a paginated hoster)
+            state_manager.set_highest_confirmed_block_repo_id(empty_hosting_service.id, block.to_id + 1)
+            state_helper.resolve_state(hosting_service=empty_hosting_service, block_uid=block.uid, repo_count=0)
+
+            picked = [hoster_scheduler.pick(hoster_type)[0] for _ in range(4)]
+            assert picked.count(hosting_service.id) == 3
+
+    @pytest.mark.parametrize("hoster_type", HOSTER_TYPES)
+    def test_rebuilt_on_hoster_changes(self, test_client, hoster_type):
+        with test_client:
+            hosting_service, = _add_hosting_services(hoster_type, 1)
+            state_manager.set_run_created_ts(hosting_service.id, time.time())
+            assert hoster_scheduler.pick(hoster_type) == [hosting_service.id]
+            assert state_manager.pick_scheduled_hosters(hoster_type, 0, 1, 1, 1) == [hosting_service.id]
+
+            new_hosting_service = _add_hosting_service(api_url="https://new.com/", type=hoster_type)
+            assert state_manager.pick_scheduled_hosters(hoster_type, 0, 1, 1, 1) is None
+            assert hoster_scheduler.pick(hoster_type) == [new_hosting_service.id]
+            assert hoster_scheduler.pick("unknown") == []
@@ -0,0 +1,187 @@
+import io
+import os
+import json
+import time
+import shutil
+import tempfile
+import pytest
+
+from hubgrep_indexer import state_manager
+from hubgrep_indexer.cli_blueprint.ingest import _drain_spool
+from hubgrep_indexer.lib.ingest_spool import IngestSpool
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
+from tests.helpers import get_mock_repos, HOSTER_TYPES
+
+
+@pytest.fixture(scope="function")
+def spool(test_app):
+    spool_path = tempfile.mkdtemp()
+    test_app.config["INGEST_SPOOL_PATH"] = spool_path
+    yield IngestSpool(spool_path)
+    shutil.rmtree(spool_path)
+
+
+class TestIngestSpool:
+    def test_enqueue_and_claim(self, spool):
+        payload = json.dumps([{"some": "repo"}]).encode()
+        entry = spool.enqueue(hosting_service_id=1, block_uid="abc", stream=io.BytesIO(payload))
+        spool.enqueue(hosting_service_id=2, block_uid=None, stream=io.BytesIO(payload))
+        assert spool.queued_count() == 2
+        with entry.open() as f:
+            assert f.read() == payload
+
+        entries = spool.claim(max_entries=10)
+        assert spool.queued_count() == 0
+        assert {(e.hosting_service_id, e.block_uid) for e in entries} == {(1, "abc"), (2, None)}
+        # nothing left to claim
+        assert spool.claim(max_entries=10) == []
+
+        spool.release(entries[0])
+        assert spool.queued_count() == 1
+        spool.finish(entries[1])
+        spool.fail(spool.claim(max_entries=1)[0])
+        assert spool.queued_count() == 0
+        assert len(os.listdir(spool.failed_path)) == 1
+
+    def test_enqueue_invalid(self, spool):
+        with pytest.raises(ValueError):
+            spool.enqueue(hosting_service_id=1, block_uid=None, stream=io.BytesIO(b'[{"broken": '))
+        assert spool.queued_count() == 0
+        assert not list(spool.path.glob("*.tmp"))
+
+    def test_release_stale(self, spool):
+        spool.enqueue(hosting_service_id=1, block_uid=None, stream=io.BytesIO(b"[]"))
+        entry = spool.claim(max_entries=1)[0]
+        assert spool.release_stale(max_age=60) == []
+        os.utime(entry.path, (time.time() - 120, time.time() - 120))
+        assert len(spool.release_stale(max_age=60)) == 1
+        assert spool.queued_count() == 1
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_put_and_drain(self, test_client, spool, hosting_service):
+        """
+        a PUT only queues the repos, draining the spool adds them and finishes the block
+        """
+        with test_client:
+            block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            response = test_client.put(f"/api/v1/hosters/{hosting_service.id}/{block.uid}", json=repos)
+            assert response.status_code == 202
+
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            assert repo_class.query.count() == 0
+            assert state_manager.get_block(hoster_prefix=hosting_service.id, block_uid=block.uid)
+
+            assert _drain_spool(spool, max_entries=10) == 1
+            assert repo_class.query.count() == len(repos)
+            assert not state_manager.get_block(hoster_prefix=hosting_service.id, block_uid=block.uid)
+            assert spool.queued_count() == 0
+            assert _drain_spool(spool, max_entries=10) == 0
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_put_block_results_and_drain(self, test_client, spool, hosting_service):
+        """
+        block results are queued one entry per block, and resolved when draining the spool
+        """
+        with test_client:
+            blocks = state_manager.get_next_blocks({hosting_service.id: 2})[hosting_service.id]
+            repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            block_results = [dict(block_uid=block.uid, repos=repos) for block in blocks]
+            response = test_client.put(f"/api/v1/hosters/{hosting_service.id}/blocks", json=block_results)
+            assert response.status_code == 202
+            assert spool.queued_count() == 2
+
+            response = test_client.put(
+                f"/api/v1/hosters/{hosting_service.id}/blocks", json=block_results + [dict(block_uid="x")]
+            )
+            assert response.status_code == 400
+            assert spool.queued_count() == 2
+            assert not list(spool.path.glob("*.tmp"))
+
+            assert _drain_spool(spool, max_entries=10) == 2
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            assert repo_class.query.count() == len(repos) * 2
+            assert state_manager.count_blocks(hoster_prefix=hosting_service.id) == 0
+
+    def test_entry_block_uid_with_underscores(self, spool):
+        entry = spool.enqueue(hosting_service_id=12, block_uid="a_b_c", stream=io.BytesIO(b"[]"), received_ts=1.5)
+        assert (entry.hosting_service_id, entry.block_uid, entry.received_ts, entry.attempts) == (12, "a_b_c", 1.5, 0)
+        claimed = spool.claim(max_entries=1)[0]
+        assert (claimed.hosting_service_id, claimed.block_uid) == (12, "a_b_c")
+        assert spool.retry(claimed)
+        retried = spool.claim(max_entries=1)[0]
+        assert (retried.hosting_service_id, retried.block_uid, retried.received_ts, retried.attempts) == \
+            (12, "a_b_c", 1.5, 1)
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES[:1],
+        indirect=True
+    )
+    def test_drain_adapts_to_received_ts(self, test_app, test_client, spool, hosting_service):
+        """
+        the block size adapts to when the payload was received, not to how long it waited in the spool
+        """
+        with test_client:
+            test_app.config["BLOCK_SIZE_ADAPTIVE"] = True
+            block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            # crawled right on target
+            spool.enqueue(
+                hosting_service_id=hosting_service.id,
+                block_uid=block.uid,
+                stream=io.BytesIO(json.dumps(repos).encode()),
+                received_ts=block.attempts_at[-1] + test_app.config["BLOCK_TARGET_DURATION"],
+            )
+            assert _drain_spool(spool, max_entries=10) == 1
+            assert state_manager.get_batch_size(hoster_prefix=hosting_service.id) == state_manager.batch_size
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES[:1],
+        indirect=True
+    )
+    def test_drain_retries_unresolved(self, test_client, spool, hosting_service, monkeypatch):
+        """
+        payloads are retried, if their blocks could not be resolved - until they had max_attempts
+        """
+        import hubgrep_indexer.cli_blueprint.ingest as ingest
+
+        def _fail(**kwargs):
+            raise RuntimeError("lock timeout")
+
+        with test_client:
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            repos = get_mock_repos(hosting_service_type=hosting_service.type)
+            response = test_client.put(f"/api/v1/hosters/{hosting_service.id}/{block.uid}", json=repos)
+            assert response.status_code == 202
+
+            monkeypatch.setattr(ingest, "_resolve_block_states", _fail)
+            assert _drain_spool(spool, max_entries=10) == 1
+            assert spool.queued_count() == 1
+            assert state_manager.get_block(hoster_prefix=hosting_service.id, block_uid=block.uid)
+
+            monkeypatch.undo()
+            assert _drain_spool(spool, max_entries=10) == 1
+            assert spool.queued_count() == 0
+            assert not state_manager.get_block(hoster_prefix=hosting_service.id, block_uid=block.uid)
+            assert repo_class.query.count() == len(repos) * 2
+
+            # a payload which never resolves ends up failed, instead of adding its repos forever
+            block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            test_client.put(f"/api/v1/hosters/{hosting_service.id}/{block.uid}", json=repos)
+            monkeypatch.setattr(ingest, "_resolve_block_states", _fail)
+            for _ in range(spool.max_attempts + 1):
+                _drain_spool(spool, max_entries=10)
+            assert spool.queued_count() == 0
+            assert len(os.listdir(spool.failed_path)) == 1
+            assert repo_class.query.count() == len(repos) * (2 + spool.max_attempts)
@@ -0,0 +1,25 @@
+import io
+import json
+import pytest
+
+from hubgrep_indexer.lib.json_stream import iter_json_array
+from tests.helpers import get_mock_repos, HOSTER_TYPES
+
+
+class TestJsonStream:
+    @pytest.mark.parametrize("read_size", [1, 3, 64, 64 * 1024])
+    def test_iter_json_array(self, read_size):
+        items = [1234567, -0.25e-3, "aé中", True, None, {"nested": [1, {"x": "]"}]}]
+        for hoster_type in HOSTER_TYPES:
+            items += get_mock_repos(hosting_service_type=hoster_type)
+        stream = io.BytesIO(json.dumps(items, ensure_ascii=False, indent=2).encode())
+
+        assert list(iter_json_array(stream, read_size=read_size)) == items
+
+    def test_iter_json_array_empty(self):
+        assert list(iter_json_array(io.BytesIO(b" [ ] "))) == []
+
+    @pytest.mark.parametrize("payload", [b"", b"{}", b"[1,", b"[1 2]", b"[1]x", b"[1,]", b'[{"a":]'])
+    def test_iter_json_array_invalid(self, payload):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.BytesIO(payload), read_size=2))
@@ -0,0 +1,61 @@
+import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from hubgrep_indexer.constants import EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_CODEC_NONE
+from hubgrep_indexer.lib.parquet_writer import get_arrow_schema, write_parquet
+
+COLUMN_TYPES = [("foreign_id", "text"), ("stars_count", "bigint"), ("is_fork", "boolean"), ("created_at", "timestamp")]
+
+
+def _copy_lines(lines):
+    """ a copy_csv writing <lines> (like a COPY ... csv header) """
+
+    def copy_csv(csv_file):
+        for line in lines:
+            csv_file.write(line.encode())
+
+    return copy_csv
+
+
+class TestParquetWriter:
+    @pytest.mark.parametrize("codec", [EXPORT_CODEC_GZIP, EXPORT_CODEC_ZSTD, EXPORT_CODEC_NONE])
+    def test_write_parquet(self, tmp_path, codec):
+        lines = ["foreign_id,stars_count,is_fork,created_at\n"]
+        lines += [f"id {i},{i},{'t' if i % 2 == 0 else 'f'},2021-01-01 12:00:00\n" for i in range(5)]
+        # quoted values may hold newlines, "" is an empty string and an unquoted empty field null
+        lines += ['"multi\nline",,,\n', '"",1,t,2021-01-01 12:00:00.5\n']
+        schema = get_arrow_schema(COLUMN_TYPES)
+        path = str(tmp_path.joinpath("export.parquet"))
+
+        assert write_parquet(_copy_lines(lines), path, schema, codec, row_group_size=4) == 7
+
+        table = pq.read_table(path)
+        assert table.schema == schema
+        assert table.schema.field("stars_count").type == pa.int64()
+        rows = table.to_pylist()
+        assert rows[0] == dict(
+            foreign_id="id 0", stars_count=0, is_fork=True, created_at=datetime.datetime(2021, 1, 1, 12)
+        )
+        assert rows[5] == dict(foreign_id="multi\nline", stars_count=None, is_fork=None, created_at=None)
+        assert rows[6]["foreign_id"] == ""
+        assert rows[6]["created_at"] == datetime.datetime(2021, 1, 1, 12, 0, 0, 500000)
+
+    def test_write_parquet_empty(self, tmp_path):
+        schema = get_arrow_schema(COLUMN_TYPES)
+        path = str(tmp_path.joinpath("export.parquet"))
+        copy_csv = _copy_lines(["foreign_id,stars_count,is_fork,created_at\n"])
+        assert write_parquet(copy_csv, path, schema, EXPORT_CODEC_ZSTD) == 0
+        assert pq.read_table(path).schema == schema
+
+    def test_write_parquet_copy_error(self, tmp_path):
+        def copy_csv(csv_file):
+            csv_file.write(b"foreign_id,stars_count,is_fork,created_at\nid 0,0,t,\n")
+            raise ValueError("connection lost")
+
+        with pytest.raises(IOError):
+            write_parquet(
+                copy_csv, str(tmp_path.joinpath("export.parquet")), get_arrow_schema(COLUMN_TYPES), EXPORT_CODEC_ZSTD
+            )
@@ -0,0 +1,33 @@
+import io
+import gzip
+import pytest
+
+from hubgrep_indexer.lib.threaded_writer import ThreadedWriter
+
+
+class _FailingFile(io.BytesIO):
+    def write(self, data):
+        raise ValueError("disk full")
+
+
+class _UnclosedBytesIO(io.BytesIO):
+    def close(self):
+        pass
+
+
+class TestThreadedWriter:
+    def test_write(self):
+        file = _UnclosedBytesIO()
+        with ThreadedWriter(gzip.GzipFile(fileobj=file, mode="wb"), chunk_size=10, queue_size=2) as writer:
+            for i in range(1000):
+                writer.write(f"line {i}\n".encode())
+        lines = gzip.decompress(file.getvalue()).decode().splitlines()
+        assert len(lines) == 1000
+        assert lines[-1] == "line 999"
+        assert writer.bytes_written == sum(len(f"line {i}\n") for i in range(1000))
+
+    def test_write_error(self):
+        with pytest.raises(IOError):
+            with ThreadedWriter(_FailingFile(), chunk_size=10, queue_size=2) as writer:
+                for i in range(1000):
+                    writer.write(b"some data\n")
@@ -1,6 +1,9 @@
+import json
 import pytest
 
+from hubgrep_indexer import db, state_manager
 from hubgrep_indexer.lib.block_helpers import get_block_for_crawler
+from hubgrep_indexer.models.repositories.abstract_repository import Repository
 from tests.helpers import route_put_repos, get_mock_repos, HOSTER_TYPES
 
 
@@ -47,3 +50,110 @@ class TestAddRepos:
                             hosting_service=hosting_service,
                             route=f"/api/v1/hosters/{hosting_service.id}/{block['uid']}",
                             repos=get_mock_repos(hosting_service_type=hosting_service.type))
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_put_repos_without_copy(self, test_app, test_client, hosting_service):
+        """
+        Add repos using the plain insert fallback instead of COPY
+        """
+        test_app.config["INGEST_USE_COPY"] = False
+        with test_client:
+            route_put_repos(test_client=test_client,
+                            hosting_service=hosting_service,
+                            route=f"/api/v1/hosters/{hosting_service.id}/",
+                            repos=get_mock_repos(hosting_service_type=hosting_service.type))
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_put_repos_chunked(self, test_app, test_client, hosting_service):
+        """
+        Add repos in chunks smaller than the payload, with and without streaming the request body
+        """
+        test_app.config["INGEST_CHUNK_SIZE"] = 1
+        for stream_json in (True, False):
+            test_app.config["INGEST_STREAM_JSON"] = stream_json
+            with test_client:
+                route_put_repos(test_client=test_client,
+                                hosting_service=hosting_service,
+                                route=f"/api/v1/hosters/{hosting_service.id}/",
+                                repos=get_mock_repos(hosting_service_type=hosting_service.type))
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            repo_class.query.delete()
+            db.session.commit()
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_put_repos_invalid_json(self, test_app, test_client, hosting_service):
+        """
+        A broken payload is rejected, without adding the repos we parsed before it broke
+        """
+        test_app.config["INGEST_CHUNK_SIZE"] = 1
+        repos = get_mock_repos(hosting_service_type=hosting_service.type)
+        payload = json.dumps(repos)[:-10]
+        with test_client:
+            response = test_client.put(f"/api/v1/hosters/{hosting_service.id}/", data=payload)
+            assert response.status_code == 400
+            repo_class = Repository.repo_class_for_type(hosting_service.type)
+            assert repo_class.query.count() == 0
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_put_block_results(self, test_app, test_client, hosting_service):
+        """
+        Add repos of several blocks in one request, with and without streaming the request body
+        """
+        repos = get_mock_repos(hosting_service_type=hosting_service.type)
+        repo_class = Repository.repo_class_for_type(hosting_service.type)
+        for stream_json in (True, False):
+            test_app.config["INGEST_STREAM_JSON"] = stream_json
+            with test_client:
+                blocks = state_manager.get_next_blocks({hosting_service.id: 2})[hosting_service.id]
+                block_results = [dict(block_uid=block.uid, repos=repos) for block in blocks]
+                response = test_client.put(f"/api/v1/hosters/{hosting_service.id}/blocks", json=block_results)
+                assert response.status == "200 OK"
+                assert repo_class.query.count() == len(repos) * 2
+                assert state_manager.count_blocks(hoster_prefix=hosting_service.id) == 0
+
+                db.session.query(repo_class).delete()
+                db.session.commit()
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_put_block_results_invalid(self, test_client, hosting_service):
+        """
+        If a block result is broken, nothing is added
+        """
+        repos = get_mock_repos(hosting_service_type=hosting_service.type)
+        with test_client:
+            block = state_manager.get_next_block(hoster_prefix=hosting_service.id)
+            block_results = [dict(block_uid=block.uid, repos=repos), dict(block_uid="other")]
+            response = test_client.put(f"/api/v1/hosters/{hosting_service.id}/blocks", json=block_results)
+            assert response.status_code == 400
+            assert Repository.repo_class_for_type(hosting_service.type).query.count() == 0
+            assert state_manager.has_block(hoster_prefix=hosting_service.id, block_uid=block.uid)
+
+    def test_put_unknown_hosting_service(self, test_client):
+        with test_client:
+            for hosting_service_id in ("12345", "abc"):
+                response = test_client.put(f"/api/v1/hosters/{hosting_service_id}/", json=[])
+                assert response.status_code == 404
+                response = test_client.put(f"/api/v1/hosters/{hosting_service_id}/some_block", json=[])
+                assert response.status_code == 404
+                response = test_client.put(f"/api/v1/hosters/{hosting_service_id}/blocks", json=[])
+                assert response.status_code == 404
@@ -2,6 +2,7 @@ import pytest
 
 from hubgrep_indexer import state_manager
 
+from tests.conftest import _add_hosting_service
 from tests.helpers import HOSTER_TYPES
 
 
@@ -55,3 +56,61 @@ class TestGetBlock:
             response = client.get(f"/api/v1/hosters/{hosting_service.id}/block")
             assert response.json["from_id"] == state_manager.batch_size + 1
             assert response.json["to_id"] == state_manager.batch_size * 2
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_get_blocks(self, test_client, hosting_service):
+        with test_client as client:
+            response = client.get(f"/api/v1/hosters/{hosting_service.id}/blocks?count=5")
+            blocks = response.json
+            assert len(blocks) == 5
+            assert [block["from_id"] for block in blocks] == [
+                i * state_manager.batch_size + 1 for i in range(5)
+            ]
+            assert all(block["callback_url"] for block in blocks)
+            assert all(block["hosting_service"]["api_key"] == "secret" for block in blocks)
+
+            # timed out blocks are handed out again, before new ones
+            state_manager.block_timeout = -1
+            try:
+                response = client.get(f"/api/v1/hosters/{hosting_service.id}/blocks?count=7")
+            finally:
+                state_manager.block_timeout = 60
+            assert sorted(block["uid"] for block in response.json[:5]) == sorted(block["uid"] for block in blocks)
+            assert response.json[5]["from_id"] == 5 * state_manager.batch_size + 1
+
+    @pytest.mark.parametrize(
+        'hosting_service',
+        HOSTER_TYPES,
+        indirect=True
+    )
+    def test_get_loadbalanced_blocks(self, test_client, hosting_service):
+        with test_client as client:
+            other_hosting_service = _add_hosting_service(
+                "https://other.com/", type=hosting_service.type, api_key="other_secret"
+            )
+            response = client.get(
+                f"/api/v1/hosters/{hosting_service.type}/loadbalanced_blocks?count=4&hosters=2"
+            )
+            blocks = response.json
+            assert len(blocks) == 4
+            assert sorted(block["hosting_service"]["id"] for block in blocks) == sorted(
+                [hosting_service.id] * 2 + [other_hosting_service.id] * 2
+            )
+            assert sorted(block["from_id"] for block in blocks) == [
+                1, 1, state_manager.batch_size + 1, state_manager.batch_size + 1
+            ]
+
+            # by default, all blocks come from one hoster
+            response = client.get(f"/api/v1/hosters/{hosting_service.type}/loadbalanced_blocks?count=3")
+            assert len({block["hosting_service"]["id"] for block in response.json}) == 1
+            assert len(response.json) == 3
+
+    def test_get_unknown_hosting_service(self, test_client):
+        with test_client as client:
+            for hosting_service_id in ("12345", "abc"):
+                assert client.get(f"/api/v1/hosters/{hosting_service_id}/block").status_code == 404
+                assert client.get(f"/api/v1/hosters/{hosting_service_id}/blocks?count=2").status_code == 404